@@ -0,0 +1,28 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This package contains benchmarks for the dantalian package.
+
+Run the timing benchmarks with:
+
+    python -m bench.timing run --size small --output results.json
+
+and compare two runs with:
+
+    python -m bench.timing compare old.json new.json
+"""
@@ -0,0 +1,203 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module generates synthetic libraries for benchmarks.
+
+Libraries are generated from a seed, so the same parameters always give the
+same library.  A library looks like:
+
+    ROOT/.dantalian/
+    ROOT/files/N/fileM.dat       original files, some sharing names
+    ROOT/dirs/dirN/              tagged directories, with a few files each
+    ROOT/tags/groupN/tagM/       tag directories
+
+Files and directories are linked into a number of random tag directories.
+"""
+
+import os
+import posixpath
+import random
+
+from dantalian import base
+from dantalian import library
+
+SIZES = {
+    'tiny': dict(files=50, tags=10, links_per_file=3, dirs=5),
+    'small': dict(files=1000, tags=50, links_per_file=3, dirs=20),
+    'medium': dict(files=10000, tags=200, links_per_file=3, dirs=100),
+    'large': dict(files=100000, tags=1000, links_per_file=3, dirs=500),
+}
+
+_TAGS_PER_GROUP = 10
+_FILES_PER_DIR = 100
+
+
+class Params:
+
+    """Parameters of a generated library.
+
+    Attributes:
+        files: Number of regular files.
+        tags: Number of tag directories.
+        links_per_file: Number of tags for each file and directory.
+        dirs: Number of tagged directories.
+        collisions: Fraction of files that share their name with another file,
+            forcing name collisions when tagging.
+        seed: Random seed.
+    """
+
+    # pylint: disable=too-few-public-methods,too-many-arguments
+
+    def __init__(self, files, tags, links_per_file, dirs,
+                 collisions=0.1, seed=0):
+        self.files = files
+        self.tags = tags
+        self.links_per_file = min(links_per_file, tags)
+        self.dirs = dirs
+        self.collisions = collisions
+        self.seed = seed
+
+    @classmethod
+    def from_size(cls, size, **kwargs):
+        """Make parameters from a size name in SIZES."""
+        params = dict(SIZES[size])
+        params.update(kwargs)
+        return cls(**params)
+
+    def as_dict(self):
+        """Return parameters as a dict."""
+        return dict(vars(self))
+
+
+class Library:
+
+    """A generated library.
+
+    Attributes:
+        root: Path of the library.
+        files: List of original file paths.
+        dirs: List of tagged directory paths.
+        tags: List of tag directory paths.
+        file_tags: Dict mapping file and directory paths to lists of the tag
+            directories they are linked into.
+    """
+
+    # pylint: disable=too-few-public-methods,too-many-arguments
+
+    def __init__(self, root, files, dirs, tags, file_tags):
+        self.root = root
+        self.files = files
+        self.dirs = dirs
+        self.tags = tags
+        self.file_tags = file_tags
+
+
+def tag_path(root, index):
+    """Return the path of a tag directory."""
+    return posixpath.join(root, 'tags', 'group{}'.format(
+        index // _TAGS_PER_GROUP), 'tag{}'.format(index))
+
+
+def generate(root, params, link=True):
+    """Generate a library.
+
+    Args:
+        root: Path of an empty or nonexistent directory.
+        params: Params instance.
+        link: Whether to link files into tag directories.  If False, only the
+            files, directories and empty tag directories are made.
+
+    Returns:
+        Library instance.
+    """
+    rand = random.Random(params.seed)
+    os.makedirs(root, exist_ok=True)
+    library.init_library(root)
+    tags = [tag_path(root, i) for i in range(params.tags)]
+    for tag in tags:
+        os.makedirs(tag)
+    files = _make_files(root, params, rand)
+    dirs = _make_dirs(root, params)
+    file_tags = _pick_tags(params, rand, tags, files + dirs)
+    if link:
+        _link_all(root, file_tags)
+    return Library(root, files, dirs, tags, file_tags)
+
+
+def _make_files(root, params, rand):
+    """Make original files."""
+    files = []
+    for i in range(params.files):
+        if rand.random() < params.collisions:
+            name = 'common.dat'
+        else:
+            name = 'file{}.dat'.format(i)
+        dirpath = posixpath.join(root, 'files', str(i // _FILES_PER_DIR))
+        path = posixpath.join(dirpath, name)
+        if posixpath.exists(path):
+            # Colliding name within the same directory; use the unique one.
+            path = posixpath.join(dirpath, 'file{}.dat'.format(i))
+        os.makedirs(dirpath, exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(str(i).encode())
+        files.append(path)
+    return files
+
+
+def _make_dirs(root, params):
+    """Make tagged directories."""
+    dirs = []
+    for i in range(params.dirs):
+        dirpath = posixpath.join(root, 'dirs', 'dir{}'.format(i))
+        os.makedirs(dirpath)
+        for j in range(3):
+            os.mknod(posixpath.join(dirpath, 'member{}'.format(j)))
+        dirs.append(dirpath)
+    return dirs
+
+
+def _pick_tags(params, rand, tags, paths):
+    """Pick random tags for each path."""
+    return {path: rand.sample(tags, params.links_per_file)
+            for path in paths}
+
+
+def _link_all(root, file_tags):
+    """Link files and directories into their tags.
+
+    Free names are tracked in memory, which is much faster than
+    pathlib.free_name() on large tag directories.
+    """
+    used = {}
+    for path, tags in file_tags.items():
+        for tag in tags:
+            name = _free_name(used.setdefault(tag, set()),
+                              posixpath.basename(path))
+            base.link(root, path, posixpath.join(tag, name))
+
+
+def _free_name(used, name):
+    """Return and reserve a free name given the set of used names."""
+    if name in used:
+        stem, ext = posixpath.splitext(name)
+        i = 1
+        while '{}.{}{}'.format(stem, i, ext) in used:
+            i += 1
+        name = '{}.{}{}'.format(stem, i, ext)
+    used.add(name)
+    return name
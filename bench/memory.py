@@ -0,0 +1,327 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains memory scaling benchmarks.
+
+Each operation is run over generated libraries of increasing size, in a
+forked child process so that measurements don't interfere with each other.
+Two measurements are taken, each in its own child:
+
+- peak resident set size (RSS) while running the operation, above the RSS
+  when it started, and
+- peak memory allocated by Python, as traced by tracemalloc.
+
+Both are also reported in bytes per library entry (directory entries in tag
+directories), so that growth is visible across sizes and can be checked
+against THRESHOLDS.
+"""
+
+import argparse
+from collections import OrderedDict
+import gc
+import json
+import multiprocessing
+import posixpath
+import resource
+import sys
+import tempfile
+import tracemalloc
+
+from dantalian import base
+from dantalian import bulk
+from dantalian import findlib
+from dantalian import fs
+from dantalian import tagnames
+
+from . import libgen
+
+DEFAULT_ENTRIES = (10000, 100000, 1000000)
+
+# Maximum traced bytes per entry for each operation.  These are checked by
+# the test suite with a small library, so they guard against changes that
+# make operations keep much more per entry.
+THRESHOLDS = {
+    'export': 1000,
+    'export_full': 1000,
+    'search_and': 800,
+    'search_or': 800,
+    'search_minus': 800,
+    'list_links': 100,
+    'clean': 100,
+}
+
+_OPERATIONS = OrderedDict()
+_LINKS_PER_FILE = 3
+
+
+def _operation(name):
+    """Register an operation to measure."""
+    def register(func):
+        _OPERATIONS[name] = func
+        return func
+    return register
+
+
+def params_for_entries(entries, seed=0):
+    """Return library parameters giving approximately the number of entries.
+
+    Each file has one original link plus its links in tag directories.
+    """
+    files = max(1, entries // (_LINKS_PER_FILE + 1))
+    return libgen.Params(files=files, tags=max(10, files // 100),
+                         links_per_file=_LINKS_PER_FILE,
+                         dirs=max(1, files // 1000), seed=seed)
+
+
+def _query(lib, node_type, tags):
+    return '{} {} END'.format(node_type, ' '.join(
+        tagnames.path2tag(lib.root, tag) for tag in tags))
+
+
+###############################################################################
+# operations
+@_operation('export')
+def _export(lib):
+    bulk.export_tags(lib.root, lib.root)
+
+
+@_operation('export_full')
+def _export_full(lib):
+    bulk.export_tags(lib.root, lib.root, full=True)
+
+
+@_operation('search_and')
+def _search_and(lib):
+    findlib.search(findlib.parse_query(
+        lib.root, _query(lib, 'AND', lib.tags[:2])))
+
+
+@_operation('search_or')
+def _search_or(lib):
+    findlib.search(findlib.parse_query(
+        lib.root, _query(lib, 'OR', lib.tags)))
+
+
+@_operation('search_minus')
+def _search_minus(lib):
+    findlib.search(findlib.parse_query(
+        lib.root, _query(lib, 'MINUS', lib.tags[:2])))
+
+
+@_operation('list_links')
+def _list_links(lib):
+    for _ in base.list_links(lib.root, lib.files[0]):
+        pass
+
+
+@_operation('clean')
+def _clean(lib):
+    bulk.clean_symlinks(lib.root)
+
+
+###############################################################################
+# measurement
+def _reset_peak_rss():
+    """Reset the peak RSS of this process, if supported.
+
+    Returns:
+        Whether /proc/self/status VmHWM can be used.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss(use_proc):
+    """Return peak RSS of this process in bytes."""
+    if use_proc:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def _measure_rss(lib, name, conn):
+    gc.collect()
+    use_proc = _reset_peak_rss()
+    start = _peak_rss(use_proc)
+    _OPERATIONS[name](lib)
+    conn.send(max(0, _peak_rss(use_proc) - start))
+
+
+def _measure_tracemalloc(lib, name, conn):
+    gc.collect()
+    tracemalloc.start()
+    _OPERATIONS[name](lib)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    conn.send(peak)
+
+
+def _in_child(target, lib, name):
+    """Run a measurement in a forked child and return its result.
+
+    Raises:
+        RuntimeError: The child failed without sending a result.
+    """
+    ctx = multiprocessing.get_context('fork')
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=target, args=(lib, name, child_conn))
+    proc.start()
+    # Close the parent's copy of the sending end, so recv() raises EOFError
+    # instead of hanging if the child dies without sending.
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = None
+    finally:
+        parent_conn.close()
+        proc.join()
+    if proc.exitcode != 0 or result is None:
+        raise RuntimeError('Measuring {} failed with exit code {}'.format(
+            name, proc.exitcode))
+    return result
+
+
+def measure(lib, entries, operations=None):
+    """Measure memory use of operations on a library.
+
+    Args:
+        lib: libgen.Library instance.
+        entries: Number of entries in the library.
+        operations: List of operation names.  Defaults to all of them.
+
+    Returns:
+        Dict mapping operation names to dicts of measurements.
+    """
+    if operations is None:
+        operations = list(_OPERATIONS)
+    results = OrderedDict()
+    for name in operations:
+        rss = _in_child(_measure_rss, lib, name)
+        traced = _in_child(_measure_tracemalloc, lib, name)
+        results[name] = {
+            'rss_peak': rss,
+            'tracemalloc_peak': traced,
+            'rss_per_entry': rss / entries,
+            'tracemalloc_per_entry': traced / entries,
+        }
+    return results
+
+
+def count_entries(root):
+    """Count directory entries in a library, excluding .dantalian."""
+    total = 0
+    for dirpath, dirnames, filenames in fs.walk(root):
+        if dirpath == root:
+            dirnames[:] = [name for name in dirnames
+                           if name != '.dantalian']
+        total += len(dirnames) + len(filenames)
+    return total
+
+
+def run(sizes=DEFAULT_ENTRIES, operations=None, workdir=None, seed=0):
+    """Run memory benchmarks for each library size.
+
+    Returns:
+        List of dicts, one per size, with entries and measurements.
+    """
+    runs = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory(dir=workdir) as tmpdir:
+            lib = libgen.generate(posixpath.join(tmpdir, 'library'),
+                                  params_for_entries(size, seed))
+            entries = count_entries(lib.root)
+            runs.append({
+                'entries': entries,
+                'operations': measure(lib, entries, operations),
+            })
+    return runs
+
+
+def check(runs, thresholds=None):
+    """Check traced bytes per entry against thresholds.
+
+    Returns:
+        List of (entries, operation, bytes per entry, threshold) tuples for
+        operations over their threshold.
+    """
+    if thresholds is None:
+        thresholds = THRESHOLDS
+    failures = []
+    for size_run in runs:
+        for name, result in size_run['operations'].items():
+            limit = thresholds.get(name)
+            per_entry = result['tracemalloc_per_entry']
+            if limit is not None and per_entry > limit:
+                failures.append((size_run['entries'], name, per_entry, limit))
+    return failures
+
+
+def _print_table(runs):
+    print('{:<14} {:>10} {:>14} {:>10} {:>14} {:>10}'.format(
+        'operation', 'entries', 'rss', 'rss/ent', 'traced', 'traced/ent'),
+          file=sys.stderr)
+    for size_run in runs:
+        for name, result in size_run['operations'].items():
+            print('{:<14} {:>10} {:>14} {:>10.1f} {:>14} {:>10.1f}'.format(
+                name, size_run['entries'],
+                result['rss_peak'], result['rss_per_entry'],
+                result['tracemalloc_peak'], result['tracemalloc_per_entry']),
+                  file=sys.stderr)
+
+
+def main(argv=None):
+    """Entry point."""
+    parser = argparse.ArgumentParser(prog='python -m bench.memory')
+    parser.add_argument('--entries', type=int, action='append',
+                        help='Library size; may be repeated.')
+    parser.add_argument('--operation', action='append',
+                        choices=list(_OPERATIONS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir')
+    parser.add_argument('--check', action='store_true',
+                        help='Exit non-zero if thresholds are exceeded.')
+    parser.add_argument('-o', '--output')
+    args = parser.parse_args(argv)
+
+    runs = run(args.entries or DEFAULT_ENTRIES, args.operation,
+               args.workdir, args.seed)
+    _print_table(runs)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(runs, file, indent=2)
+    else:
+        json.dump(runs, sys.stdout, indent=2)
+    if args.check:
+        failures = check(runs)
+        for entries, name, per_entry, limit in failures:
+            print('{} at {} entries: {:.1f} bytes/entry > {}'.format(
+                name, entries, per_entry, limit), file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,335 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains timing benchmarks for the hot paths of Dantalian.
+
+Each benchmark runs against a library generated by bench.libgen.  Results are
+written as JSON, and two results files can be compared to find regressions.
+"""
+
+import argparse
+from collections import OrderedDict
+import json
+import os
+import platform
+import posixpath
+import random
+import sys
+import tempfile
+import time
+
+from dantalian import base
+from dantalian import bulk
+from dantalian import findlib
+from dantalian import tagging
+from dantalian import tagnames
+from dantalian.main import argparse as dantalian_argparse
+
+from . import libgen
+
+_BENCHMARKS = OrderedDict()
+
+# Number of files to use for benchmarks that work on individual files.
+_SAMPLE = 20
+
+
+def _benchmark(name):
+    """Register a benchmark function.
+
+    Benchmark functions are called with a libgen.Library, a random.Random
+    and a Timer.  Setup is done outside of the timer's context.
+    """
+    def register(func):
+        _BENCHMARKS[name] = func
+        return func
+    return register
+
+
+class Timer:
+
+    """Context manager that accumulates wall time."""
+
+    def __init__(self):
+        self.elapsed = 0
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed += time.perf_counter() - self._start
+
+
+def _command(*argv):
+    """Run a dantalian command."""
+    args = dantalian_argparse.make_parser().parse_args(argv)
+    args.func(args)
+
+
+def _query(lib, node_type, count=3):
+    """Make a query string over the first tags."""
+    tags = ' '.join(tagnames.path2tag(lib.root, tag)
+                    for tag in lib.tags[:count])
+    return '{} {} END'.format(node_type, tags)
+
+
+###############################################################################
+# read only
+@_benchmark('list_links')
+def _bench_list_links(lib, rand, timer):
+    sample = rand.sample(lib.files, min(_SAMPLE, len(lib.files)))
+    with timer:
+        for path in sample:
+            list(base.list_links(lib.root, path))
+
+
+def _bench_search(node_type):
+    def bench(lib, rand, timer):
+        # pylint: disable=unused-argument
+        query = _query(lib, node_type)
+        with timer:
+            findlib.search(findlib.parse_query(lib.root, query))
+    return bench
+
+_benchmark('search_and')(_bench_search('AND'))
+_benchmark('search_or')(_bench_search('OR'))
+_benchmark('search_minus')(_bench_search('MINUS'))
+
+
+@_benchmark('export')
+def _bench_export(lib, rand, timer):
+    # pylint: disable=unused-argument
+    with timer:
+        bulk.export_tags(lib.root, lib.root)
+
+
+@_benchmark('export_full')
+def _bench_export_full(lib, rand, timer):
+    # pylint: disable=unused-argument
+    with timer:
+        bulk.export_tags(lib.root, lib.root, full=True)
+
+
+###############################################################################
+# mutating
+@_benchmark('save_all')
+def _bench_save_all(lib, rand, timer):
+    # pylint: disable=unused-argument
+    with timer:
+        _command('save', '--root', lib.root, '--all',
+                 posixpath.join(lib.root, 'dirs'))
+
+
+@_benchmark('load_all')
+def _bench_load_all(lib, rand, timer):
+    # pylint: disable=unused-argument
+    dirs = posixpath.join(lib.root, 'dirs')
+    _command('unload', '--root', lib.root, '--all', dirs)
+    with timer:
+        _command('load', '--root', lib.root, '--all', dirs)
+
+
+@_benchmark('unload_all')
+def _bench_unload_all(lib, rand, timer):
+    # pylint: disable=unused-argument
+    dirs = posixpath.join(lib.root, 'dirs')
+    with timer:
+        _command('unload', '--root', lib.root, '--all', dirs)
+    _command('load', '--root', lib.root, '--all', dirs)
+
+
+@_benchmark('tag')
+def _bench_tag(lib, rand, timer):
+    sample = rand.sample(lib.files, min(_SAMPLE * 10, len(lib.files)))
+    tag = lib.tags[0]
+    with timer:
+        for path in sample:
+            tagging.tag(lib.root, path, tag)
+
+
+@_benchmark('untag')
+def _bench_untag(lib, rand, timer):
+    sample = rand.sample(lib.files, min(_SAMPLE * 10, len(lib.files)))
+    tag = lib.tags[0]
+    with timer:
+        for path in sample:
+            tagging.untag(lib.root, path, tag)
+
+
+@_benchmark('import')
+def _bench_import(lib, rand, timer):
+    # pylint: disable=unused-argument
+    params = libgen.Params(files=len(lib.files), tags=len(lib.tags),
+                           links_per_file=0, dirs=0)
+    root = posixpath.join(posixpath.dirname(lib.root), 'import')
+    bare = libgen.generate(root, params, link=False)
+    path_tag_map = {}
+    for old, new in zip(lib.files, bare.files):
+        path_tag_map[new] = [posixpath.join(root, posixpath.relpath(
+            tag, lib.root)) for tag in lib.file_tags[old]]
+    with timer:
+        bulk.import_tags(root, path_tag_map)
+
+
+@_benchmark('rename_all')
+def _bench_rename_all(lib, rand, timer):
+    sample = rand.sample(lib.files, min(_SAMPLE // 4, len(lib.files)))
+    with timer:
+        for i, path in enumerate(sample):
+            bulk.rename_all(lib.root, lib.root, path, 'renamed{}'.format(i))
+
+
+@_benchmark('clean')
+def _bench_clean(lib, rand, timer):
+    tags = rand.sample(lib.tags, min(_SAMPLE, len(lib.tags)))
+    for i, tag in enumerate(tags):
+        os.symlink(posixpath.join(lib.root, 'missing'),
+                   posixpath.join(tag, 'broken{}'.format(i)))
+    with timer:
+        bulk.clean_symlinks(lib.root)
+
+
+def run(params, benchmarks=None, workdir=None, repeat=1):
+    """Run benchmarks.
+
+    Args:
+        params: libgen.Params for the generated library.
+        benchmarks: List of benchmark names.  Defaults to all of them.
+        workdir: Directory to generate libraries in.  Defaults to a
+            temporary directory.
+        repeat: Number of times to run the benchmarks, each time on a newly
+            generated library.  The best time is kept.
+
+    Returns:
+        Dict with parameters, platform information and timings.
+    """
+    if benchmarks is None:
+        benchmarks = list(_BENCHMARKS)
+    results = OrderedDict()
+    generate_times = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(dir=workdir) as tmpdir:
+            start = time.perf_counter()
+            lib = libgen.generate(posixpath.join(tmpdir, 'library'), params)
+            generate_times.append(time.perf_counter() - start)
+            rand = random.Random(params.seed)
+            for name in benchmarks:
+                timer = Timer()
+                _BENCHMARKS[name](lib, rand, timer)
+                results[name] = min(results.get(name, timer.elapsed),
+                                    timer.elapsed)
+    return {
+        'params': params.as_dict(),
+        'repeat': repeat,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'generate': min(generate_times),
+        'results': results,
+    }
+
+
+def compare(old, new, threshold=1.25):
+    """Compare two benchmark results.
+
+    Args:
+        old: Old results dict.
+        new: New results dict.
+        threshold: Ratio of new to old time above which a benchmark is
+            considered a regression.
+
+    Returns:
+        List of (name, old time, new time, ratio, regressed) tuples.
+    """
+    rows = []
+    for name, new_time in new['results'].items():
+        if name not in old['results']:
+            continue
+        old_time = old['results'][name]
+        ratio = new_time / old_time if old_time else float('inf')
+        rows.append((name, old_time, new_time, ratio, ratio > threshold))
+    return rows
+
+
+def _run_main(args):
+    params = libgen.Params.from_size(args.size, seed=args.seed)
+    for key in ('files', 'tags', 'links_per_file', 'dirs', 'collisions'):
+        value = getattr(args, key)
+        if value is not None:
+            setattr(params, key, value)
+    results = run(params, args.benchmark, args.workdir, args.repeat)
+    for name, elapsed in results['results'].items():
+        print('{:<16} {:>10.4f}s'.format(name, elapsed), file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+    return 0
+
+
+def _compare_main(args):
+    with open(args.old) as file:
+        old = json.load(file)
+    with open(args.new) as file:
+        new = json.load(file)
+    if old['params'] != new['params']:
+        print('warning: runs used different parameters', file=sys.stderr)
+    regressed = False
+    for name, old_time, new_time, ratio, regression in compare(
+            old, new, args.threshold):
+        print('{:<16} {:>10.4f}s {:>10.4f}s {:>7.2f}x{}'.format(
+            name, old_time, new_time, ratio,
+            '  REGRESSION' if regression else ''))
+        regressed = regressed or regression
+    return 1 if regressed else 0
+
+
+def main(argv=None):
+    """Entry point."""
+    parser = argparse.ArgumentParser(prog='python -m bench.timing')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser('run')
+    run_parser.add_argument('--size', choices=sorted(libgen.SIZES),
+                            default='small')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--files', type=int)
+    run_parser.add_argument('--tags', type=int)
+    run_parser.add_argument('--links-per-file', type=int)
+    run_parser.add_argument('--dirs', type=int)
+    run_parser.add_argument('--collisions', type=float)
+    run_parser.add_argument('--benchmark', action='append',
+                            choices=list(_BENCHMARKS))
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--workdir')
+    run_parser.add_argument('-o', '--output')
+    run_parser.set_defaults(func=_run_main)
+
+    compare_parser = subparsers.add_parser('compare')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=1.25)
+    compare_parser.set_defaults(func=_compare_main)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+# Bash completion for dantalian(1).
+#
+# Completes tagnames (arguments starting with //) from the library containing
+# the current directory, and falls back to file completion otherwise.  Source
+# this file from ~/.bashrc or install it in your bash-completion directory.
+
+_dantalian() {
+    local cur=${COMP_WORDS[COMP_CWORD]}
+    if [[ $cur == //* ]]; then
+        local IFS=$'\n'
+        COMPREPLY=($(dantalian complete -- "$cur" 2>/dev/null))
+        compopt -o nospace
+    fi
+}
+
+complete -o default -F _dantalian dantalian
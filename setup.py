@@ -15,11 +15,16 @@ setup(
         'License :: OSI Approved :: GNU General Public License v3 or later (GPLv3+)',
         'Intended Audience :: Developers',
         'Intended Audience :: End Users/Desktop',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
     ],
+    python_requires='>=3.7',
 
     package_dir={'': 'src'},
     packages=find_packages('src'),
+    extras_require={
+        'numpy': ['numpy'],
+    },
     entry_points={
         'console_scripts': [
             'dantalian = dantalian.main:main',
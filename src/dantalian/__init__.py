@@ -15,9 +15,20 @@
 # You should have received a copy of the GNU General Public License
 # along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
 
-"""This is the dantalian package."""
+"""This is the dantalian package.
 
-from . import base
-from . import bulk
-from . import tagging
-from . import library
+Submodules are imported lazily on first access, so that importing the package
+(for example, to run a single command) does not import everything.
+
+"""
+
+import importlib
+
+_SUBMODULES = ('base', 'bulk', 'tagging', 'library')
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(
+        __name__, name))
@@ -0,0 +1,208 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This module provides an asyncio interface to Dantalian.
+
+Dantalian's functions block on filesystem I/O.  AsyncDantalian runs them in
+an executor so they don't block the event loop, with a limit on how many run
+at once.  Long walks are provided as async iterators that yield results as
+they are found.
+
+Example usage:
+
+    async def handle(client, rootpath, path):
+        async for link in dantalian.list_links(rootpath, path):
+            await client.send(link)
+
+    dantalian = AsyncDantalian(max_concurrency=8)
+
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import threading
+
+from dantalian import base
+from dantalian import bulk
+from dantalian import findlib
+from dantalian import tagging
+
+_DONE = object()
+
+
+class _Error:
+
+    """Wrapper for an exception raised by an iterator in a worker thread."""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, error):
+        self.error = error
+
+
+class AsyncDantalian:
+
+    """Asynchronous facade for Dantalian operations.
+
+    Operations are run in an executor, and at most max_concurrency of them
+    run at the same time.  Async iterators count as one operation for as
+    long as they are being iterated.
+
+    Args:
+        max_concurrency: Maximum number of operations running at once.
+        executor: concurrent.futures.Executor to run operations in.  By
+            default, a thread pool with max_concurrency threads is used.
+        buffer: Number of results iterators read ahead of the consumer.
+    """
+
+    def __init__(self, max_concurrency=4, executor=None, buffer=256):
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._executor = executor
+        self._max_concurrency = max_concurrency
+        self._semaphore = None
+        self._buffer = buffer
+
+    def _get_semaphore(self):
+        # The semaphore is made lazily so that it's bound to the loop that
+        # uses it.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._semaphore
+
+    def close(self):
+        """Shut down the executor."""
+        self._executor.shutdown()
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking function in the executor and return its result."""
+        loop = asyncio.get_running_loop()
+        async with self._get_semaphore():
+            return await loop.run_in_executor(
+                self._executor, functools.partial(func, *args, **kwargs))
+
+    async def iterate(self, func, *args, **kwargs):
+        """Iterate over a blocking iterable in the executor.
+
+        Results are yielded as the worker produces them.  If iteration is
+        stopped early, the worker stops at the next result.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        slots = threading.Semaphore(self._buffer)
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for item in func(*args, **kwargs):
+                    slots.acquire()
+                    if stop.is_set():
+                        return
+                    loop.call_soon_threadsafe(queue.put_nowait, item)
+            except Exception as err:  # pylint: disable=broad-except
+                loop.call_soon_threadsafe(queue.put_nowait, _Error(err))
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, _DONE)
+
+        async with self._get_semaphore():
+            future = loop.run_in_executor(self._executor, produce)
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is _DONE:
+                        break
+                    if isinstance(item, _Error):
+                        raise item.error
+                    slots.release()
+                    yield item
+            finally:
+                stop.set()
+                slots.release()
+                await future
+
+    ###########################################################################
+    # base
+    async def link(self, rootpath, src, dst):
+        """Asynchronous base.link()."""
+        return await self.run(base.link, rootpath, src, dst)
+
+    async def unlink(self, rootpath, path):
+        """Asynchronous base.unlink()."""
+        return await self.run(base.unlink, rootpath, path)
+
+    async def rename(self, rootpath, src, dst):
+        """Asynchronous base.rename()."""
+        return await self.run(base.rename, rootpath, src, dst)
+
+    async def swap_dir(self, rootpath, path):
+        """Asynchronous base.swap_dir()."""
+        return await self.run(base.swap_dir, rootpath, path)
+
+    def list_links(self, top, path):
+        """Asynchronous base.list_links(), as an async iterator."""
+        return self.iterate(base.list_links, top, path)
+
+    async def save_dtags(self, rootpath, top, dirpath):
+        """Asynchronous base.save_dtags()."""
+        return await self.run(base.save_dtags, rootpath, top, dirpath)
+
+    async def load_dtags(self, rootpath, dirpath):
+        """Asynchronous base.load_dtags()."""
+        return await self.run(base.load_dtags, rootpath, dirpath)
+
+    async def unload_dtags(self, rootpath, dirpath):
+        """Asynchronous base.unload_dtags()."""
+        return await self.run(base.unload_dtags, rootpath, dirpath)
+
+    ###########################################################################
+    # tagging
+    async def tag(self, rootpath, path, directory):
+        """Asynchronous tagging.tag()."""
+        return await self.run(tagging.tag, rootpath, path, directory)
+
+    async def untag(self, rootpath, path, directory):
+        """Asynchronous tagging.untag()."""
+        return await self.run(tagging.untag, rootpath, path, directory)
+
+    ###########################################################################
+    # search
+    async def search(self, search_node):
+        """Asynchronous findlib.search()."""
+        return await self.run(findlib.search, search_node)
+
+    ###########################################################################
+    # bulk
+    async def clean_symlinks(self, dirpath):
+        """Asynchronous bulk.clean_symlinks()."""
+        return await self.run(bulk.clean_symlinks, dirpath)
+
+    async def rename_all(self, rootpath, top, path, name):
+        """Asynchronous bulk.rename_all()."""
+        return await self.run(bulk.rename_all, rootpath, top, path, name)
+
+    async def unlink_all(self, rootpath, top, path):
+        """Asynchronous bulk.unlink_all()."""
+        return await self.run(bulk.unlink_all, rootpath, top, path)
+
+    async def import_tags(self, rootpath, path_tag_map):
+        """Asynchronous bulk.import_tags()."""
+        return await self.run(bulk.import_tags, rootpath, path_tag_map)
+
+    async def export_tags(self, rootpath, top, full=False):
+        """Asynchronous bulk.export_tags()."""
+        return await self.run(bulk.export_tags, rootpath, top, full)
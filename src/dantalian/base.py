@@ -24,32 +24,41 @@ implementation details to manage directory linking with symlinks and dtags.
 """
 
 from itertools import chain
-import os
 import posixpath
 
 from dantalian import dtags
+from dantalian import events
+from dantalian import fs
+from dantalian import index
 from dantalian import oserrors
 from dantalian import pathlib
 from dantalian import tagnames
 
 
-def link(rootpath, src, dst):
+@events.traced('base.link')
+def link(rootpath, src, dst, symlink=False):
     """Link src to dst.
 
     Args:
         rootpath: Path for tagname conversions.
         src: Source path.
         dst: Destination path.
+        symlink: Make an absolute symlink to a file instead of a hard link.
+            Directories are always symlinked.
 
     """
-    if posixpath.isdir(src):
+    if fs.isdir(src):
         src = pathlib.readlink(src)
-        os.symlink(posixpath.abspath(src), dst)
+        fs.symlink(posixpath.abspath(src), dst)
         dtags.add_tag(src, tagnames.path2tag(rootpath, dst))
+    elif symlink:
+        fs.symlink(posixpath.abspath(src), dst)
     else:
-        os.link(src, dst)
+        fs.link(src, dst)
+    index.note_changed(rootpath, dst)
 
 
+@events.traced('base.unlink')
 def unlink(rootpath, path):
     """Unlink given path.
 
@@ -60,18 +69,20 @@ def unlink(rootpath, path):
     # We unlink the target.  However, if it is a directory, we want to swap it
     # out for one of its symlinks, then unlink the symlink.  If the directory
     # doesn't have any tags, then we fail.
-    if posixpath.isdir(target):
-        if not posixpath.islink(target):
+    if fs.isdir(target):
+        if not fs.islink(target):
             tags = dtags.list_tags(target)
             if not tags:
                 raise oserrors.is_a_directory(target)
             swap_candidate = tagnames.tag2path(rootpath, tags[0])
             swap_dir(rootpath, swap_candidate)
-            assert posixpath.islink(target)
+            assert fs.islink(target)
         dtags.remove_tag(target, tagnames.path2tag(rootpath, target))
-    os.unlink(target)
+    fs.unlink(target)
+    index.note_changed(rootpath, target)
 
 
+@events.traced('base.rename')
 def rename(rootpath, src, dst):
     """Rename src to dst and fix tags for directories.
 
@@ -86,6 +97,7 @@ def rename(rootpath, src, dst):
     unlink(rootpath, src)
 
 
+@events.traced('base.swap_dir')
 def swap_dir(rootpath, path):
     """Swap a symlink with its target directory.
 
@@ -95,7 +107,7 @@ def swap_dir(rootpath, path):
 
     """
     target = path
-    if posixpath.islink(target) and posixpath.isdir(target):
+    if fs.islink(target) and fs.isdir(target):
         here = target
         there = pathlib.readlink(target)
         # here is the symlink
@@ -104,13 +116,14 @@ def swap_dir(rootpath, path):
         there_tag = tagnames.path2tag(rootpath, there)
         dtags.remove_tag(here, here_tag)
         dtags.add_tag(here, there_tag)
-        os.unlink(here)
+        fs.unlink(here)
         # here is now nothing
         # there is now the dir
-        os.rename(there, here)
+        fs.rename(there, here)
         # here is now the dir
         # there is now nothing
-        os.symlink(here, there)
+        fs.symlink(here, there)
+        index.note_changed(rootpath, here, there)
     else:
         raise ValueError('{} is not a symlink to a directory'.format(target))
 
@@ -118,6 +131,8 @@ def swap_dir(rootpath, path):
 def list_links(top, path):
     """List all links to the target file.
 
+    A .dantalian directory directly under top is skipped.
+
     Args:
         top: Path to top of directory tree to search.
         path: Path of file.
@@ -126,10 +141,12 @@ def list_links(top, path):
         Generator yielding paths.
     """
     target = path
-    for (dirpath, dirnames, filenames) in os.walk(top):
+    for (dirpath, dirnames, filenames) in fs.walk(top):
+        if dirpath == top and '.dantalian' in dirnames:
+            dirnames.remove('.dantalian')
         for name in chain(dirnames, filenames):
             filepath = posixpath.join(dirpath, name)
-            if posixpath.samefile(target, filepath):
+            if fs.samefile(target, filepath):
                 yield filepath
 
 
@@ -157,16 +174,22 @@ def load_dtags(rootpath, dirpath):
     tags = dtags.list_tags(dirpath)
     dirpath = pathlib.readlink(dirpath)
     target = posixpath.abspath(dirpath)
+    dstpaths = []
     for tagname in tags:
         dstpath = tagnames.tag2path(rootpath, tagname)
-        os.symlink(target, dstpath)
+        fs.symlink(target, dstpath)
+        dstpaths.append(dstpath)
+    index.note_changed(rootpath, *dstpaths)
 
 
 def unload_dtags(rootpath, dirpath):
     """Remove symlinks using a directory's dtags."""
     tags = dtags.list_tags(dirpath)
     dirpath = pathlib.readlink(dirpath)
+    tagpaths = []
     for tagname in tags:
         tagpath = tagnames.tag2path(rootpath, tagname)
-        if posixpath.samefile(dirpath, tagpath):
-            os.unlink(tagpath)
+        if fs.samefile(dirpath, tagpath):
+            fs.unlink(tagpath)
+            tagpaths.append(tagpath)
+    index.note_changed(rootpath, *tagpaths)
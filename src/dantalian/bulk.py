@@ -23,11 +23,10 @@ directory trees.
 from collections import defaultdict
 from itertools import chain
 import logging
-import os
 import posixpath
-import shutil
 
 from dantalian import base
+from dantalian import fs
 from dantalian import oserrors
 from dantalian import pathlib
 from dantalian import tagging
@@ -39,11 +38,11 @@ _LOGGER = logging.getLogger(__name__)
 def clean_symlinks(dirpath):
     """Remove all broken symlinks under the given directory."""
     # Broken symlinks appear as files, so we skip directories.
-    for dirpath, _, filenames in os.walk(dirpath):
+    for dirpath, _, filenames in fs.walk(dirpath):
         for filename in filenames:
             path = posixpath.join(dirpath, filename)
-            if posixpath.islink(path) and not posixpath.exists(path):
-                os.unlink(path)
+            if fs.islink(path) and not fs.exists(path):
+                fs.unlink(path)
 
 
 def rename_all(rootpath, top, path, name):
@@ -63,7 +62,8 @@ def rename_all(rootpath, top, path, name):
     target = path
     newname = name
     seen = set()
-    for filepath in base.list_links(top, target):
+    # Collect the links first, since renaming them can rename the target.
+    for filepath in list(base.list_links(top, target)):
         dirname = posixpath.dirname(filepath)
         if dirname in seen:
             base.unlink(rootpath, filepath)
@@ -86,10 +86,10 @@ def unlink_all(rootpath, top, path):
 
     """
     target = path
-    if posixpath.isdir(target):
+    if fs.isdir(target):
         target = pathlib.readlink(target)
         base.unload_dtags(rootpath, target)
-        shutil.rmtree(target)
+        fs.rmtree(target)
     else:
         for path in base.list_links(top, target):
             base.unlink(rootpath, path)
@@ -146,6 +146,8 @@ def export_tags(rootpath, top, full=False):
 def _export_stat_map(rootpath, top):
     """Export a map of stat objects to sets of tags.
 
+    A .dantalian directory directly under top is skipped.
+
     Args:
         rootpath: Base path for tag conversions.
         top: Top of directory tree to export.
@@ -154,10 +156,12 @@ def _export_stat_map(rootpath, top):
 
     """
     stat_tag_map = defaultdict(set)
-    for dirpath, dirnames, filenames in os.walk(top):
+    for dirpath, dirnames, filenames in fs.walk(top):
+        if dirpath == top and '.dantalian' in dirnames:
+            dirnames.remove('.dantalian')
         for filename in chain(dirnames, filenames):
             path = posixpath.join(dirpath, filename)
-            stat = os.stat(path)
+            stat = fs.stat(path)
             tagname = tagnames.path2tag(rootpath, path)
             stat_tag_map[stat].add(tagname)
     return stat_tag_map
@@ -0,0 +1,486 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This module implements a resident daemon that answers queries from memory.
+
+The daemon loads a model of a library, mapping every directory to its entries
+and every inode to its paths, and keeps it current using inotify.  Queries are
+answered over a Unix socket in the library's .dantalian directory.  Use
+query() to ask a running daemon; it returns None when no daemon is running, so
+callers can fall back to doing the work themselves.
+
+The protocol is one JSON request and one JSON response per connection, each
+terminated by a newline.  Requests have an 'op' key; responses have a
+'results', 'error' or 'unsupported' key.  Requests the daemon can't answer
+from its model, such as queries filtering by stat attributes, are
+unsupported, and clients should do the work themselves.
+
+Directories that can't be watched, for example because the inotify watch
+limit was reached, are left out of the model, since it couldn't be kept
+current for them.  Searches read them from the filesystem, and requests that
+need the whole model are unsupported.  Clients give up waiting for a
+response after a timeout and also do the work themselves.
+
+"""
+
+from collections import defaultdict
+import json
+import logging
+import posixpath
+import selectors
+import socket
+
+from dantalian import findlib
+from dantalian import fs
+from dantalian import inotify
+from dantalian import library
+from dantalian import tagnames
+
+_LOGGER = logging.getLogger(__name__)
+
+_SOCKET = 'daemon.sock'
+_WATCH_MASK = inotify.DIR_CHANGES | inotify.IN_ONLYDIR
+# Seconds a client waits for the daemon.
+_TIMEOUT = 5
+
+
+def socket_path(rootpath):
+    """Return the path of a library's daemon socket."""
+    return library.get_resource(rootpath, _SOCKET)
+
+
+def _key(stat):
+    """Return the inode key for a stat result."""
+    return (stat.st_dev, stat.st_ino)
+
+
+class LibraryModel:
+
+    """In-memory model of a library's directories and inodes.
+
+    Attributes:
+        root: Real path of the library.
+        dirs: Dict mapping real directory paths to dicts mapping entry names
+            to inode keys.
+        paths: Dict mapping inode keys to sets of paths.
+        unwatched: Set of real directory paths that couldn't be watched, and
+            so are not in dirs.
+    """
+
+    def __init__(self, rootpath, watcher=None):
+        self.root = posixpath.realpath(rootpath)
+        self.dirs = {}
+        self.paths = defaultdict(set)
+        self.unwatched = set()
+        self._watcher = watcher
+        self._wds = {}
+        self._dir_wds = {}
+        self._dirty = set()
+        self._add_tree(self.root)
+
+    ###########################################################################
+    # maintenance
+    def _scan(self, dirpath):
+        """Scan a directory's entries.
+
+        Returns:
+            Tuple of dict mapping names to keys, and set of subdirectory
+            names.
+        """
+        entries = {}
+        subdirs = set()
+        try:
+            for entry in fs.scandir(dirpath):
+                try:
+                    entries[entry.name] = _key(entry.stat())
+                except FileNotFoundError:
+                    # Broken symlink.
+                    continue
+                if (entry.is_dir(follow_symlinks=False) and
+                        not (dirpath == self.root and
+                             entry.name == '.dantalian')):
+                    subdirs.add(entry.name)
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        return entries, subdirs
+
+    def _add_tree(self, top):
+        """Add a directory and everything under it."""
+        stack = [top]
+        while stack:
+            dirpath = stack.pop()
+            if dirpath in self.dirs:
+                continue
+            entries, subdirs = self._scan(dirpath)
+            if self._watch(dirpath):
+                self.unwatched.discard(dirpath)
+            else:
+                # Subdirectories may still be watchable.
+                self.unwatched.add(dirpath)
+                stack.extend(posixpath.join(dirpath, name)
+                             for name in subdirs)
+                continue
+            self.dirs[dirpath] = entries
+            for name, key in entries.items():
+                self.paths[key].add(posixpath.join(dirpath, name))
+            stack.extend(posixpath.join(dirpath, name) for name in subdirs)
+
+    def _drop_tree(self, top):
+        """Remove a directory and everything under it."""
+        prefix = top + '/'
+        self.unwatched = set(dirpath for dirpath in self.unwatched
+                             if dirpath != top
+                             and not dirpath.startswith(prefix))
+        for dirpath in [dirpath for dirpath in self.dirs
+                        if dirpath == top or dirpath.startswith(prefix)]:
+            for name, key in self.dirs.pop(dirpath).items():
+                self._remove_path(key, posixpath.join(dirpath, name))
+            self._unwatch(dirpath)
+
+    def _remove_path(self, key, path):
+        paths = self.paths.get(key)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del self.paths[key]
+
+    def _rescan(self, dirpath):
+        """Update a directory's entries.
+
+        Returns:
+            List of new subdirectories, which still need to be added.
+        """
+        old = self.dirs.get(dirpath)
+        if old is None:
+            return []
+        entries, subdirs = self._scan(dirpath)
+        new_dirs = []
+        for name, key in old.items():
+            path = posixpath.join(dirpath, name)
+            if entries.get(name) != key:
+                self._remove_path(key, path)
+                if path in self.dirs or path in self.unwatched:
+                    self._drop_tree(path)
+        for name, key in entries.items():
+            path = posixpath.join(dirpath, name)
+            if old.get(name) != key:
+                self.paths[key].add(path)
+            if name in subdirs and path not in self.dirs:
+                new_dirs.append(path)
+        self.dirs[dirpath] = entries
+        return new_dirs
+
+    def _watch(self, dirpath):
+        """Watch a directory and return whether it worked."""
+        if self._watcher is None:
+            return True
+        try:
+            wd = self._watcher.add_watch(dirpath, _WATCH_MASK)
+        except OSError as err:
+            _LOGGER.warning('Cannot watch %s, reading it from disk: %s',
+                            dirpath, err)
+            return False
+        self._wds[wd] = dirpath
+        self._dir_wds[dirpath] = wd
+        return True
+
+    def _unwatch(self, dirpath):
+        wd = self._dir_wds.pop(dirpath, None)
+        if wd is not None:
+            self._wds.pop(wd, None)
+            self._watcher.rm_watch(wd)
+
+    def process_events(self):
+        """Read pending inotify events and bring the model up to date."""
+        if self._watcher is None:
+            return
+        for event in self._watcher.read_events():
+            if event.mask & inotify.IN_Q_OVERFLOW:
+                _LOGGER.warning('inotify queue overflowed, rebuilding')
+                self.rebuild()
+                return
+            dirpath = self._wds.get(event.wd)
+            if dirpath is not None:
+                self._dirty.add(dirpath)
+        # Drop removed directories before adding new ones, so that a moved
+        # directory's old watch is removed before it is watched again.
+        new_dirs = []
+        for dirpath in sorted(self._dirty):
+            new_dirs.extend(self._rescan(dirpath))
+        self._dirty.clear()
+        for dirpath in new_dirs:
+            self._add_tree(dirpath)
+
+    def rebuild(self):
+        """Rebuild the whole model."""
+        for dirpath in list(self._dir_wds):
+            self._unwatch(dirpath)
+        self.dirs.clear()
+        self.paths.clear()
+        self.unwatched.clear()
+        self._dirty.clear()
+        self._add_tree(self.root)
+
+    ###########################################################################
+    # queries
+    def _real(self, path, cwd):
+        return posixpath.realpath(posixpath.join(cwd, path))
+
+    def _check_complete(self):
+        """Raise Unsupported if some directories aren't in the model."""
+        if self.unwatched:
+            raise Unsupported('{} directories are not watched'.format(
+                len(self.unwatched)))
+
+    def _translate(self, rootpath, path):
+        """Translate a model path to a path under the given rootpath."""
+        return posixpath.join(rootpath, posixpath.relpath(path, self.root))
+
+    def dir_results(self, dirpath, cwd='/'):
+        """Return a dict mapping inode keys to paths in a directory.
+
+        Paths are joined to dirpath as given, and the smallest name is kept
+        for files with several links, like findlib.DirNode.
+        """
+        entries = self.dirs.get(self._real(dirpath, cwd))
+        if entries is None:
+            # Not in the library, so ask the filesystem.
+            entries = {}
+            for name in fs.listdir(posixpath.join(cwd, dirpath)):
+                entries[name] = _key(fs.stat(
+                    posixpath.join(cwd, dirpath, name)))
+        results = {}
+        for name in sorted(entries, reverse=True):
+            results[entries[name]] = posixpath.join(dirpath, name)
+        return results
+
+    def search(self, rootpath, query, cwd='/'):
+        """Evaluate a query string like findlib.search()."""
+        tree = _model_tree(self, findlib.parse_query(rootpath, query), cwd)
+        return findlib.search(tree)
+
+    def list_links(self, rootpath, path, cwd='/'):
+        """Return all links to a file like base.list_links()."""
+        self._check_complete()
+        key = _key(fs.stat(posixpath.join(cwd, path)))
+        return [self._translate(rootpath, link)
+                for link in sorted(self.paths.get(key, ()))]
+
+    def export_tags(self, rootpath, top, full=False, cwd='/'):
+        """Export tags like bulk.export_tags()."""
+        self._check_complete()
+        realtop = self._real(top, cwd)
+        prefix = realtop + '/'
+        key_tags = defaultdict(set)
+        for dirpath, entries in self.dirs.items():
+            if dirpath != realtop and not dirpath.startswith(prefix):
+                continue
+            for name, key in entries.items():
+                if dirpath == self.root and name == '.dantalian':
+                    continue
+                key_tags[key].add(tagnames.path2tag(
+                    self.root, posixpath.join(dirpath, name)))
+        results = {}
+        for tags in key_tags.values():
+            tags = sorted(tags)
+            for tagname in (tags if full else tags[:1]):
+                results[tagnames.tag2path(rootpath, tagname)] = tags
+        return results
+
+
+class _ModelDirNode(findlib.DirNode):
+
+    """DirNode that gets its results from a LibraryModel."""
+
+    def __init__(self, model, dirpath, cwd):
+        super().__init__(dirpath)
+        self.model = model
+        self.cwd = cwd
+
+    def get_results(self):
+        return self.model.dir_results(self.dirpath, self.cwd)
+
+
+class Unsupported(Exception):
+
+    """The daemon can't answer a request, so the client should do the work."""
+
+
+def _model_tree(model, node, cwd):
+    """Replace the DirNodes in a query tree with model lookups.
+
+    Raises:
+        Unsupported: The tree has nodes that need stat objects, which the
+            model doesn't keep.
+    """
+    if node.__class__ in (findlib.AndNode, findlib.OrNode, findlib.MinusNode):
+        return node.with_children([_model_tree(model, child, cwd)
+                                   for child in node.children])
+    if node.__class__ is findlib.DirNode:
+        return _ModelDirNode(model, node.dirpath, cwd)
+    raise Unsupported('Cannot answer queries with {}'.format(
+        node.__class__.__name__))
+
+
+class Server:
+
+    """Daemon serving queries for a library model over a Unix socket."""
+
+    def __init__(self, rootpath, sockpath=None):
+        if sockpath is None:
+            sockpath = socket_path(rootpath)
+        self.sockpath = sockpath
+        self._watcher = inotify.Inotify()
+        self.model = LibraryModel(rootpath, self._watcher)
+        self._stopped = False
+        self._socket = _bind(sockpath)
+
+    def stop(self):
+        """Make serve() return."""
+        self._stopped = True
+
+    def close(self):
+        """Close the socket and inotify instance."""
+        self._socket.close()
+        self._watcher.close()
+        try:
+            fs.unlink(self.sockpath)
+        except FileNotFoundError:
+            pass
+
+    def serve(self, poll_interval=0.5):
+        """Serve requests until stop() is called."""
+        with selectors.DefaultSelector() as selector:
+            selector.register(self._socket, selectors.EVENT_READ)
+            selector.register(self._watcher, selectors.EVENT_READ)
+            while not self._stopped:
+                for key, _ in selector.select(poll_interval):
+                    if key.fileobj is self._socket:
+                        self._accept()
+                    else:
+                        self.model.process_events()
+
+    def _accept(self):
+        conn, _ = self._socket.accept()
+        with conn:
+            conn.settimeout(5)
+            try:
+                request = json.loads(_recv_line(conn))
+                # Make sure the model reflects changes made right before
+                # the request.
+                self.model.process_events()
+                response = {'results': self.handle(request)}
+            except Unsupported as err:
+                response = {'unsupported': str(err)}
+            except Exception as err:  # pylint: disable=broad-except
+                response = {'error': str(err)}
+            try:
+                conn.sendall(json.dumps(response).encode() + b'\n')
+            except OSError as err:
+                _LOGGER.warning('Failed to send response: %s', err)
+
+    def handle(self, request):
+        """Handle a request and return its results."""
+        operation = request['op']
+        cwd = request.get('cwd', '/')
+        if operation == 'ping':
+            return 'pong'
+        elif operation == 'search':
+            return self.model.search(request['rootpath'], request['query'],
+                                     cwd)
+        elif operation == 'list':
+            return self.model.list_links(request['rootpath'],
+                                         request['path'], cwd)
+        elif operation == 'export':
+            return self.model.export_tags(request['rootpath'], request['top'],
+                                          request.get('full', False), cwd)
+        else:
+            raise ValueError('Unknown operation {!r}'.format(operation))
+
+
+def _bind(sockpath):
+    """Bind a listening Unix socket, replacing a stale one."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.bind(sockpath)
+    except OSError:
+        if _connect(sockpath) is not None:
+            sock.close()
+            raise
+        fs.unlink(sockpath)
+        sock.bind(sockpath)
+    sock.listen(16)
+    return sock
+
+
+def _connect(sockpath):
+    """Connect to a daemon socket, or return None."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(sockpath)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def _recv_line(conn):
+    """Receive data until a newline or EOF."""
+    chunks = []
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b'\n'):
+            break
+    return b''.join(chunks).decode()
+
+
+def query(rootpath, request):
+    """Send a request to the library's daemon.
+
+    Returns:
+        The results, or None if no daemon is running, it can't answer the
+        request or it doesn't respond in time.
+
+    Raises:
+        RuntimeError: The daemon returned an error.
+    """
+    if rootpath is None:
+        return None
+    sockpath = socket_path(rootpath)
+    if not fs.lexists(sockpath):
+        return None
+    sock = _connect(sockpath)
+    if sock is None:
+        return None
+    with sock:
+        sock.settimeout(_TIMEOUT)
+        try:
+            sock.sendall(json.dumps(request).encode() + b'\n')
+            response = json.loads(_recv_line(sock))
+        except (OSError, ValueError) as err:
+            # Includes timeouts and daemons that exit without responding.
+            _LOGGER.warning('Daemon did not respond: %s', err)
+            return None
+    if 'error' in response:
+        raise RuntimeError(response['error'])
+    if 'unsupported' in response:
+        _LOGGER.debug('Daemon cannot answer: %s', response['unsupported'])
+        return None
+    return response['results']
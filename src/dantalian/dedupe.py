@@ -0,0 +1,221 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This module implements merging identical files.
+
+find_duplicates() finds distinct regular files in a library with the same
+contents.  Candidates are narrowed down cheaply first: files are grouped by
+device and size, then by a hash of their first block, and only files that
+still collide have their full contents hashed, in a process pool.
+
+merge() replaces every link of each duplicate with a link to the file that
+is kept, in the same directory and under the same name, so the kept file
+ends up with the tags of all of its copies.  The metadata of the copies,
+such as permissions and modification times, is not kept.
+
+"""
+
+from collections import defaultdict
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import logging
+import posixpath
+
+from dantalian import base
+from dantalian import fs
+from dantalian import index
+
+_LOGGER = logging.getLogger(__name__)
+
+_BLOCK_SIZE = 1 << 16
+_TMP_SUFFIX = '.dantalian-dedupe'
+
+Duplicates = namedtuple('Duplicates', 'size,keep,copies,stamps')
+Duplicates.__doc__ = """Group of identical files.
+
+Attributes:
+    size: Size of each file in bytes.
+    keep: List of the paths of the file to keep.
+    copies: List of a list of paths for each copy to merge into it.
+    stamps: Dict mapping (st_dev, st_ino) of each file to the
+        (st_size, st_mtime_ns) it had when it was hashed.
+"""
+
+_File = namedtuple('_File', 'key,size,mtime,paths')
+_DTAGS_FILE = '.dtags'
+
+
+def _hash_file(path, size=None):
+    """Return the BLAKE2 digest of a file, or of its first size bytes."""
+    digest = hashlib.blake2b()
+    with fs.open_file(path, 'rb') as file:
+        if size is not None:
+            digest.update(file.read(size))
+        else:
+            for block in iter(lambda: file.read(_BLOCK_SIZE), b''):
+                digest.update(block)
+    return digest.digest()
+
+
+def _hash_head(path):
+    """Return the digest of the first block of a file."""
+    return _hash_file(path, _BLOCK_SIZE)
+
+
+def _walk_files(rootpath):
+    """Return a dict mapping (st_dev, st_size) to lists of _Files.
+
+    Empty files and dtags files are skipped.  Directories in the library's
+    .dantalian directory are not walked.
+    """
+    rootpath = posixpath.normpath(rootpath)
+    files = {}
+    stack = [rootpath]
+    while stack:
+        dirpath = stack.pop()
+        for entry in fs.scandir(dirpath):
+            if entry.is_dir(follow_symlinks=False):
+                if not (dirpath == rootpath and entry.name == '.dantalian'):
+                    stack.append(entry.path)
+            elif (entry.name != _DTAGS_FILE
+                  and entry.is_file(follow_symlinks=False)):
+                stat = entry.stat(follow_symlinks=False)
+                if not stat.st_size:
+                    continue
+                key = (stat.st_dev, stat.st_ino)
+                if key not in files:
+                    files[key] = _File(key, stat.st_size, stat.st_mtime_ns,
+                                       [])
+                files[key].paths.append(entry.path)
+    groups = defaultdict(list)
+    for file in files.values():
+        dev, _ = file.key
+        groups[(dev, file.size)].append(file)
+    return groups
+
+
+def _split(files, hashes):
+    """Split files by their hashes, dropping files that don't collide."""
+    groups = defaultdict(list)
+    for file, digest in zip(files, hashes):
+        groups[digest].append(file)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def find_duplicates(rootpath, jobs=None):
+    """Find identical regular files in a library.
+
+    Args:
+        rootpath: Path of library.
+        jobs: Number of processes for hashing whole files.  The default is
+            the number of CPUs.
+
+    Returns:
+        List of Duplicates.  The file kept is the one with the most links in
+        the library.
+    """
+    candidates = []
+    for (_, size), files in _walk_files(rootpath).items():
+        if len(files) < 2:
+            continue
+        for group in _split(files, (_hash_head(file.paths[0])
+                                    for file in files)):
+            candidates.append((size, group))
+    _LOGGER.debug('%d candidate groups after partial hashing',
+                  len(candidates))
+    # Files no bigger than a block are already fully hashed.
+    small = [item for item in candidates if item[0] <= _BLOCK_SIZE]
+    large = [item for item in candidates if item[0] > _BLOCK_SIZE]
+    paths = [file.paths[0] for _, group in large for file in group]
+    if paths:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            hashes = iter(list(executor.map(_hash_file, paths)))
+        large = [(size, subgroup) for size, group in large
+                 for subgroup in _split(group, [next(hashes) for _ in group])]
+    duplicates = []
+    for size, group in small + large:
+        group.sort(key=lambda file: (-len(file.paths), min(file.paths)))
+        keep, *copies = group
+        duplicates.append(Duplicates(
+            size, sorted(keep.paths),
+            [sorted(file.paths) for file in copies],
+            dict((file.key, (file.size, file.mtime)) for file in group)))
+    duplicates.sort(key=lambda dup: dup.keep)
+    return duplicates
+
+
+def reclaimable(duplicates):
+    """Return the number of bytes that merging duplicates would free.
+
+    A copy only frees its space if all of its links are in the library.
+    """
+    total = 0
+    for duplicate in duplicates:
+        for paths in duplicate.copies:
+            if fs.lstat(paths[0]).st_nlink == len(paths):
+                total += duplicate.size
+    return total
+
+
+def _replace(rootpath, src, path):
+    """Replace the file at path with a link to src, atomically."""
+    tmp = path + _TMP_SUFFIX
+    base.link(rootpath, src, tmp)
+    try:
+        fs.rename(tmp, path)
+    except OSError:
+        fs.unlink(tmp)
+        raise
+    index.note_changed(rootpath, path)
+
+
+def _unchanged(duplicate, path):
+    """Check that a file is the same as when it was hashed."""
+    try:
+        stat = fs.lstat(path)
+    except FileNotFoundError:
+        return False
+    stamp = duplicate.stamps.get((stat.st_dev, stat.st_ino))
+    return stamp == (stat.st_size, stat.st_mtime_ns)
+
+
+def merge(rootpath, duplicates):
+    """Merge each group of duplicates into the file kept.
+
+    Links of copies in a directory that already has a link to the kept file
+    are removed; others are replaced with links to the kept file.  Files
+    whose size or modification time changed since they were hashed are
+    skipped.
+    """
+    for duplicate in duplicates:
+        src = duplicate.keep[0]
+        if not _unchanged(duplicate, src):
+            _LOGGER.warning('Skipping %s, which changed', src)
+            continue
+        dirs = set(posixpath.dirname(path) for path in duplicate.keep)
+        for paths in duplicate.copies:
+            if not all(_unchanged(duplicate, path) for path in paths):
+                _LOGGER.warning('Skipping %s, which changed', paths[0])
+                continue
+            for path in paths:
+                dirpath = posixpath.dirname(path)
+                if dirpath in dirs:
+                    base.unlink(rootpath, path)
+                else:
+                    _replace(rootpath, src, path)
+                    dirs.add(dirpath)
@@ -22,9 +22,12 @@ not belong in here.
 
 """
 
-import os
 import posixpath
 
+from dantalian import events
+from dantalian import fs
+from dantalian import locks
+
 _DTAGS_FILE = '.dtags'
 
 
@@ -37,14 +40,19 @@ def open_dtags(dirpath, mode='r'):
     """Open dtags file of directory with given mode."""
     tags_file = _dtags_file(dirpath)
     try:
-        return open(tags_file, mode)
+        return fs.open_file(tags_file, mode)
     except FileNotFoundError:
-        os.mknod(tags_file)
-        return open(tags_file, mode)
+        try:
+            fs.mknod(tags_file)
+        except FileExistsError:
+            # Another process created it first.
+            pass
+        return fs.open_file(tags_file, mode)
 
 
 def write_tag(file, tagname):
     """Write tag to file at current position."""
+    fs.count('dtags_write')
     file.write(tagname + '\n')
 
 
@@ -63,21 +71,24 @@ def read_tags(file):
         List of tagnames.
 
     """
+    fs.count('dtags_read')
     return file.read().splitlines()
 
 
+@events.traced('dtags.add_tag')
 def add_tag(dirpath, tagname):
     """Add tag to directory's dtags if not already added."""
-    with open_dtags(dirpath, 'r+') as file:
+    with open_dtags(dirpath, 'r+') as file, locks.lock_file(file):
         tags = read_tags(file)
         if tagname in tags:
             return
         write_tag(file, tagname)
 
 
+@events.traced('dtags.remove_tag')
 def remove_tag(dirpath, tagname):
     """Remove tag from directory's dtags if it exists."""
-    with open_dtags(dirpath, 'r+') as file:
+    with open_dtags(dirpath, 'r+') as file, locks.lock_file(file):
         tags = read_tags(file)
         if tagname not in tags:
             return
@@ -89,23 +100,25 @@ def remove_tag(dirpath, tagname):
 
 def list_tags(dirpath):
     """Return a list of a directory's dtags."""
-    with open_dtags(dirpath, 'r+') as file:
+    with open_dtags(dirpath, 'r+') as file, locks.lock_file(file, shared=True):
         return read_tags(file)
 
 
+@events.traced('dtags.set_tags')
 def set_tags(dirpath, tags):
     """Set a directory's tags to the provided list."""
-    with open_dtags(dirpath, 'r+') as file:
+    with open_dtags(dirpath, 'r+') as file, locks.lock_file(file):
         write_tags(file, tags)
 
 
+@events.traced('dtags.rename_all')
 def rename_all(dirpath, name):
     """Rename all dtags of the given directory.
 
     Rename all of the dtags' basenames.
 
     """
-    with open_dtags(dirpath, 'r+') as file:
+    with open_dtags(dirpath, 'r+') as file, locks.lock_file(file):
         tags = read_tags(file)
         tags = [posixpath.join(posixpath.dirname(tag), name) for tag in tags]
         write_tags(file, tags)
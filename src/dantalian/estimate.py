@@ -0,0 +1,267 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This module implements estimating the number of results of a query.
+
+Each directory in a query is summarized by a bottom-k sketch: the number of
+files in it and the k smallest hashes of their inodes.  Because every sketch
+uses the same hash function, the sketches are coordinated samples: the k
+smallest hashes of the union of all of a query's directories can be tested
+for membership in every directory, so any AND, OR and MINUS tree can be
+evaluated on that sample.  The fraction of the sample in the results, times
+the estimated size of the union, estimates the number of results.
+
+If every directory has at most k files, the sketches are complete and the
+count is exact.
+
+Building a sketch needs only a directory listing, since inode numbers are
+taken from the listing.  Sketches are cached by directory inode and
+modification time, in the library at .dantalian/sketches.json if a library
+is given, so estimating again only needs to stat() each directory.
+
+"""
+
+import array
+import base64
+from collections import namedtuple
+import heapq
+import logging
+import math
+
+from dantalian import findlib
+from dantalian import fs
+from dantalian import library
+from dantalian import locks
+from dantalian import tagnames
+
+_LOGGER = logging.getLogger(__name__)
+
+K = 1024
+
+_SKETCHES = 'sketches.json'
+_MASK = (1 << 64) - 1
+# z for a two-sided 95% confidence interval.
+_Z = 1.96
+
+Estimate = namedtuple('Estimate', 'value,error')
+Estimate.__doc__ = """Estimated result count.
+
+Attributes:
+    value: Estimated number of results.
+    error: Half width of the 95% confidence interval, or 0 if exact.
+"""
+
+
+def _hash(key):
+    """Hash a (device, inode number) key to 64 bits with splitmix64."""
+    dev, ino = key
+    value = (ino + dev * 0x9E3779B97F4A7C15) & _MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK
+    return value ^ (value >> 31)
+
+
+class Sketch:
+
+    """Bottom-k sketch of a set of inodes.
+
+    Attributes:
+        count: Number of inodes in the set.
+        hashes: Sorted list of the k smallest inode hashes.
+    """
+
+    def __init__(self, count, hashes):
+        self.count = count
+        self.hashes = hashes
+        self._members = frozenset(hashes)
+
+    @classmethod
+    def from_keys(cls, keys, k=K):
+        """Make a sketch from (device, inode number) keys."""
+        hashes = set(_hash(key) for key in keys)
+        return cls(len(hashes), heapq.nsmallest(k, hashes))
+
+    @property
+    def complete(self):
+        """Whether the sketch contains every hash of the set."""
+        return len(self.hashes) == self.count
+
+    def __contains__(self, hash_value):
+        return hash_value in self._members
+
+    def to_json(self):
+        """Return a JSON serializable representation."""
+        data = array.array('Q', self.hashes).tobytes()
+        return {'count': self.count,
+                'hashes': base64.b64encode(data).decode('ascii')}
+
+    @classmethod
+    def from_json(cls, data):
+        """Make a sketch from to_json() output."""
+        hashes = array.array('Q')
+        hashes.frombytes(base64.b64decode(data['hashes']))
+        return cls(data['count'], hashes.tolist())
+
+
+class SketchCache:
+
+    """Cache of directory sketches.
+
+    If rootpath is given, sketches of directories are loaded from and saved
+    to the library.  Use save() to save new sketches.
+    """
+
+    def __init__(self, rootpath=None, k=K):
+        self.rootpath = rootpath
+        self.k = k
+        self._sketches = {}
+        self._dirty = False
+        if rootpath is not None:
+            self._load()
+
+    def _path(self):
+        return library.get_resource(self.rootpath, _SKETCHES)
+
+    def _load(self):
+        import json  # pylint: disable=import-outside-toplevel
+        try:
+            with fs.open_file(self._path()) as file, \
+                    locks.lock_file(file, shared=True):
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return
+        for tagname, entry in data.items():
+            if entry['k'] != self.k:
+                continue
+            self._sketches[tagname] = (tuple(entry['stamp']),
+                                       Sketch.from_json(entry))
+
+    def save(self):
+        """Save sketches to the library, if there is one and they changed."""
+        if self.rootpath is None or not self._dirty:
+            return
+        import json  # pylint: disable=import-outside-toplevel
+        data = {}
+        for tagname, (stamp, sketch) in self._sketches.items():
+            entry = sketch.to_json()
+            entry['stamp'] = list(stamp)
+            entry['k'] = self.k
+            data[tagname] = entry
+        # Truncate only once the lock is held, so readers never see a
+        # partly written file.
+        with fs.open_file(self._path(), 'a+') as file, \
+                locks.lock_file(file):
+            file.seek(0)
+            file.truncate()
+            json.dump(data, file)
+        self._dirty = False
+
+    def _key(self, dirpath):
+        if self.rootpath is None:
+            return dirpath
+        return tagnames.path2tag(self.rootpath, dirpath)
+
+    def sketch(self, dirpath):
+        """Return an up to date sketch of a directory."""
+        stat = fs.stat(dirpath)
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        key = self._key(dirpath)
+        cached = self._sketches.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        _LOGGER.debug('Sketching %s', dirpath)
+        sketch = Sketch.from_keys(findlib.DirNode(dirpath).inode_keys(),
+                                  self.k)
+        self._sketches[key] = (stamp, sketch)
+        self._dirty = True
+        return sketch
+
+
+def _leaves(node, cache):
+    """Replace the leaves of a query tree with sketches.
+
+    GlobNodes become OR nodes of their directories.  Nodes that can't be
+    sketched from directory listings, such as filter nodes, are evaluated.
+    """
+    if node.__class__ in (findlib.AndNode, findlib.OrNode, findlib.MinusNode):
+        return node.with_children([_leaves(child, cache)
+                                   for child in node.children])
+    elif node.__class__ is findlib.DirNode:
+        return cache.sketch(node.dirpath)
+    elif node.__class__ is findlib.GlobNode:
+        return findlib.OrNode([cache.sketch(dirpath)
+                               for dirpath in node.expand()])
+    return Sketch.from_keys(findlib.inodes(node), cache.k)
+
+
+def _iter_sketches(node):
+    if isinstance(node, Sketch):
+        yield node
+    else:
+        for child in node.children:
+            yield from _iter_sketches(child)
+
+
+def _member(node, hash_value):
+    """Return whether a hash is in the results of a tree of sketches."""
+    if isinstance(node, Sketch):
+        return hash_value in node
+    elif node.__class__ is findlib.AndNode:
+        return all(_member(child, hash_value) for child in node.children)
+    elif node.__class__ is findlib.OrNode:
+        return any(_member(child, hash_value) for child in node.children)
+    return (_member(node.children[0], hash_value) and
+            not any(_member(child, hash_value)
+                    for child in node.children[1:]))
+
+
+def estimate(search_node, cache=None):
+    """Estimate the number of results of a query.
+
+    Args:
+        search_node: Query tree.
+        cache: SketchCache to use.  Defaults to a new cache without a
+            library.
+
+    Returns:
+        Estimate tuple.
+    """
+    if cache is None:
+        cache = SketchCache()
+    tree = _leaves(search_node, cache)
+    if isinstance(tree, Sketch):
+        return Estimate(tree.count, 0)
+    sketches = list(_iter_sketches(tree))
+    if all(sketch.complete for sketch in sketches):
+        union = set().union(*(sketch.hashes for sketch in sketches))
+        return Estimate(sum(1 for hash_value in union
+                            if _member(tree, hash_value)), 0)
+    k = cache.k
+    # Every directory's sketch contains all of its hashes up to the k-th
+    # smallest hash of the union, so the sample can be tested exactly.
+    sample = heapq.nsmallest(
+        k, set().union(*(sketch.hashes for sketch in sketches)))
+    threshold = (sample[-1] + 1) / (1 << 64)
+    union_size = (k - 1) / threshold
+    hits = sum(1 for hash_value in sample if _member(tree, hash_value))
+    if hits == 0:
+        # Rule of three for an upper bound.
+        return Estimate(0, 3 / k * union_size)
+    fraction = hits / k
+    value = fraction * union_size
+    relative = math.sqrt(1 / (k - 2) + (1 - fraction) / hits)
+    return Estimate(value, _Z * relative * value)
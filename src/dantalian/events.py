@@ -0,0 +1,128 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This module implements operation events.
+
+Primitive operations, such as base.link() and dtags mutations, fire an event
+before and after they run.  Subscribers can use these for tracing, profiling
+or auditing:
+
+    >>> def log_event(event):
+    ...     if event.when == 'after':
+    ...         print(event.name, event.args, event.duration, event.error)
+    >>> with subscribed(log_event):
+    ...     base.link(rootpath, 'foo', 'bar/foo')
+    base.link ('/lib', 'foo', 'bar/foo') 4.2e-05 None
+
+When nothing is subscribed, operations are called directly, so the overhead is
+a single check.
+
+"""
+
+from contextlib import contextmanager
+import functools
+import time
+
+_SUBSCRIBERS = []
+
+
+class Event:
+
+    """An operation event.
+
+    Attributes:
+        name: Name of the operation, e.g. 'base.link'.
+        when: 'before' or 'after' the operation.
+        args: Tuple of positional arguments to the operation.
+        kwargs: Dict of keyword arguments to the operation.
+        duration: Wall time of the operation in seconds, or None before.
+        result: Return value of the operation, or None.
+        error: Exception raised by the operation, or None.
+    """
+
+    # pylint: disable=too-few-public-methods,too-many-arguments
+
+    def __init__(self, name, when, args, kwargs,
+                 duration=None, result=None, error=None):
+        self.name = name
+        self.when = when
+        self.args = args
+        self.kwargs = kwargs
+        self.duration = duration
+        self.result = result
+        self.error = error
+
+    def __repr__(self):
+        return 'Event({!r}, {!r}, {!r}, {!r}, {!r}, {!r}, {!r})'.format(
+            self.name, self.when, self.args, self.kwargs,
+            self.duration, self.result, self.error)
+
+
+def subscribe(callback):
+    """Subscribe a callback to all events.
+
+    The callback is called with an Event.  Exceptions raised by callbacks are
+    not caught.
+    """
+    _SUBSCRIBERS.append(callback)
+
+
+def unsubscribe(callback):
+    """Unsubscribe a callback."""
+    _SUBSCRIBERS.remove(callback)
+
+
+@contextmanager
+def subscribed(callback):
+    """Subscribe a callback for the duration of the context."""
+    subscribe(callback)
+    try:
+        yield
+    finally:
+        unsubscribe(callback)
+
+
+def _fire(event):
+    """Call subscribers with an event."""
+    for callback in list(_SUBSCRIBERS):
+        callback(event)
+
+
+def traced(name):
+    """Decorate a function to fire events when it is called.
+
+    Args:
+        name: Operation name to use in events.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _SUBSCRIBERS:
+                return func(*args, **kwargs)
+            _fire(Event(name, 'before', args, kwargs))
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as err:
+                _fire(Event(name, 'after', args, kwargs,
+                            duration=time.perf_counter() - start, error=err))
+                raise
+            _fire(Event(name, 'after', args, kwargs,
+                        duration=time.perf_counter() - start, result=result))
+            return result
+        return wrapper
+    return decorate
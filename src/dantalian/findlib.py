@@ -21,12 +21,21 @@
 
 import abc
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+import fnmatch
 import functools
+import heapq
 import logging
-import os
+import operator
+import posixpath
+import re
 import shlex
+import stat
+import time
 
-from dantalian import pathlib
+from dantalian import events
+from dantalian import fs
 from dantalian import tagnames
 
 _LOGGER = logging.getLogger(__name__)
@@ -44,6 +53,152 @@ def search(search_node):
     return list(search_node.get_results().values())
 
 
+def _search_query(rootpath, query):
+    return search(parse_query(rootpath, query))
+
+
+def search_libraries(rootpaths, query, jobs=None, search_func=None,
+                     errors=None):
+    """Search several libraries concurrently.
+
+    The query is parsed separately for each library, so tagnames refer to
+    each library's own tags.  Errors are logged per library instead of
+    aborting the other searches.
+
+    Args:
+        rootpaths: List of library rootpaths.
+        query: Search query string.
+        jobs: Number of libraries to search at once.  Defaults to all of
+            them.
+        search_func: Function called with a rootpath and query, returning a
+            list of paths.  Defaults to parsing the query and calling
+            search().
+        errors: Optional list.  The rootpaths of libraries whose search
+            failed are appended to it.
+
+    Returns:
+        Generator yielding (rootpath, path) tuples, each library's results
+        together, in the order the searches finish.
+    """
+    if search_func is None:
+        search_func = _search_query
+    if not rootpaths:
+        return
+    with ThreadPoolExecutor(max_workers=jobs or len(rootpaths)) as executor:
+        futures = dict((executor.submit(search_func, rootpath, query),
+                        rootpath)
+                       for rootpath in rootpaths)
+        for future in as_completed(futures):
+            rootpath = futures[future]
+            try:
+                results = future.result()
+            except Exception as err:  # pylint: disable=broad-except
+                _LOGGER.error('%s: %s', rootpath, err)
+                if errors is not None:
+                    errors.append(rootpath)
+                continue
+            for path in results:
+                yield rootpath, path
+
+
+def count(search_node):
+    """Return the number of results of a query.
+
+    Paths are never built; only device and inode numbers are tracked.
+    """
+    return len(inodes(search_node))
+
+
+def inodes(search_node):
+    """Return the set of (device, inode number) keys of a query's results.
+
+    This is cheaper than get_results(), because AND, OR and MINUS nodes and
+    the leaves under them don't build paths, and DirNodes use the inode
+    numbers from directory listings instead of stat()ing regular files.
+    Other nodes fall back to get_results().
+    """
+    node = search_node
+    if node.__class__ is AndNode:
+        return functools.reduce(set.intersection,
+                                (inodes(child) for child in node.children))
+    elif node.__class__ is OrNode:
+        return set().union(*(inodes(child) for child in node.children))
+    elif node.__class__ is MinusNode:
+        return inodes(node.children[0]).difference(
+            *(inodes(child) for child in node.children[1:]))
+    elif node.__class__ is DirNode:
+        return set(node.inode_keys())
+    elif node.__class__ is GlobNode:
+        return set().union(*(DirNode(dirpath).inode_keys()
+                             for dirpath in node.expand()))
+    return set(_inode_key(inode) for inode in node.get_results())
+
+
+def has_stat_filter(search_node):
+    """Return whether a query tree contains a StatFilterNode.
+
+    The results of such queries can change without any directory changing,
+    for example when a file is written to or linked elsewhere.
+    """
+    if isinstance(search_node, StatFilterNode):
+        return True
+    if isinstance(search_node, GroupNode):
+        return any(has_stat_filter(child) for child in search_node.children)
+    return False
+
+
+def rank(search_nodes, weights=None, top=None):
+    """Return paths ranked by how many query nodes they match.
+
+    Each node is evaluated once.  A file's score is the sum of the weights of
+    the nodes whose results contain it.
+
+    Args:
+        search_nodes: List of query nodes, for example DirNodes for tags.
+        weights: List of weights for the nodes.  Defaults to 1 for each.
+        top: Number of results to return, or None for all of them.  Only
+            this many results are kept in a heap while ranking.
+
+    Returns:
+        List of (score, path) tuples, highest score first.  Ties are broken
+        by path.
+    """
+    if weights is None:
+        weights = [1] * len(search_nodes)
+    scores = {}
+    paths = {}
+    for node, weight in zip(search_nodes, weights):
+        for inode, path in node.get_results().items():
+            key = _inode_key(inode)
+            if key in scores:
+                scores[key] += weight
+            else:
+                scores[key] = weight
+                paths[key] = path
+    ranked = ((score, paths[key]) for key, score in scores.items())
+    if top is None:
+        return sorted(ranked, key=_rank_order)
+    return heapq.nsmallest(top, ranked, key=_rank_order)
+
+
+def _rank_order(item):
+    """Sort key for (score, path) tuples, highest score first."""
+    score, path = item
+    return (-score, path)
+
+
+def _inode_key(inode):
+    """Return a (device, inode number) key for a result key.
+
+    Stat objects of the same file from different directories may differ in
+    their timestamps, so they aren't compared directly.
+    """
+    try:
+        return (inode.st_dev, inode.st_ino)
+    except AttributeError:
+        return inode
+
+
 class SearchNode(metaclass=abc.ABCMeta):
 
     """Abstract interface for search query nodes.
@@ -68,6 +223,10 @@ class GroupNode(SearchNode, metaclass=abc.ABCMeta):
     def __init__(self, children):
         self.children = children
 
+    def with_children(self, children):
+        """Return a copy of this node with different children."""
+        return self.__class__(children)
+
     def __eq__(self, other):
         return (self.__class__ is other.__class__ and
                 len(self.children) == len(other.children) and
@@ -81,6 +240,7 @@ class AndNode(GroupNode):
     AndNode merges the results of its children nodes by set intersection.
     """
 
+    @events.traced('findlib.get_results')
     def get_results(self):
         results = self.children[0].get_results()
         inodes = (set(node.get_results()) for node in self.children)
@@ -94,6 +254,7 @@ class OrNode(GroupNode):
     OrNode merges the results of its children nodes by set union.
     """
 
+    @events.traced('findlib.get_results')
     def get_results(self):
         results = {}
         for node in self.children:
@@ -111,6 +272,7 @@ class MinusNode(GroupNode):
     rest of its children.
     """
 
+    @events.traced('findlib.get_results')
     def get_results(self):
         results = self.children[0].get_results()
         for node in self.children[1:]:
@@ -121,6 +283,238 @@ class MinusNode(GroupNode):
         return results
 
 
+class FilterNode(GroupNode, metaclass=abc.ABCMeta):
+
+    """Abstract class for nodes that filter results.
+
+    Results are the union of the results of the children, like OrNode,
+    filtered by a predicate.  Filter nodes are written in queries as the
+    keyword, a spec and the children, for example 'LINKS 1 foo END'.
+
+    Attributes:
+        keyword: Query language keyword for the node.
+        spec: Spec string the node was created with.
+    """
+
+    keyword = None
+
+    def __init__(self, spec, children):
+        super().__init__(children)
+        self.spec = spec
+
+    def __eq__(self, other):
+        return super().__eq__(other) and self.spec == other.spec
+
+    def with_children(self, children):
+        return self.__class__(self.spec, children)
+
+    @abc.abstractmethod
+    def matches(self, inode, path):
+        """Return whether a result passes the filter."""
+
+    def _child_results(self, node):
+        """Return the results of a child node."""
+        return node.get_results()
+
+    @events.traced('findlib.get_results')
+    def get_results(self):
+        results = {}
+        for node in self.children:
+            for inode, path in self._child_results(node).items():
+                if inode not in results and self.matches(inode, path):
+                    results[inode] = path
+        return results
+
+
+class StatFilterNode(FilterNode, metaclass=abc.ABCMeta):
+
+    """Abstract class for nodes that filter by stat attributes.
+
+    Results are filtered by comparing an attribute of the stat objects to a
+    value.  The stat objects are the keys of the children's results, so
+    filtering doesn't need any system calls.
+
+    The spec is a comparison operator (=, !=, <, <=, >, >=; = if omitted)
+    followed by a value, for example '>=5'.
+    """
+
+    _OPERATORS = (('<=', operator.le), ('>=', operator.ge),
+                  ('!=', operator.ne), ('<', operator.lt),
+                  ('>', operator.gt), ('=', operator.eq))
+
+    def __init__(self, spec, children):
+        super().__init__(spec, children)
+        self.compare, value = self._parse_operator(spec)
+        self.value = self.parse_value(value)
+
+    @classmethod
+    def _parse_operator(cls, spec):
+        for token, func in cls._OPERATORS:
+            if spec.startswith(token):
+                return func, spec[len(token):]
+        return operator.eq, spec
+
+    @abc.abstractmethod
+    def parse_value(self, value):
+        """Parse the value part of a spec, raising ValueError if invalid."""
+
+    @abc.abstractmethod
+    def stat_value(self, stat_result):
+        """Return the attribute of a stat object to compare."""
+
+    def matches(self, inode, path):
+        return self.compare(self.stat_value(inode), self.value)
+
+
+class LinksNode(StatFilterNode):
+
+    """
+    LinksNode filters by link count, for example 'LINKS 1' for files with
+    only one link.
+    """
+
+    keyword = 'LINKS'
+
+    def parse_value(self, value):
+        return int(value)
+
+    def stat_value(self, stat_result):
+        return stat_result.st_nlink
+
+
+class SizeNode(StatFilterNode):
+
+    """
+    SizeNode filters by size in bytes.  Values may have a k, M, G or T suffix
+    for powers of 1024, for example 'SIZE >10M'.
+    """
+
+    keyword = 'SIZE'
+    _SUFFIXES = {'k': 1 << 10, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30,
+                 'T': 1 << 40}
+
+    def parse_value(self, value):
+        if value and value[-1] in self._SUFFIXES:
+            return int(value[:-1]) * self._SUFFIXES[value[-1]]
+        return int(value)
+
+    def stat_value(self, stat_result):
+        return stat_result.st_size
+
+
+class MtimeNode(StatFilterNode):
+
+    """
+    MtimeNode filters by modification time.  Values are dates like
+    2015-01-31, 2015-01-31T12:00 or 2015-01-31T12:00:00 in local time, or ages
+    like 30s, 15m, 12h, 7d or 2w meaning that long before the node was
+    created.  For example, 'MTIME >7d' means modified in the last seven days.
+    """
+
+    keyword = 'MTIME'
+    _UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+    _FORMATS = ('%Y-%m-%d', '%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S')
+
+    def parse_value(self, value):
+        match = re.fullmatch(r'(\d+)([smhdw])', value)
+        if match:
+            return time.time() - int(match.group(1)) * self._UNITS[
+                match.group(2)]
+        for fmt in self._FORMATS:
+            try:
+                return time.mktime(time.strptime(value, fmt))
+            except ValueError:
+                continue
+        raise ValueError('Invalid time {!r}'.format(value))
+
+    def stat_value(self, stat_result):
+        return stat_result.st_mtime
+
+
+class TypeNode(StatFilterNode):
+
+    """
+    TypeNode filters by file type: f for regular files, d for directories, p
+    for FIFOs, s for sockets, c for character devices and b for block
+    devices.  Only = and != make sense.  Since DirNode follows symlinks,
+    symlinks have the type of their targets.
+    """
+
+    keyword = 'TYPE'
+    _TYPES = {'f': stat.S_IFREG, 'd': stat.S_IFDIR, 'p': stat.S_IFIFO,
+              's': stat.S_IFSOCK, 'c': stat.S_IFCHR, 'b': stat.S_IFBLK}
+
+    def parse_value(self, value):
+        try:
+            return self._TYPES[value]
+        except KeyError:
+            raise ValueError('Invalid file type {!r}'.format(value)) from None
+
+    def stat_value(self, stat_result):
+        return stat.S_IFMT(stat_result.st_mode)
+
+
+class NameFilterNode(FilterNode, metaclass=abc.ABCMeta):
+
+    """Abstract class for nodes that filter by filename.
+
+    The spec is compiled once.  Leaf children that support it, like DirNode,
+    apply the filter while scanning, so entries that don't match are never
+    stat()ed.
+    """
+
+    def __init__(self, spec, children):
+        super().__init__(spec, children)
+        self.match = self.compile(spec)
+
+    @abc.abstractmethod
+    def compile(self, spec):
+        """Return a function that tests filenames, raising ValueError if the
+        spec is invalid."""
+
+    def matches(self, inode, path):
+        return self.match(posixpath.basename(path))
+
+    def _child_results(self, node):
+        if isinstance(node, (DirNode, GlobNode)):
+            return node.scan(self.match)
+        return node.get_results()
+
+
+class NameNode(NameFilterNode):
+
+    """
+    NameNode filters by filename with a case-sensitive shell glob, for
+    example 'NAME *.flac'.
+    """
+
+    keyword = 'NAME'
+
+    def compile(self, spec):
+        return re.compile(fnmatch.translate(spec)).match
+
+
+class RegexNode(NameFilterNode):
+
+    """
+    RegexNode filters by filenames containing a match of a regular
+    expression, for example 'REGEX ^[0-9]+'.
+    """
+
+    keyword = 'REGEX'
+
+    def compile(self, spec):
+        try:
+            return re.compile(spec).search
+        except re.error as err:
+            raise ValueError('Invalid regex {!r}: {}'.format(spec, err))
+
+
+_FILTERS = dict((cls.keyword, cls)
+                for cls in (LinksNode, SizeNode, MtimeNode, TypeNode,
+                            NameNode, RegexNode))
+
+
 class DirNode(SearchNode):
 
     """
@@ -137,11 +531,148 @@ class DirNode(SearchNode):
     @staticmethod
     def _get_inode(filepath):
         """Return inode and path pair."""
-        return (os.stat(filepath), filepath)
+        return (fs.stat(filepath), filepath)
+
+    def inode_keys(self):
+        """Generate the (device, inode number) keys of the directory's files.
+
+        Regular files' inode numbers are taken from the directory listing,
+        without stat()ing them.  Symlinks are followed.
+        """
+        dev = fs.stat(self.dirpath).st_dev
+        for entry in fs.scandir(self.dirpath):
+            if entry.is_symlink():
+                stat_result = entry.stat()
+                yield (stat_result.st_dev, stat_result.st_ino)
+            else:
+                yield (dev, entry.inode())
+
+    def scan(self, match=None):
+        """Return results, only for filenames passing match if given.
+
+        If the directory has several links to a file, the one with the
+        smallest name is returned, so results don't depend on listing order.
+        """
+        results = {}
+        for name in fs.listdir(self.dirpath):
+            if match is not None and not match(name):
+                continue
+            inode, path = self._get_inode(posixpath.join(self.dirpath, name))
+            if inode not in results or path < results[inode]:
+                results[inode] = path
+        return results
+
+    @events.traced('findlib.get_results')
+    def get_results(self):
+        return self.scan()
+
+
+_MAGIC = re.compile('[*?[]')
+
+
+class GlobCache:
 
+    """Cache of the subdirectories of directories, for expanding globs.
+
+    Entries are checked against the directory's inode and modification time,
+    which costs a stat() instead of a directory scan.
+    """
+
+    def __init__(self):
+        self._dirs = {}
+        self.dirpaths = set()
+
+    def subdirs(self, dirpath):
+        """Return a list of the names of a directory's subdirectories.
+
+        Symlinks to directories count as subdirectories.  Missing
+        directories have no subdirectories.
+        """
+        try:
+            stat = fs.stat(dirpath)
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+        self.dirpaths.add(dirpath)
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        cached = self._dirs.get(dirpath)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        names = []
+        for entry in fs.scandir(dirpath):
+            try:
+                if entry.is_dir():
+                    names.append(entry.name)
+            except OSError:
+                continue
+        self._dirs[dirpath] = (stamp, names)
+        return names
+
+
+class GlobNode(SearchNode):
+
+    """
+    GlobNode returns the union of the contents of the directories matching
+    a glob pattern, in sorted order like OrNode.  Only directories match.  As
+    with the shell, wildcards don't match names starting with a dot unless the
+    pattern does.
+    """
+
+    def __init__(self, pattern, cache=None):
+        self.pattern = pattern
+        self.cache = cache if cache is not None else GlobCache()
+
+    def __eq__(self, other):
+        return (self.__class__ is other.__class__ and
+                self.pattern == other.pattern)
+
+    def expand(self):
+        """Return a sorted list of directories matching the pattern."""
+        parts = self.pattern.split('/')
+        for i, part in enumerate(parts):
+            if _MAGIC.search(part):
+                break
+        else:
+            return [self.pattern] if fs.isdir(self.pattern) else []
+        base = '/'.join(parts[:i])
+        if not base and self.pattern.startswith('/'):
+            base = '/'
+        candidates = [base]
+        for part in parts[i:]:
+            if part in ('', '.'):
+                continue
+            matches = []
+            for dirpath in candidates:
+                if part == '..':
+                    matches.append(posixpath.join(dirpath, part))
+                    continue
+                subdirs = self.cache.subdirs(dirpath or '.')
+                if _MAGIC.search(part):
+                    names = [name for name in fnmatch.filter(subdirs, part)
+                             if part[0] == '.' or name[0] != '.']
+                else:
+                    names = [part] if part in subdirs else []
+                matches.extend(posixpath.join(dirpath, name)
+                               for name in names)
+            candidates = matches
+        return sorted(candidates)
+
+    def source_dirs(self):
+        """Return the directories read to expand the pattern."""
+        matches = self.expand()
+        return sorted(self.cache.dirpaths.union(matches))
+
+    def scan(self, match=None):
+        """Return results, only for filenames passing match if given."""
+        results = {}
+        for dirpath in self.expand():
+            for inode, path in DirNode(dirpath).scan(match).items():
+                if inode not in results:
+                    results[inode] = path
+        return results
+
+    @events.traced('findlib.get_results')
     def get_results(self):
-        return dict(self._get_inode(filepath)
-                    for filepath in pathlib.listdirpaths(self.dirpath))
+        return self.scan()
 
 
 def parse_query(rootpath, query):
@@ -157,6 +688,8 @@ def parse_query(rootpath, query):
     tokens = deque(shlex.split(query))
     parse_stack = []
     parse_list = []
+    # Glob expansions are cached for the whole query.
+    glob_cache = GlobCache()
     while tokens:
         token = tokens.popleft()
         _LOGGER.debug("Parsing token %s", token)
@@ -175,11 +708,28 @@ def parse_query(rootpath, query):
             parse_stack.append(parse_list)
             parse_stack.append(MinusNode)
             parse_list = []
+        elif token in _FILTERS:
+            if not tokens:
+                raise ParseError(parse_stack, parse_list,
+                                 "Missing spec after {}".format(token))
+            parse_stack.append(parse_list)
+            parse_stack.append(functools.partial(_FILTERS[token],
+                                                 tokens.popleft()))
+            parse_list = []
         elif token == 'END':
             node_type = parse_stack.pop()
-            node = node_type(parse_list)
+            try:
+                node = node_type(parse_list)
+            except ValueError as err:
+                raise ParseError(parse_stack, parse_list, str(err)) from err
             parse_list = parse_stack.pop()
             parse_list.append(node)
+        elif (tagnames.is_tag(token) and _MAGIC.search(token)
+              and not fs.isdir(tagnames.path(rootpath, token))):
+            # Existing directories are used literally, so tagnames
+            # containing glob characters still work.
+            token = tagnames.path(rootpath, token)
+            parse_list.append(GlobNode(token, glob_cache))
         else:
             token = tagnames.path(rootpath, token)
             parse_list.append(DirNode(token))
@@ -0,0 +1,237 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This module is the filesystem access layer.
+
+Filesystem operations done by Dantalian go through the functions here, which
+mirror their os and posixpath counterparts.  This allows the operations to be
+counted using collect_stats():
+
+    >>> with collect_stats() as stats:
+    ...     bulk.clean_symlinks('foo')
+    >>> stats.counts['lstat']
+    42
+
+When no stats are being collected, the overhead is a single global lookup.
+
+"""
+
+from collections import Counter
+from collections import OrderedDict
+from contextlib import contextmanager
+import os
+import posixpath
+import threading
+import time
+
+_STATS = None
+
+# pylint: disable=missing-docstring
+
+
+class Stats:
+
+    """Filesystem operation counts and wall time per phase."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.phases = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, operation, n=1):
+        """Count an operation."""
+        with self._lock:
+            self.counts[operation] += n
+
+    def add_time(self, phase_name, seconds):
+        """Add wall time to a phase."""
+        with self._lock:
+            self.phases[phase_name] = self.phases.get(phase_name, 0) + seconds
+
+    def as_dict(self):
+        """Return stats as a dict suitable for JSON."""
+        return {'counts': dict(sorted(self.counts.items())),
+                'phases': dict(self.phases)}
+
+    def format(self, use_json=False):
+        """Format stats as a human readable summary or as JSON."""
+        if use_json:
+            import json  # Not needed at startup.
+            return json.dumps(self.as_dict())
+        lines = ['Filesystem operations:']
+        lines.extend('  {:<20} {:>10}'.format(operation, number)
+                     for operation, number in sorted(self.counts.items()))
+        lines.append('Phases:')
+        lines.extend('  {:<20} {:>10.3f}s'.format(phase_name, seconds)
+                     for phase_name, seconds in self.phases.items())
+        return '\n'.join(lines)
+
+
+@contextmanager
+def collect_stats():
+    """Collect filesystem stats for the duration of the context.
+
+    Yields:
+        Stats instance.
+
+    """
+    global _STATS  # pylint: disable=global-statement
+    old_stats = _STATS
+    _STATS = stats = Stats()
+    try:
+        yield stats
+    finally:
+        _STATS = old_stats
+
+
+@contextmanager
+def phase(name):
+    """Record the wall time of the context as the given phase."""
+    stats = _STATS
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_time(name, time.perf_counter() - start)
+
+
+def count(operation, n=1):
+    """Count an operation if stats are being collected."""
+    stats = _STATS
+    if stats is not None:
+        stats.count(operation, n)
+
+
+##############################################################################
+# stat
+def stat(path):
+    count('stat')
+    return os.stat(path)
+
+
+def lstat(path):
+    count('lstat')
+    return os.lstat(path)
+
+
+def isdir(path):
+    count('stat')
+    return posixpath.isdir(path)
+
+
+def islink(path):
+    count('lstat')
+    return posixpath.islink(path)
+
+
+def exists(path):
+    count('stat')
+    return posixpath.exists(path)
+
+
+def lexists(path):
+    count('lstat')
+    return posixpath.lexists(path)
+
+
+def samefile(path1, path2):
+    count('stat', 2)
+    return posixpath.samefile(path1, path2)
+
+
+def readlink(path):
+    count('readlink')
+    return os.readlink(path)
+
+
+def realpath(path):
+    count('realpath')
+    return posixpath.realpath(path)
+
+
+##############################################################################
+# directories
+def listdir(path):
+    count('listdir')
+    entries = os.listdir(path)
+    count('listdir_entries', len(entries))
+    return entries
+
+
+def scandir(path):
+    """Like os.scandir(), but a generator that counts entries."""
+    count('scandir')
+    with os.scandir(path) as entries:
+        for entry in entries:
+            count('scandir_entries')
+            yield entry
+
+
+def walk(top):
+    """Like os.walk(), counting each directory scanned."""
+    for dirpath, dirnames, filenames in os.walk(top):
+        count('scandir')
+        count('scandir_entries', len(dirnames) + len(filenames))
+        yield dirpath, dirnames, filenames
+
+
+def mkdir(path):
+    count('mkdir')
+    os.mkdir(path)
+
+
+def rmtree(path):
+    count('rmtree')
+    import shutil  # Not needed at startup.
+    shutil.rmtree(path)
+
+
+##############################################################################
+# links
+def link(src, dst):
+    count('link')
+    os.link(src, dst)
+
+
+def symlink(src, dst):
+    count('symlink')
+    os.symlink(src, dst)
+
+
+def unlink(path):
+    count('unlink')
+    os.unlink(path)
+
+
+def rename(src, dst):
+    count('rename')
+    os.rename(src, dst)
+
+
+##############################################################################
+# files
+def open_file(path, mode='r'):
+    count('open')
+    return open(path, mode)
+
+
+def mknod(path):
+    count('mknod')
+    os.mknod(path)
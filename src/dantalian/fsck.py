@@ -0,0 +1,273 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This module implements checking a library's consistency.
+
+check() walks a library once, listing directories concurrently, and finds
+these problems:
+
+- Broken symlinks.
+- Symlink loops.
+- Relative symlinks, and chains containing them, which work but which
+  pathlib.readlink() can't follow.
+- Symlinks to directories that are missing from the directory's dtags.
+- Dtags of directories without a matching symlink.
+
+The problems can be fixed with repair(), or turned into a list of commands
+for the batch command with plan(), which can be reviewed before running it.
+
+"""
+
+from collections import defaultdict
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+import logging
+import posixpath
+import shlex
+
+from dantalian import base
+from dantalian import dtags
+from dantalian import fs
+from dantalian import index
+from dantalian import tagnames
+
+_LOGGER = logging.getLogger(__name__)
+
+BROKEN = 'broken-symlink'
+UNRESOLVABLE = 'unresolvable-symlink'
+RELATIVE = 'relative-symlink'
+MISSING_DTAG = 'missing-dtag'
+STALE_DTAG = 'stale-dtag'
+
+_DTAGS_FILE = '.dtags'
+_TMP_SUFFIX = '.dantalian-fsck'
+# Same as the Linux limit on symlinks followed in a path lookup.
+_MAX_HOPS = 40
+
+Problem = namedtuple('Problem', 'kind,path,detail')
+Problem.__doc__ = """Problem found in a library.
+
+Attributes:
+    kind: BROKEN, UNRESOLVABLE, RELATIVE, MISSING_DTAG or STALE_DTAG.
+    path: Path of the symlink, or of the directory for STALE_DTAG.
+    detail: Absolute target for RELATIVE, target directory for
+        MISSING_DTAG, tagname for STALE_DTAG, or None.
+"""
+
+_DirScan = namedtuple('_DirScan', 'subdirs,problems,dir_links,tags')
+
+
+def _resolve(path):
+    """Follow symlinks like pathlib.readlink(), giving up on long chains.
+
+    Returns:
+        Path of the target, or None if the chain is too long.
+    """
+    for _ in range(_MAX_HOPS):
+        if not fs.islink(path):
+            return path
+        path = fs.readlink(path)
+    return None
+
+
+def _read_dtags(dirpath):
+    """Return the dtags of a directory, or None if it has no dtags file."""
+    if not fs.lexists(posixpath.join(dirpath, _DTAGS_FILE)):
+        return None
+    return dtags.list_tags(dirpath)
+
+
+def _check_symlink(path):
+    """Check a symlink.
+
+    Returns:
+        Tuple of a Problem or None, and the normalized path of the target
+        directory or None.
+    """
+    try:
+        fs.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return Problem(BROKEN, path, None), None
+    except OSError:
+        # Symlink loop.
+        return Problem(UNRESOLVABLE, path, None), None
+    problem = None
+    target = _resolve(path)
+    if (target is None or not fs.exists(target)
+            or not fs.samefile(path, target)):
+        # The link works, but only when relative links are followed
+        # relative to their directory.
+        target = fs.realpath(path)
+        problem = Problem(RELATIVE, path, target)
+    if fs.isdir(target):
+        return problem, posixpath.normpath(posixpath.abspath(target))
+    return problem, None
+
+
+def _scan_dir(dirpath, skip=()):
+    """Check the symlinks in a directory and read its dtags."""
+    subdirs = []
+    problems = []
+    dir_links = []
+    tags = None
+    for entry in fs.scandir(dirpath):
+        if entry.name in skip:
+            continue
+        if entry.name == _DTAGS_FILE:
+            tags = dtags.list_tags(dirpath)
+        elif entry.is_symlink():
+            problem, target = _check_symlink(entry.path)
+            if problem is not None:
+                problems.append(problem)
+            if target is not None:
+                dir_links.append((entry.path, target))
+        elif entry.is_dir():
+            subdirs.append(entry.path)
+    return _DirScan(subdirs, problems, dir_links, tags)
+
+
+def _walk(rootpath, jobs):
+    """Scan every directory in a library concurrently.
+
+    Returns:
+        Generator yielding (dirpath, _DirScan) tuples.
+    """
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = {executor.submit(_scan_dir, rootpath, ('.dantalian',)):
+                   rootpath}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dirpath = pending.pop(future)
+                scan = future.result()
+                for subdir in scan.subdirs:
+                    pending[executor.submit(_scan_dir, subdir)] = subdir
+                yield dirpath, scan
+
+
+def check(rootpath, jobs=None):
+    """Check a library's consistency in one walk.
+
+    Args:
+        rootpath: Path of library.
+        jobs: Number of threads listing directories.
+
+    Returns:
+        List of Problems, sorted by path.
+    """
+    rootpath = posixpath.normpath(posixpath.abspath(rootpath))
+    problems = []
+    # Directory path to symlinks to it.
+    dir_links = defaultdict(list)
+    # Directory path to its dtags.
+    dir_tags = {}
+    for dirpath, scan in _walk(rootpath, jobs):
+        problems.extend(scan.problems)
+        for path, target in scan.dir_links:
+            dir_links[target].append(path)
+        if scan.tags is not None:
+            dir_tags[dirpath] = scan.tags
+    # Directories outside of the library aren't walked.
+    for target in dir_links:
+        if target not in dir_tags:
+            tags = _read_dtags(target)
+            if tags is not None:
+                dir_tags[target] = tags
+    for target, paths in dir_links.items():
+        tags = set(dir_tags.get(target, ()))
+        for path in paths:
+            if tagnames.path2tag(rootpath, path) not in tags:
+                problems.append(Problem(MISSING_DTAG, path, target))
+    for dirpath, tags in dir_tags.items():
+        linked = set(tagnames.path2tag(rootpath, path)
+                     for path in dir_links.get(dirpath, ()))
+        linked.add(tagnames.path2tag(rootpath, dirpath))
+        for tagname in tags:
+            if tagname not in linked:
+                problems.append(Problem(STALE_DTAG, dirpath, tagname))
+    problems.sort(key=lambda problem: (problem.path, problem.kind,
+                                       problem.detail or ''))
+    return problems
+
+
+def plan(problems):
+    """Return commands that repair problems, for the batch command.
+
+    Broken symlinks and loops are unlinked first, then relative symlinks are
+    replaced with absolute ones, then the dtags of directories with problems
+    are saved, which makes them match the directories' symlinks.
+
+    Returns:
+        List of command lines.
+    """
+    unlinks = sorted(set(problem.path for problem in problems
+                         if problem.kind in (BROKEN, UNRESOLVABLE)))
+    relinks = []
+    for problem in problems:
+        if problem.kind == RELATIVE:
+            path = shlex.quote(problem.path)
+            relinks.append('unlink ' + path)
+            relinks.append('link --symlink {} {}'.format(
+                shlex.quote(problem.detail), path))
+    saves = sorted(set(
+        problem.detail if problem.kind == MISSING_DTAG else problem.path
+        for problem in problems
+        if problem.kind in (MISSING_DTAG, STALE_DTAG)))
+    return (['unlink ' + shlex.quote(path) for path in unlinks] + relinks +
+            ['save ' + shlex.quote(path) for path in saves])
+
+
+def _absolutize(rootpath, path, target):
+    """Replace a relative symlink with an absolute one, atomically."""
+    tmp = path + _TMP_SUFFIX
+    fs.symlink(target, tmp)
+    try:
+        fs.rename(tmp, path)
+    except OSError:
+        fs.unlink(tmp)
+        raise
+    index.note_changed(rootpath, path)
+
+
+def repair(rootpath, problems):
+    """Repair problems found by check().
+
+    This has the same effect as running the commands from plan(), without
+    walking the library again.
+    """
+    rootpath = posixpath.normpath(posixpath.abspath(rootpath))
+    added = defaultdict(list)
+    removed = defaultdict(set)
+    for problem in problems:
+        if problem.kind in (BROKEN, UNRESOLVABLE):
+            base.unlink(rootpath, problem.path)
+        elif problem.kind == RELATIVE:
+            _absolutize(rootpath, problem.path, problem.detail)
+        elif problem.kind == MISSING_DTAG:
+            added[problem.detail].append(
+                tagnames.path2tag(rootpath, problem.path))
+        elif problem.kind == STALE_DTAG:
+            removed[problem.path].add(problem.detail)
+    for dirpath in set(added) | set(removed):
+        tags = [tagname for tagname in dtags.list_tags(dirpath)
+                if tagname not in removed[dirpath]]
+        tags.extend(tagname for tagname in added[dirpath]
+                    if tagname not in tags)
+        _LOGGER.debug('Repairing dtags of %s', dirpath)
+        dtags.set_tags(dirpath, tags)
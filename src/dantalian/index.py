@@ -0,0 +1,344 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This module implements an optional SQLite index for searching.
+
+The index is stored in the library at .dantalian/index.db.  It records the
+entries of tag directories in a membership table of (tag, inode, name) rows,
+so that searches can be answered by SQL set operations instead of listing and
+stat()ing every entry of every directory in the query.
+
+The index is a cache.  Each indexed directory is stored with its inode and
+modification time, and directories that have changed since they were indexed
+are scanned again when they are searched, so results always match
+findlib.search().  The mutating functions in base invalidate the directories
+they change, which covers changes made within the same timestamp tick.
+Inside a deferred() block, invalidations are collected and applied in one
+transaction when the block exits or before the next search, so that bulk
+changes don't open the index once per file.  Commands run in such a block.
+
+The index is only used if it exists; create it with rebuild() or the reindex
+command.
+
+"""
+
+from contextlib import contextmanager
+import logging
+import posixpath
+import threading
+
+from dantalian import fs
+from dantalian import library
+from dantalian import tagnames
+
+_LOGGER = logging.getLogger(__name__)
+
+_INDEX = 'index.db'
+
+# Depth of nested deferred() blocks, and directories to invalidate per
+# library when the outermost one exits.
+_DEFER_LOCK = threading.Lock()
+_defer_depth = 0
+_pending = {}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    tag TEXT PRIMARY KEY,
+    ino INTEGER NOT NULL,
+    mtime INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS membership (
+    tag TEXT NOT NULL,
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (tag, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS membership_inode ON membership (dev, ino);
+"""
+
+
+def index_path(rootpath):
+    """Return the path of a library's index."""
+    return library.get_resource(rootpath, _INDEX)
+
+
+def has_index(rootpath):
+    """Return whether a library has an index."""
+    return fs.lexists(index_path(rootpath))
+
+
+def _int64(value):
+    """Fit an unsigned 64-bit value in an SQLite integer."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class Index:
+
+    """Open SQLite index of a library.
+
+    Use as a context manager to commit and close it.
+    """
+
+    def __init__(self, rootpath):
+        import sqlite3  # pylint: disable=import-outside-toplevel
+        self.rootpath = rootpath
+        self._conn = sqlite3.connect(index_path(rootpath), timeout=30)
+        self._conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self._conn.commit()
+        self.close()
+
+    def close(self):
+        """Close the index without committing."""
+        self._conn.close()
+
+    def commit(self):
+        """Commit changes to the index."""
+        self._conn.commit()
+
+    ###########################################################################
+    # maintenance
+    def tagname(self, dirpath):
+        """Return the tagname a directory is indexed under."""
+        return tagnames.path2tag(self.rootpath, dirpath)
+
+    def clear(self):
+        """Remove everything from the index."""
+        self._conn.execute('DELETE FROM dirs')
+        self._conn.execute('DELETE FROM membership')
+
+    def invalidate(self, dirpath):
+        """Forget a directory, so that it is scanned again when searched."""
+        self._conn.execute('DELETE FROM dirs WHERE tag = ?',
+                           (self.tagname(dirpath),))
+
+    def scan(self, dirpath, dirstat=None):
+        """Index a directory's entries, replacing any indexed entries."""
+        if dirstat is None:
+            dirstat = fs.stat(dirpath)
+        tag = self.tagname(dirpath)
+        rows = []
+        for entry in fs.scandir(dirpath):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                # Broken symlink.
+                continue
+            rows.append((tag, _int64(stat.st_dev), _int64(stat.st_ino),
+                         entry.name))
+        self._conn.execute('DELETE FROM membership WHERE tag = ?', (tag,))
+        self._conn.executemany('INSERT INTO membership VALUES (?, ?, ?, ?)',
+                               rows)
+        self._conn.execute('INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)',
+                           (tag, _int64(dirstat.st_ino),
+                            dirstat.st_mtime_ns))
+
+    def refresh(self, dirpath):
+        """Scan a directory again if it changed since it was indexed."""
+        dirstat = fs.stat(dirpath)
+        row = self._conn.execute('SELECT ino, mtime FROM dirs WHERE tag = ?',
+                                 (self.tagname(dirpath),)).fetchone()
+        if row != (_int64(dirstat.st_ino), dirstat.st_mtime_ns):
+            _LOGGER.debug('Indexing %s', dirpath)
+            self.scan(dirpath, dirstat)
+
+    def rebuild(self):
+        """Rebuild the index from scratch for every directory in the library.
+
+        The .dantalian directory is not indexed.
+        """
+        self.clear()
+        root = posixpath.normpath(self.rootpath)
+        for dirpath, dirnames, _ in fs.walk(root):
+            if dirpath == root and '.dantalian' in dirnames:
+                dirnames.remove('.dantalian')
+            self.scan(dirpath)
+
+    ###########################################################################
+    # searching
+    def search(self, search_node):
+        """Return paths by query tree, like findlib.search().
+
+        Raises:
+            TypeError: The query tree contains nodes that cannot be compiled.
+        """
+        sql, params = _Compiler(self).compile(search_node)
+        return [path for (path,) in self._conn.execute(sql, params)]
+
+
+class _Compiler:
+
+    """Compiles query trees to SQL.
+
+    Each node is compiled to a common table expression selecting dev, ino
+    and path columns.  Paths are chosen like the findlib nodes do: AND and
+    MINUS take paths from their first child, and OR takes paths from the
+    first child containing the file.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.ctes = []
+        self.params = []
+
+    def compile(self, node):
+        """Return SQL and parameters selecting the paths of a query tree."""
+        name = self._compile(node)
+        sql = 'WITH {} SELECT path FROM {}'.format(', '.join(self.ctes), name)
+        return sql, self.params
+
+    def _add(self, sql, params=()):
+        name = 'n{}'.format(len(self.ctes))
+        self.ctes.append('{} AS ({})'.format(name, sql))
+        self.params.extend(params)
+        return name
+
+    def _compile(self, node):
+        from dantalian import findlib  # pylint: disable=import-outside-toplevel
+        if node.__class__ is findlib.DirNode:
+            return self._compile_dir(node)
+        elif node.__class__ in (findlib.AndNode, findlib.OrNode,
+                                findlib.MinusNode):
+            children = [self._compile(child) for child in node.children]
+            if node.__class__ is findlib.AndNode:
+                return self._compile_set('INTERSECT', children)
+            elif node.__class__ is findlib.MinusNode:
+                return self._compile_set('EXCEPT', children)
+            else:
+                return self._compile_or(children)
+        raise TypeError('Cannot compile {!r}'.format(node))
+
+    def _compile_dir(self, node):
+        self.index.refresh(node.dirpath)
+        # Mimic posixpath.join(dirpath, name).
+        prefix = posixpath.join(node.dirpath, '')
+        # Directories may contain several links to the same file; keep one.
+        return self._add('SELECT dev, ino, ? || MIN(name) AS path'
+                         ' FROM membership WHERE tag = ?'
+                         ' GROUP BY dev, ino',
+                         (prefix, self.index.tagname(node.dirpath)))
+
+    def _compile_set(self, operator, children):
+        keys = ' {} '.format(operator).join(
+            'SELECT dev, ino FROM {}'.format(child) for child in children)
+        return self._add('SELECT c.dev, c.ino, c.path FROM {} AS c'
+                         ' JOIN ({}) AS k'
+                         ' ON c.dev = k.dev AND c.ino = k.ino'.format(
+                             children[0], keys))
+
+    def _compile_or(self, children):
+        # UNION ALL with a priority column, then keep the row with the lowest
+        # priority for each file.  SQLite takes bare columns from the row
+        # that MIN() selects.
+        union = ' UNION ALL '.join(
+            'SELECT dev, ino, path, {} AS prio FROM {}'.format(i, child)
+            for i, child in enumerate(children))
+        return self._add('SELECT dev, ino, path FROM ('
+                         'SELECT dev, ino, path, MIN(prio) FROM ({})'
+                         ' GROUP BY dev, ino)'.format(union))
+
+
+def search(rootpath, search_node):
+    """Search using a library's index, if it has one.
+
+    Returns:
+        List of paths, or None if the library has no index or the query tree
+        cannot be compiled.
+    """
+    if rootpath is None or not has_index(rootpath):
+        return None
+    with Index(rootpath) as index:
+        _invalidate_pending(index)
+        try:
+            return index.search(search_node)
+        except TypeError as err:
+            _LOGGER.debug('Not using index: %s', err)
+            return None
+
+
+def note_changed(rootpath, *paths):
+    """Invalidate the directories containing paths, if there is an index.
+
+    Call this after adding, removing or replacing entries at paths.  Inside
+    a deferred() block, the invalidation is postponed.
+    """
+    if rootpath is None or not has_index(rootpath):
+        return
+    dirpaths = set(posixpath.dirname(posixpath.abspath(path))
+                   for path in paths)
+    with _DEFER_LOCK:
+        if _defer_depth:
+            key = posixpath.abspath(rootpath)
+            _pending.setdefault(key, set()).update(dirpaths)
+            return
+    with Index(rootpath) as index:
+        for dirpath in dirpaths:
+            index.invalidate(dirpath)
+
+
+def _take_pending(rootpath=None):
+    """Remove and return pending invalidations, for a library or all."""
+    with _DEFER_LOCK:
+        if rootpath is None:
+            pending = dict(_pending)
+            _pending.clear()
+            return pending
+        key = posixpath.abspath(rootpath)
+        return {key: _pending.pop(key, set())}
+
+
+def _invalidate_pending(index):
+    """Apply an open index's pending invalidations."""
+    for dirpaths in _take_pending(index.rootpath).values():
+        for dirpath in dirpaths:
+            index.invalidate(dirpath)
+
+
+@contextmanager
+def deferred():
+    """Collect invalidations from note_changed() until the block exits.
+
+    Blocks may be nested; invalidations are applied when the outermost one
+    exits, in one transaction per library.
+    """
+    global _defer_depth  # pylint: disable=global-statement
+    with _DEFER_LOCK:
+        _defer_depth += 1
+    try:
+        yield
+    finally:
+        with _DEFER_LOCK:
+            _defer_depth -= 1
+            outermost = not _defer_depth
+        if outermost:
+            for rootpath, dirpaths in _take_pending().items():
+                if dirpaths and has_index(rootpath):
+                    with Index(rootpath) as index:
+                        for dirpath in dirpaths:
+                            index.invalidate(dirpath)
+
+
+def rebuild(rootpath):
+    """Create or rebuild a library's index."""
+    with Index(rootpath) as index:
+        index.rebuild()
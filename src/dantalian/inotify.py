@@ -0,0 +1,134 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This module is a minimal ctypes wrapper for Linux inotify.
+
+Only what Dantalian needs is wrapped.  Creating an Inotify instance raises
+OSError if inotify is not available.
+
+"""
+
+from collections import namedtuple
+import ctypes
+import ctypes.util
+import os
+import struct
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_MASK_ADD = 0x20000000
+IN_ISDIR = 0x40000000
+
+# Events that change the entries of a directory.
+DIR_CHANGES = (IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO |
+               IN_DELETE_SELF | IN_MOVE_SELF)
+
+_IN_CLOEXEC = 0o2000000
+_IN_NONBLOCK = 0o4000
+
+_EVENT = struct.Struct('iIII')
+
+Event = namedtuple('Event', 'wd,mask,cookie,name')
+
+_LIBC = None
+
+
+def _libc():
+    """Load libc lazily."""
+    global _LIBC  # pylint: disable=global-statement
+    if _LIBC is None:
+        _LIBC = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                            use_errno=True)
+        if not hasattr(_LIBC, 'inotify_init1'):
+            raise OSError('inotify is not available')
+    return _LIBC
+
+
+def _check(result):
+    """Raise OSError from errno if result is -1."""
+    if result == -1:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return result
+
+
+class Inotify:
+
+    """An inotify instance.
+
+    The file descriptor is non-blocking, so it can be used with select().
+    """
+
+    def __init__(self):
+        self._fd = _check(_libc().inotify_init1(_IN_CLOEXEC | _IN_NONBLOCK))
+
+    def fileno(self):
+        """Return the inotify file descriptor."""
+        return self._fd
+
+    def close(self):
+        """Close the inotify instance."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_watch(self, path, mask):
+        """Watch a path and return the watch descriptor."""
+        return _check(_libc().inotify_add_watch(
+            self._fd, os.fsencode(path), mask))
+
+    def rm_watch(self, wd):
+        """Remove a watch.  Ignore watches that are already gone."""
+        try:
+            _check(_libc().inotify_rm_watch(self._fd, wd))
+        except OSError:
+            pass
+
+    def read_events(self):
+        """Read available events without blocking.
+
+        Returns:
+            List of Event tuples.  Names are decoded with os.fsdecode().
+        """
+        events = []
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                events.append(Event(wd, mask, cookie, os.fsdecode(name)))
@@ -17,15 +17,16 @@
 
 """This module defines interaction with libraries."""
 
-import os
 import posixpath
 
+from dantalian import fs
+
 
 _ROOTDIR = '.dantalian'
 
 def is_library(dirpath):
     """Return whether dirpath refers to a library."""
-    return posixpath.isdir(posixpath.join(dirpath, _ROOTDIR))
+    return fs.isdir(posixpath.join(dirpath, _ROOTDIR))
 
 
 def find_library(dirpath='.'):
@@ -49,8 +50,8 @@ def find_library(dirpath='.'):
 def init_library(dirpath):
     """Initialize library."""
     rootdir = posixpath.join(dirpath, _ROOTDIR)
-    if not posixpath.isdir(rootdir):
-        os.mkdir(rootdir)
+    if not fs.isdir(rootdir):
+        fs.mkdir(rootdir)
 
 
 def get_resource(dirpath, resource_path):
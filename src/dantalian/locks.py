@@ -0,0 +1,62 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""This module implements advisory file locking.
+
+Locks are taken with flock(2), so they only coordinate processes that also use
+these functions; they do not prevent other programs from touching the files.
+
+"""
+
+from contextlib import contextmanager
+import fcntl
+import os
+
+
+@contextmanager
+def lock_file(file, shared=False):
+    """Lock an open file object for the duration of the context.
+
+    The file is flushed before it is unlocked, so buffered writes are visible
+    to the next lock holder.
+
+    Args:
+        file: File object to lock.
+        shared: Whether to take a shared (read) lock instead of an exclusive
+            one.
+
+    """
+    fcntl.flock(file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+    try:
+        yield file
+    finally:
+        if not shared:
+            file.flush()
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def lock_dir(dirpath):
+    """Exclusively lock a directory for the duration of the context."""
+    fd = os.open(dirpath, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # Closing the descriptor releases the lock.
+        os.close(fd)
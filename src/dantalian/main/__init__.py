@@ -17,20 +17,57 @@
 
 """This package implements the Dantalian program."""
 
-import logging
+import sys
+import time
 
-from . import argparse
+
+def _fast_complete(argv):
+    """Run the complete command without setting up logging or arguments.
+
+    Completion runs on every keypress, so the common invocations from the
+    completion scripts skip the imports that the other commands need.
+
+    Returns:
+        Whether the command was handled.
+    """
+    if argv[:2] == ['complete', '--']:
+        argv = argv[2:]
+    elif argv[:1] == ['complete']:
+        argv = argv[1:]
+    else:
+        return False
+    if len(argv) > 1 or argv[:1] and argv[0].startswith('-'):
+        return False
+    from dantalian import library  # pylint: disable=import-outside-toplevel
+    from dantalian import trie  # pylint: disable=import-outside-toplevel
+    rootpath = library.find_library('.')
+    if rootpath is not None:
+        for tagname in trie.complete(rootpath, argv[0] if argv else ''):
+            print(tagname)
+    return True
 
 
 def main():
-    """Entry function."""
+    """Entry function.
+
+    Returns:
+        Exit status of the command, or None for success.
+    """
+    argv = sys.argv[1:]
+    if _fast_complete(argv):
+        return
+    # pylint: disable=import-outside-toplevel
+    import logging
+    from dantalian import fs
+    from . import argparse
     # Set up logging.
     root_logger = logging.getLogger()
     handler = logging.StreamHandler()
     root_logger.addHandler(handler)
     # Parse arguments.
-    parser = argparse.make_parser()
-    args = parser.parse_args()
+    start = time.perf_counter()
+    parser = argparse.make_parser(argparse.find_command(argv))
+    args = parser.parse_args(argv)
     if args.debug:
         handler.setFormatter(logging.Formatter(
             '%(asctime)s %(levelname)s @%(name)s %(message)s'))
@@ -40,13 +77,24 @@ def main():
         handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
         handler.setLevel('WARNING')
         # root logger default is WARNING
+    parse_time = time.perf_counter() - start
     # Run command.
     try:
         func = args.func
     except AttributeError:
         parser.print_help()
+        return
+    if args.stats or args.stats_json:
+        with fs.collect_stats() as stats:
+            stats.add_time('parse', parse_time)
+            try:
+                with fs.phase('run'):
+                    return func(args)
+            finally:
+                sys.stdout.flush()
+                print(stats.format(args.stats_json), file=sys.stderr)
     else:
-        func(args)
+        return func(args)
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
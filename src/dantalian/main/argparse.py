@@ -17,162 +17,382 @@
 
 """
 Entry point.
+
+Command parsers are registered individually, so that only the parser for the
+command being run needs to be built.  Command implementations are imported
+only when the command is actually run.
 """
 
 import argparse
+from collections import OrderedDict
+import importlib
+
+_PARSERS = OrderedDict()
+
+
+def _command_parser(*names):
+    """Register the decorated function as the parser builder for commands.
+
+    The builder is called with the subparsers object and the command name.
+    """
+    def register(func):
+        for name in names:
+            _PARSERS[name] = func
+        return func
+    return register
+
+
+class Command:
+
+    """Command function that imports its implementation when called."""
+
+    def __init__(self, module, name):
+        self.module = module
+        self.name = name
+
+    def __call__(self, args):
+        # pylint: disable=import-outside-toplevel
+        from dantalian import index
+        module = importlib.import_module(
+            'dantalian.main.commands.' + self.module)
+        # Invalidate changed directories in the search index once, instead
+        # of once per changed file.
+        with index.deferred():
+            return getattr(module, self.name)(args)
+
+    def __repr__(self):
+        return 'Command({!r}, {!r})'.format(self.module, self.name)
 
-from . import commands
 
 def _add_root(parser):
     """Add rootpath argument."""
     parser.add_argument('--root', metavar='ROOT')
 
-def _make_base(subparsers):
-    """Add base command parsers."""
-    # link
-    parser = subparsers.add_parser('link', usage='%(prog)s SRC DST')
+def _add_null(parser):
+    """Add NUL separator argument."""
+    parser.add_argument('-0', '--null', action='store_true')
+
+def _positive_int(value):
+    """Parse a positive integer argument."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            '{!r} is not a positive integer'.format(value))
+    return number
+
+def _add_jobs(parser):
+    """Add worker count argument."""
+    parser.add_argument('-j', '--jobs', type=_positive_int, metavar='N')
+
+
+###############################################################################
+# base
+@_command_parser('link')
+def _make_link(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s SRC DST')
     _add_root(parser)
+    parser.add_argument('-s', '--symlink', action='store_true')
     parser.add_argument('src')
     parser.add_argument('dst')
-    parser.set_defaults(func=commands.link)
+    parser.set_defaults(func=Command('base', 'link'))
+
 
-    # unlink
-    parser = subparsers.add_parser('unlink', usage='%(prog)s SRC DST')
+@_command_parser('unlink')
+def _make_unlink(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s SRC DST')
     _add_root(parser)
     parser.add_argument('files', nargs='+')
-    parser.set_defaults(func=commands.unlink)
+    parser.set_defaults(func=Command('base', 'unlink'))
 
-    # rename
-    parser = subparsers.add_parser('rename', usage='%(prog)s SRC DST')
+
+@_command_parser('rename')
+def _make_rename(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s SRC DST')
     _add_root(parser)
     parser.add_argument('src')
     parser.add_argument('dst')
-    parser.set_defaults(func=commands.rename)
+    parser.set_defaults(func=Command('base', 'rename'))
 
-    # swap
-    parser = subparsers.add_parser('swap', usage='%(prog)s DIR')
-    _add_root(parser)
-    parser.add_argument('dir')
-    parser.set_defaults(func=commands.swap)
 
-    # save
-    parser = subparsers.add_parser('save', usage='%(prog)s DIR')
+@_command_parser('swap')
+def _make_swap(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s DIR')
     _add_root(parser)
-    parser.add_argument('--all', action='store_true')
     parser.add_argument('dir')
-    parser.set_defaults(func=commands.save)
+    parser.set_defaults(func=Command('base', 'swap'))
+
 
-    # load
-    parser = subparsers.add_parser('load', usage='%(prog)s DIR')
+@_command_parser('save', 'load', 'unload')
+def _make_dtags_command(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s DIR')
     _add_root(parser)
     parser.add_argument('--all', action='store_true')
+    _add_jobs(parser)
     parser.add_argument('dir')
-    parser.set_defaults(func=commands.load)
+    parser.set_defaults(func=Command('base', name))
+
 
-    # unload
-    parser = subparsers.add_parser('unload', usage='%(prog)s DIR')
+###############################################################################
+# magic list
+@_command_parser('list')
+def _make_list(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s PATH')
     _add_root(parser)
-    parser.add_argument('--all', action='store_true')
-    parser.add_argument('dir')
-    parser.set_defaults(func=commands.unload)
+    parser.add_argument('--tags', action='store_true')
+    _add_null(parser)
+    parser.add_argument('path')
+    parser.set_defaults(func=Command('base', 'magic_list'))
 
 
-def make_parser():
+###############################################################################
+# search
+@_command_parser('search')
+def _make_search(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s QUERY')
+    _add_root(parser)
+    _add_jobs(parser)
+    _add_null(parser)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('-L', '--library', action='append', dest='libraries',
+                      metavar='ROOT')
+    mode.add_argument('--watch', action='store_true')
+    mode.add_argument('--rank', action='store_true')
+    mode.add_argument('--count', action='store_true')
+    mode.add_argument('--estimate', action='store_true')
+    parser.add_argument('--top', type=_positive_int, metavar='K')
+    parser.add_argument('--weights', metavar='W,...')
+    parser.add_argument('query', nargs='+')
+    parser.set_defaults(func=Command('search', 'search'))
 
-    """Make argument parser.
 
-    Argument parser is reusable, so keep the parser around instead of remaking
-    it.
+@_command_parser('similar')
+def _make_similar(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s PATH')
+    _add_root(parser)
+    parser.add_argument('--top', type=_positive_int, default=10, metavar='K')
+    parser.add_argument('--rebuild', action='store_true')
+    _add_null(parser)
+    parser.add_argument('path')
+    parser.set_defaults(func=Command('search', 'similar'))
 
-    You can use it to parse and run an argument list like so:
 
-        >>> parser = make_parser()
-        >>> args = parser.parse_args(['tag', 'foo', 'bar'])
-        >>> args.func(args)
-    """
+@_command_parser('reindex')
+def _make_reindex(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s')
+    _add_root(parser)
+    parser.set_defaults(func=Command('search', 'reindex'))
 
-    top_parser = argparse.ArgumentParser()
-    top_parser.add_argument('--debug', action='store_true')
-    subparsers = top_parser.add_subparsers(title='Commands')
 
-    ###########################################################################
-    # base
-    _make_base(subparsers)
+###############################################################################
+# saved queries
+@_command_parser('save-query')
+def _make_save_query(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s DIR QUERY')
+    _add_root(parser)
+    _add_null(parser)
+    parser.add_argument('dir')
+    parser.add_argument('query', nargs='+')
+    parser.set_defaults(func=Command('saved', 'save_query'))
 
-    ###########################################################################
-    # magic list
-    parser = subparsers.add_parser('list', usage='%(prog)s PATH')
+
+@_command_parser('drop-query')
+def _make_drop_query(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s DIR')
     _add_root(parser)
-    parser.add_argument('--tags', action='store_true')
-    parser.add_argument('path')
-    parser.set_defaults(func=commands.magic_list)
+    parser.add_argument('dir')
+    parser.set_defaults(func=Command('saved', 'drop_query'))
+
 
-    ###########################################################################
-    # search
-    parser = subparsers.add_parser('search', usage='%(prog)s QUERY')
+@_command_parser('refresh')
+def _make_refresh(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s [DIR ...]')
     _add_root(parser)
-    parser.add_argument('query', nargs='+')
-    parser.set_defaults(func=commands.search)
+    _add_null(parser)
+    parser.add_argument('--force', action='store_true')
+    parser.add_argument('dirs', nargs='*')
+    parser.set_defaults(func=Command('saved', 'refresh'))
 
-    ###########################################################################
-    # library
-    parser = subparsers.add_parser('init-library', usage='%(prog)s [PATH]')
+
+###############################################################################
+# library
+@_command_parser('init-library')
+def _make_init_library(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s [PATH]')
     parser.add_argument('path', nargs='?', default='.')
-    parser.set_defaults(func=commands.init_library)
+    parser.set_defaults(func=Command('library', 'init_library'))
 
-    ###########################################################################
-    # tagging
-    # tag
-    parser = subparsers.add_parser(
-        'tag',
-        usage='%(prog)s -f FILE [FILE ...] -- TAG [TAG ...]')
-    _add_root(parser)
-    parser.add_argument('-f', nargs='+', dest='files', required=True,
-                        metavar='FILE')
-    parser.add_argument('tags', nargs='+')
-    parser.set_defaults(func=commands.tag)
 
-    # untag
+###############################################################################
+# tagging
+@_command_parser('tag', 'untag')
+def _make_tagging_command(subparsers, name):
     parser = subparsers.add_parser(
-        'untag',
-        usage='%(prog)s -f FILE [FILE ...] -- TAG [TAG ...]')
+        name,
+        usage=('%(prog)s -f FILE [FILE ...] -- TAG [TAG ...]\n'
+               '       %(prog)s --stdin [-0] -- TAG [TAG ...]'))
     _add_root(parser)
-    parser.add_argument('-f', nargs='+', dest='files', required=True,
-                        metavar='FILE')
+    files = parser.add_mutually_exclusive_group(required=True)
+    files.add_argument('-f', nargs='+', dest='files', metavar='FILE')
+    files.add_argument('--stdin', action='store_true')
+    _add_null(parser)
     parser.add_argument('tags', nargs='+')
-    parser.set_defaults(func=commands.untag)
+    parser.set_defaults(func=Command('tagging', name))
 
-    ###########################################################################
-    # bulk
-    # clean
-    parser = subparsers.add_parser('clean', usage='%(prog)s [DIR]')
+
+###############################################################################
+# bulk
+@_command_parser('clean')
+def _make_clean(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s [DIR]')
     parser.add_argument('dir', default='.')
-    parser.set_defaults(func=commands.clean)
+    parser.set_defaults(func=Command('bulk', 'clean'))
+
 
-    # rename_all
-    parser = subparsers.add_parser('rename-all', usage='%(prog)s PATH NAME')
+@_command_parser('rename-all')
+def _make_rename_all(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s PATH NAME')
     _add_root(parser)
     parser.add_argument('path')
     parser.add_argument('name')
-    parser.set_defaults(func=commands.rename_all)
+    parser.set_defaults(func=Command('bulk', 'rename_all'))
+
 
-    # unlink_all
-    parser = subparsers.add_parser('unlink-all',
-                                   usage='%(prog)s PATH [PATH ...]')
+@_command_parser('unlink-all')
+def _make_unlink_all(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s PATH [PATH ...]')
     _add_root(parser)
     parser.add_argument('paths', nargs='+')
-    parser.set_defaults(func=commands.unlink_all)
+    parser.set_defaults(func=Command('bulk', 'unlink_all'))
+
+
+@_command_parser('import')
+def _make_import(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s')
+    _add_root(parser)
+    parser.set_defaults(func=Command('bulk', 'import_tags'))
+
+
+@_command_parser('fsck')
+def _make_fsck(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s')
+    _add_root(parser)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--plan', action='store_true')
+    mode.add_argument('--repair', action='store_true')
+    _add_jobs(parser)
+    _add_null(parser)
+    parser.set_defaults(func=Command('bulk', 'fsck'))
 
-    # import
-    parser = subparsers.add_parser('import', usage='%(prog)s')
+
+@_command_parser('dedupe')
+def _make_dedupe(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s')
     _add_root(parser)
-    parser.set_defaults(func=commands.import_tags)
+    parser.add_argument('-n', '--dry-run', action='store_true')
+    _add_jobs(parser)
+    _add_null(parser)
+    parser.set_defaults(func=Command('bulk', 'dedupe'))
+
 
-    # export
-    parser = subparsers.add_parser('export', usage='%(prog)s DIR')
+@_command_parser('export')
+def _make_export(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s DIR')
     _add_root(parser)
     parser.add_argument('dir')
     parser.add_argument('--full', action='store_true')
-    parser.set_defaults(func=commands.export_tags)
+    _add_null(parser)
+    parser.set_defaults(func=Command('bulk', 'export_tags'))
+
+
+###############################################################################
+# reports
+@_command_parser('stats')
+def _make_stats(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s')
+    _add_root(parser)
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--top', type=int, default=10, metavar='N')
+    parser.add_argument('--no-cache', action='store_false', dest='cache')
+    parser.set_defaults(func=Command('report', 'stats'))
+
+
+@_command_parser('cooccur')
+def _make_cooccur(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s')
+    _add_root(parser)
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('-o', '--output', metavar='FILE')
+    parser.set_defaults(func=Command('report', 'cooccur'))
+
+
+###############################################################################
+# daemon
+@_command_parser('serve')
+def _make_serve(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s')
+    _add_root(parser)
+    parser.set_defaults(func=Command('daemon', 'serve'))
+
+
+###############################################################################
+# completion
+@_command_parser('complete')
+def _make_complete(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s PREFIX')
+    _add_root(parser)
+    parser.add_argument('prefix', nargs='?', default='')
+    parser.set_defaults(func=Command('complete', 'complete'))
+
+
+###############################################################################
+# batch
+@_command_parser('batch')
+def _make_batch(subparsers, name):
+    parser = subparsers.add_parser(name, usage='%(prog)s')
+    _add_root(parser)
+    _add_null(parser)
+    parser.set_defaults(func=Command('batch', 'batch'))
+
+
+def find_command(argv):
+    """Return the command name in an argument list.
+
+    Returns None if the first positional argument is not a known command.
+    """
+    for arg in argv:
+        if not arg.startswith('-'):
+            return arg if arg in _PARSERS else None
+    return None
+
+
+def make_parser(command=None):
+
+    """Make argument parser.
+
+    Argument parser is reusable, so keep the parser around instead of remaking
+    it.
 
+    If command is given, only the parser for that command is built, which is
+    faster.  Otherwise, parsers for all commands are built.
+
+    You can use it to parse and run an argument list like so:
+
+        >>> parser = make_parser()
+        >>> args = parser.parse_args(['tag', 'foo', 'bar'])
+        >>> args.func(args)
+    """
+
+    top_parser = argparse.ArgumentParser()
+    top_parser.add_argument('--debug', action='store_true')
+    top_parser.add_argument('--stats', action='store_true')
+    top_parser.add_argument('--stats-json', action='store_true')
+    subparsers = top_parser.add_subparsers(title='Commands')
+    if command in _PARSERS:
+        _PARSERS[command](subparsers, command)
+    else:
+        for name, make in _PARSERS.items():
+            make(subparsers, name)
     return top_parser
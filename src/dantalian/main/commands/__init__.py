@@ -0,0 +1,98 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This package contains command implementations.
+
+Commands are split into modules so that running a command only imports the
+parts of Dantalian that it needs.
+
+"""
+
+import os
+import sys
+
+from dantalian import fs
+from dantalian import library
+from dantalian import tagnames
+
+
+def get_rootpath(args):
+    """Unpack rootpath argument."""
+    if args.root:
+        return args.root
+    else:
+        with fs.phase('find-library'):
+            return library.find_library('.')
+
+
+def tag_convert(args, *keys):
+    """Convert argument values from tagnames to paths.
+
+    Also convert values from lists of tagnames to lists of paths.  Also do
+    get_rootpath because it's convenient.
+
+    """
+    rootpath = get_rootpath(args)
+    for key in keys:
+        value = getattr(args, key)
+        if isinstance(value, list):
+            value = [tagnames.path(rootpath, name) for name in value]
+        else:
+            value = tagnames.path(rootpath, value)
+        setattr(args, key, value)
+    return rootpath
+
+
+def ask_daemon(rootpath, request):
+    """Send a request to the library's daemon, if one is running.
+
+    The daemon module is only imported if the daemon's socket exists.
+
+    Returns:
+        The results, or None if no daemon is running.
+
+    """
+    if not fs.lexists(library.get_resource(rootpath, 'daemon.sock')):
+        return None
+    from dantalian import daemon  # pylint: disable=import-outside-toplevel
+    request = dict(request, rootpath=rootpath, cwd=os.getcwd())
+    return daemon.query(rootpath, request)
+
+
+def read_records(file, sep):
+    """Generate sep-terminated records from a file, without the separator."""
+    if sep == '\n':
+        for line in file:
+            yield line.rstrip('\n')
+        return
+    buffer = ''
+    while True:
+        chunk = file.read(65536)
+        if not chunk:
+            break
+        buffer += chunk
+        *records, buffer = buffer.split(sep)
+        yield from records
+    if buffer:
+        yield buffer
+
+
+def write_records(records, null=False):
+    """Write records to stdout, terminated by newlines or NUL characters."""
+    end = '\0' if null else '\n'
+    for record in records:
+        sys.stdout.write(record + end)
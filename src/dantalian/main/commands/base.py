@@ -0,0 +1,153 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Base commands."""
+
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+import logging
+import os
+import posixpath
+
+from dantalian import base
+from dantalian import dtags
+
+from . import ask_daemon
+from . import tag_convert
+from . import write_records
+
+_LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=missing-docstring
+
+
+def link(args):
+    rootpath = tag_convert(args, 'src', 'dst')
+    base.link(rootpath, args.src, args.dst, args.symlink)
+
+
+def unlink(args):
+    rootpath = tag_convert(args, 'files')
+    for file in args.files:
+        try:
+            base.unlink(rootpath, file)
+        except OSError as err:
+            _LOGGER.error(err)
+
+
+def rename(args):
+    rootpath = tag_convert(args, 'src', 'dst')
+    base.rename(rootpath, args.src, args.dst)
+
+
+def swap(args):
+    rootpath = tag_convert(args, 'dir')
+    base.swap_dir(rootpath, args.dir)
+
+
+def _all_dirs(top):
+    """Generate paths of all directories under top."""
+    for (dirpath, dirnames, _) in os.walk(top):
+        for dirname in dirnames:
+            yield posixpath.join(dirpath, dirname)
+
+
+def _do_all_dirs(top, callback, jobs=None):
+    """Call function for all directories.
+
+    If jobs is given, directories are processed concurrently by that many
+    worker threads, and errors are logged per directory instead of aborting.
+
+    Returns:
+        Number of directories that failed.
+    """
+    if not jobs:
+        for path in _all_dirs(top):
+            callback(path)
+        return 0
+    # Keep the number of queued directories bounded so huge trees don't get
+    # materialized in memory all at once.
+    max_pending = jobs * 4
+    failed = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = {}
+        for path in _all_dirs(top):
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                failed += _log_done(pending, done)
+            pending[executor.submit(callback, path)] = path
+        done, _ = wait(pending)
+        failed += _log_done(pending, done)
+    return failed
+
+
+def _log_done(pending, done):
+    """Remove finished futures from pending, logging any errors.
+
+    Returns:
+        Number of errors.
+    """
+    failed = 0
+    for future in done:
+        path = pending.pop(future)
+        err = future.exception()
+        if err is not None:
+            _LOGGER.error('%s: %s', path, err)
+            failed += 1
+    return failed
+
+
+def save(args):
+    rootpath = tag_convert(args, 'dir')
+    if args.all:
+        failed = _do_all_dirs(
+            args.dir, lambda path: base.save_dtags(rootpath, rootpath, path),
+            args.jobs)
+        return 1 if failed else None
+    base.save_dtags(rootpath, rootpath, args.dir)
+
+
+def load(args):
+    rootpath = tag_convert(args, 'dir')
+    if args.all:
+        failed = _do_all_dirs(
+            args.dir, lambda path: base.load_dtags(rootpath, path), args.jobs)
+        return 1 if failed else None
+    base.load_dtags(rootpath, args.dir)
+
+
+def unload(args):
+    rootpath = tag_convert(args, 'dir')
+    if args.all:
+        failed = _do_all_dirs(
+            args.dir, lambda path: base.unload_dtags(rootpath, path),
+            args.jobs)
+        return 1 if failed else None
+    base.unload_dtags(rootpath, args.dir)
+
+
+def magic_list(args):
+    rootpath = tag_convert(args, 'path')
+    path = args.path
+    if posixpath.isdir(path) and args.tags:
+        results = dtags.list_tags(path)
+    else:
+        results = ask_daemon(rootpath, {'op': 'list', 'path': path})
+        if results is None:
+            results = base.list_links(rootpath, path)
+    write_records(results, args.null)
@@ -0,0 +1,92 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Batch command."""
+
+import logging
+import shlex
+import sys
+
+from dantalian.main import argparse
+
+from . import get_rootpath
+from . import read_records
+
+# pylint: disable=missing-docstring
+
+
+class _ErrorCounter(logging.Handler):
+
+    """Logging handler that counts error records."""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def _run_batch_command(parser, argv, rootpath):
+    """Run one batch command.
+
+    Returns:
+        Error message, or None if the command succeeded.
+
+    """
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit:
+        return 'invalid command'
+    func = getattr(args, 'func', None)
+    if func is None or func.module in ('batch', 'daemon'):
+        return 'invalid command'
+    # Share the library lookup across all commands.
+    if getattr(args, 'root', False) is None:
+        args.root = rootpath
+    try:
+        status = func(args)
+    except Exception as err:  # pylint: disable=broad-except
+        return str(err)
+    if status:
+        return 'exit status {}'.format(status)
+    return None
+
+
+def batch(args):
+    parser = argparse.make_parser()
+    rootpath = get_rootpath(args)
+    counter = _ErrorCounter()
+    logger = logging.getLogger('dantalian')
+    logger.addHandler(counter)
+    try:
+        sep = '\0' if args.null else '\n'
+        for lineno, record in enumerate(read_records(sys.stdin, sep), 1):
+            argv = shlex.split(record)
+            if not argv:
+                continue
+            counter.count = 0
+            error = _run_batch_command(parser, argv, rootpath)
+            if error is None and counter.count:
+                error = '{} error(s) logged'.format(counter.count)
+            sys.stdout.flush()
+            if error is None:
+                print('{}\tok'.format(lineno), file=sys.stderr)
+            else:
+                print('{}\terror\t{}'.format(lineno, error), file=sys.stderr)
+    finally:
+        logger.removeHandler(counter)
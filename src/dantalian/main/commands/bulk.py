@@ -0,0 +1,100 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Bulk commands."""
+
+import json
+import sys
+
+from dantalian import bulk
+
+from . import ask_daemon
+from . import get_rootpath
+from . import tag_convert
+from . import write_records
+
+# pylint: disable=missing-docstring
+
+
+def clean(args):
+    bulk.clean_symlinks(args.dir)
+
+
+def rename_all(args):
+    rootpath = tag_convert(args, 'path')
+    bulk.rename_all(rootpath, rootpath, args.path, args.name)
+
+
+def unlink_all(args):
+    rootpath = tag_convert(args, 'paths')
+    bulk.unlink_all(rootpath, rootpath, args.path)
+
+
+def import_tags(args):
+    rootpath = get_rootpath(args)
+    path_tag_map = json.load(sys.stdin)
+    bulk.import_tags(rootpath, path_tag_map)
+
+
+def dedupe(args):
+    # pylint: disable=import-outside-toplevel
+    from dantalian import dedupe as dedupelib
+    rootpath = get_rootpath(args)
+    duplicates = dedupelib.find_duplicates(rootpath, args.jobs)
+    write_records(('{}\t{}'.format(duplicate.keep[0], paths[0])
+                   for duplicate in duplicates
+                   for paths in duplicate.copies), args.null)
+    reclaimed = dedupelib.reclaimable(duplicates)
+    copies = sum(len(duplicate.copies) for duplicate in duplicates)
+    if args.dry_run:
+        print('Would reclaim {} bytes from {} files'.format(reclaimed, copies),
+              file=sys.stderr)
+        return
+    dedupelib.merge(rootpath, duplicates)
+    print('Reclaimed {} bytes from {} files'.format(reclaimed, copies),
+          file=sys.stderr)
+
+
+def fsck(args):
+    # pylint: disable=import-outside-toplevel
+    from dantalian import fsck as fscklib
+    rootpath = get_rootpath(args)
+    problems = fscklib.check(rootpath, args.jobs)
+    status = 1 if problems else None
+    if args.plan:
+        write_records(fscklib.plan(problems), args.null)
+        return status
+    write_records(('\t'.join(field for field in problem if field is not None)
+                   for problem in problems), args.null)
+    if args.repair:
+        fscklib.repair(rootpath, problems)
+    return status
+
+
+def export_tags(args):
+    rootpath = get_rootpath(args)
+    path_tag_map = ask_daemon(rootpath, {'op': 'export', 'top': args.dir,
+                                         'full': args.full})
+    if path_tag_map is None:
+        path_tag_map = bulk.export_tags(rootpath, args.dir, args.full)
+    if args.null:
+        # Each path is followed by its tags, and an empty record ends the
+        # entry.
+        for path, tags in path_tag_map.items():
+            write_records([path] + tags + [''], null=True)
+    else:
+        json.dump(path_tag_map, sys.stdout)
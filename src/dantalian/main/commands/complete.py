@@ -0,0 +1,35 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Completion command.
+
+This runs on every keypress of tab completion, so it only imports the trie.
+"""
+
+from dantalian import trie
+
+from . import get_rootpath
+
+# pylint: disable=missing-docstring
+
+
+def complete(args):
+    rootpath = get_rootpath(args)
+    if rootpath is None:
+        return
+    for tagname in trie.complete(rootpath, args.prefix):
+        print(tagname)
@@ -0,0 +1,46 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Daemon commands."""
+
+import logging
+import signal
+
+from dantalian import daemon
+
+from . import get_rootpath
+
+# pylint: disable=missing-docstring
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def serve(args):
+    rootpath = get_rootpath(args)
+    server = daemon.Server(rootpath)
+
+    def stop(signum, frame):  # pylint: disable=unused-argument
+        server.stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    _LOGGER.info('Serving %s on %s', rootpath, server.sockpath)
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -0,0 +1,64 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Report commands."""
+
+import sys
+
+from dantalian import fs
+from dantalian import report
+
+from . import get_rootpath
+
+# pylint: disable=missing-docstring
+
+
+def _print_stats(results, top):
+    print('directories: {}'.format(results['directories']))
+    print('entries: {}'.format(results['entries']))
+    print('files: {}'.format(results['files']))
+    print('tagged directories: {}'.format(len(results['tagged_dirs'])))
+    print('links per file:')
+    for nlink, files in sorted(results['links'].items()):
+        print('  {}: {}'.format(nlink, files))
+    print('largest tags:')
+    tags = sorted(results['tags'].items(),
+                  key=lambda item: (-item[1]['unique'], item[0]))
+    for tagname, counts in tags[:top]:
+        print('  {} {} ({} entries)'.format(
+            counts['unique'], tagname, counts['entries']))
+
+
+def stats(args):
+    rootpath = get_rootpath(args)
+    results = report.library_stats(rootpath, args.cache)
+    if args.json:
+        import json  # pylint: disable=import-outside-toplevel
+        print(json.dumps(results, sort_keys=True))
+    else:
+        _print_stats(results, args.top)
+
+
+def cooccur(args):
+    rootpath = get_rootpath(args)
+    results = report.cooccurrence(rootpath)
+    write = report.write_json if args.json else report.write_csv
+    if args.output:
+        with fs.open_file(args.output, 'w') as file:
+            write(results, file)
+    else:
+        write(results, sys.stdout)
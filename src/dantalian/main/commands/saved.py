@@ -0,0 +1,71 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Saved query commands."""
+
+import sys
+
+from dantalian import saved
+
+from . import tag_convert
+from . import write_records
+
+# pylint: disable=missing-docstring
+
+
+def _write_changes(changes, null):
+    added, removed = changes
+    write_records(['+' + path for path in added] +
+                  ['-' + path for path in removed], null)
+
+
+def save_query(args):
+    rootpath = tag_convert(args, 'dir')
+    query = ' '.join(args.query)
+    _write_changes(saved.save_query(rootpath, args.dir, query), args.null)
+
+
+def _no_query(path):
+    print('no saved query for {}'.format(path), file=sys.stderr)
+
+
+def drop_query(args):
+    rootpath = tag_convert(args, 'dir')
+    try:
+        saved.drop_query(rootpath, args.dir)
+    except KeyError:
+        _no_query(args.dir)
+        return 1
+
+
+def refresh(args):
+    rootpath = tag_convert(args, 'dirs')
+    status = None
+    if args.dirs:
+        results = {}
+        for path in args.dirs:
+            try:
+                results[path] = saved.refresh(rootpath, path, args.force)
+            except KeyError:
+                _no_query(path)
+                status = 1
+    else:
+        results = saved.refresh_all(rootpath, args.force)
+    for changes in results.values():
+        if changes is not None:
+            _write_changes(changes, args.null)
+    return status
@@ -0,0 +1,148 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Search commands."""
+
+import sys
+
+from dantalian import findlib
+
+from . import ask_daemon
+from . import get_rootpath
+from . import tag_convert
+from . import write_records
+
+# pylint: disable=missing-docstring
+
+
+def _write_changes(changes, null):
+    write_records((sign + path for sign, path in changes), null)
+    sys.stdout.flush()
+
+
+def _watch(rootpath, query, null):
+    from dantalian import watch  # pylint: disable=import-outside-toplevel
+    query_tree = findlib.parse_query(rootpath, query)
+    with watch.QueryWatch(query_tree) as query_watch:
+        _write_changes((('+', path) for path in query_watch.results.values()),
+                       null)
+        try:
+            while True:
+                _write_changes(query_watch.changes(), null)
+        except KeyboardInterrupt:
+            pass
+
+
+def _parse_weights(weights, count):
+    """Parse comma separated weights for count queries.
+
+    Raises:
+        ValueError: The weights are not numbers or don't match the queries.
+    """
+    values = []
+    for weight in weights.split(','):
+        try:
+            values.append(float(weight))
+        except ValueError:
+            raise ValueError('invalid weight {!r}'.format(weight)) from None
+    if len(values) != count:
+        raise ValueError('got {} weights for {} queries'.format(
+            len(values), count))
+    return values
+
+
+def _rank(rootpath, args, weights):
+    nodes = [findlib.parse_query(rootpath, query) for query in args.query]
+    results = findlib.rank(nodes, weights, args.top)
+    write_records(('{:g}\t{}'.format(score, path) for score, path in results),
+                  args.null)
+
+
+def _estimate(rootpath, query_tree):
+    from dantalian import estimate  # pylint: disable=import-outside-toplevel
+    cache = estimate.SketchCache(rootpath)
+    result = estimate.estimate(query_tree, cache)
+    cache.save()
+    print('{:.0f}\t{:.0f}'.format(result.value, result.error))
+
+
+def _search_library(rootpath, query):
+    """Search a library, using its daemon or index if it has one."""
+    results = ask_daemon(rootpath, {'op': 'search', 'query': query})
+    if results is None:
+        from dantalian import index  # pylint: disable=import-outside-toplevel
+        query_tree = findlib.parse_query(rootpath, query)
+        results = index.search(rootpath, query_tree)
+        if results is None:
+            results = findlib.search(query_tree)
+    return results
+
+
+def _search_libraries(args):
+    query = ' '.join(args.query)
+    errors = []
+    results = findlib.search_libraries(args.libraries, query, args.jobs,
+                                       _search_library, errors)
+    write_records(('{}\t{}'.format(rootpath, path)
+                   for rootpath, path in results), args.null)
+    return 1 if errors else None
+
+
+def search(args):
+    if not args.rank and (args.top is not None or args.weights is not None):
+        print('search: --top and --weights require --rank', file=sys.stderr)
+        return 2
+    weights = None
+    if args.weights is not None:
+        try:
+            weights = _parse_weights(args.weights, len(args.query))
+        except ValueError as err:
+            print('search: {}'.format(err), file=sys.stderr)
+            return 2
+    if args.libraries:
+        return _search_libraries(args)
+    rootpath = get_rootpath(args)
+    if args.rank:
+        _rank(rootpath, args, weights)
+        return
+    query = ' '.join(args.query)
+    if args.count:
+        print(findlib.count(findlib.parse_query(rootpath, query)))
+        return
+    if args.estimate:
+        _estimate(rootpath, findlib.parse_query(rootpath, query))
+        return
+    if args.watch:
+        _watch(rootpath, query, args.null)
+        return
+    write_records(_search_library(rootpath, query), args.null)
+
+
+def reindex(args):
+    from dantalian import index  # pylint: disable=import-outside-toplevel
+    rootpath = get_rootpath(args)
+    index.rebuild(rootpath)
+
+
+def similar(args):
+    # pylint: disable=import-outside-toplevel
+    from dantalian import similar as similarlib
+    rootpath = tag_convert(args, 'path')
+    results = similarlib.get_index(rootpath, args.rebuild).similar(
+        args.path, args.top)
+    write_records(('{:.3f}\t{}'.format(similarity, path)
+                   for similarity, path in results), args.null)
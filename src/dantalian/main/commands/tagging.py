@@ -0,0 +1,60 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tagging commands."""
+
+import logging
+import sys
+
+from dantalian import tagging
+from dantalian import tagnames
+
+from . import read_records
+from . import tag_convert
+
+_LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=missing-docstring
+
+
+def _files(args, rootpath):
+    """Return files to tag, from arguments or streamed from stdin."""
+    if args.stdin:
+        files = read_records(sys.stdin, '\0' if args.null else '\n')
+    else:
+        files = args.files
+    return (tagnames.path(rootpath, name) for name in files)
+
+
+def tag(args):
+    rootpath = tag_convert(args, 'tags')
+    for current_file in _files(args, rootpath):
+        for current_tag in args.tags:
+            try:
+                tagging.tag(rootpath, current_file, current_tag)
+            except OSError as err:
+                _LOGGER.error(err)
+
+
+def untag(args):
+    rootpath = tag_convert(args, 'tags')
+    for current_file in _files(args, rootpath):
+        for current_tag in args.tags:
+            try:
+                tagging.untag(rootpath, current_file, current_tag)
+            except OSError as err:
+                _LOGGER.error(err)
@@ -20,14 +20,16 @@ This module contains shared path-related functionality.
 """
 
 from itertools import count
-import os
 import posixpath
 
+from dantalian import fs
+from dantalian import locks
+
 
 def readlink(path):
     """Follow all symlinks and return the target of the last link."""
-    while posixpath.islink(path):
-        path = os.readlink(path)
+    while fs.islink(path):
+        path = fs.readlink(path)
     return path
 
 
@@ -38,7 +40,7 @@ def listdirpaths(path):
       A generator yielding paths.
 
     """
-    for entry in os.listdir(path):
+    for entry in fs.listdir(path):
         yield posixpath.join(path, entry)
 
 
@@ -60,7 +62,7 @@ def free_name(dirpath, name):
         Filename.
 
     """
-    files = os.listdir(dirpath)
+    files = fs.listdir(dirpath)
     if name not in files:
         return name
     base, ext = posixpath.splitext(name)
@@ -74,14 +76,18 @@ def free_name(dirpath, name):
 def free_name_do(dirpath, name, callback):
     """Repeatedly attempt to do something while finding a free filename.
 
+    The directory is locked while finding the name and calling the callback,
+    so concurrent callers don't race for the same name.
+
     Returns:
         Path of successful new name.
     """
-    while True:
-        dst = posixpath.join(dirpath, free_name(dirpath, name))
-        try:
-            callback(dst)
-        except FileExistsError:
-            continue
-        else:
-            return dst
+    with locks.lock_dir(dirpath):
+        while True:
+            dst = posixpath.join(dirpath, free_name(dirpath, name))
+            try:
+                callback(dst)
+            except FileExistsError:
+                continue
+            else:
+                return dst
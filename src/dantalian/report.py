@@ -0,0 +1,380 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This module implements library statistics.
+
+library_stats() walks a library once with scandir() and reports per-tag
+counts, a histogram of links per file and the dtags of tagged directories.
+
+Each directory's figures are cached in the library at .dantalian/stats.json,
+keyed by the directory's inode and modification time and its dtags file's
+modification time, so only directories that changed are scanned again.
+
+Link counts come from st_nlink.  Since linking or unlinking a file elsewhere
+doesn't change the modification time of directories it is already in, each
+file's link count is taken from the most recently scanned directory
+containing it.  If that directory came from the cache and the file is in
+fewer directories than its cached link count, a link may have been removed,
+so the file is stat()ed again.
+
+cooccurrence() counts how many files each pair of tags share.  It builds an
+incidence structure in one walk, with one compact array of tag ids per
+inode, and counts the pairs in each array, using NumPy if it is installed.
+
+"""
+
+from array import array
+from collections import Counter
+from collections import namedtuple
+import itertools
+import logging
+import posixpath
+import stat
+import time
+
+from dantalian import dtags
+from dantalian import fs
+from dantalian import library
+from dantalian import locks
+from dantalian import tagnames
+
+_LOGGER = logging.getLogger(__name__)
+
+_CACHE = 'stats.json'
+_CACHE_VERSION = 2
+_DTAGS_FILE = '.dtags'
+
+
+def _stamp(dirpath):
+    """Return the cache stamp of a directory."""
+    dirstat = fs.stat(dirpath)
+    try:
+        dtags_mtime = fs.lstat(posixpath.join(dirpath, _DTAGS_FILE)).st_mtime_ns
+    except FileNotFoundError:
+        dtags_mtime = None
+    # The version makes figures cached in an older format stale.
+    return [_CACHE_VERSION, dirstat.st_ino, dirstat.st_mtime_ns, dtags_mtime]
+
+
+def _scan(dirpath, skip=()):
+    """Scan a directory.
+
+    Entries named in skip are ignored.
+
+    Returns:
+        Dict with the directory's figures:
+        entries: Number of entries, not counting the dtags file.
+        unique: Number of distinct files among the entries.
+        files: List of [st_dev, st_ino, st_nlink, name] of distinct regular
+            files.
+        subdirs: Names of subdirectories, not counting symlinks.
+        dtags: Number of dtags.
+        scanned: Time of the scan.
+    """
+    scanned = time.time()
+    entries = 0
+    keys = set()
+    files = {}
+    subdirs = []
+    has_dtags = False
+    for entry in fs.scandir(dirpath):
+        if entry.name == _DTAGS_FILE:
+            has_dtags = True
+            continue
+        if entry.name in skip:
+            continue
+        try:
+            stat_result = entry.stat()
+        except FileNotFoundError:
+            # Broken symlink.
+            continue
+        entries += 1
+        key = (stat_result.st_dev, stat_result.st_ino)
+        keys.add(key)
+        if stat.S_ISREG(stat_result.st_mode):
+            files[key] = (stat_result.st_nlink, entry.name)
+        elif entry.is_dir(follow_symlinks=False):
+            subdirs.append(entry.name)
+    return {
+        'entries': entries,
+        'unique': len(keys),
+        'files': [[dev, ino, nlink, name]
+                  for (dev, ino), (nlink, name) in files.items()],
+        'subdirs': subdirs,
+        'dtags': len(dtags.list_tags(dirpath)) if has_dtags else 0,
+        'scanned': scanned,
+    }
+
+
+class StatsCache:
+
+    """Cache of per-directory figures, stored in a library."""
+
+    def __init__(self, rootpath):
+        self.rootpath = posixpath.normpath(rootpath)
+        self.dirs = {}
+        self.scanned = 0
+        self._load()
+
+    def _path(self):
+        return library.get_resource(self.rootpath, _CACHE)
+
+    def _load(self):
+        import json  # pylint: disable=import-outside-toplevel
+        try:
+            with fs.open_file(self._path()) as file, \
+                    locks.lock_file(file, shared=True):
+                self.dirs = json.load(file)
+        except (FileNotFoundError, ValueError):
+            self.dirs = {}
+
+    def save(self, tagnames_seen):
+        """Save the figures of the given directories, dropping the rest."""
+        import json  # pylint: disable=import-outside-toplevel
+        self.dirs = dict((tagname, self.dirs[tagname])
+                         for tagname in tagnames_seen)
+        with fs.open_file(self._path(), 'a+') as file, locks.lock_file(file):
+            # Truncate only once the lock is held, so readers never see a
+            # partly written file.
+            file.seek(0)
+            file.truncate()
+            json.dump(self.dirs, file)
+
+    def get(self, dirpath):
+        """Return a directory's figures, scanning it if it changed."""
+        if dirpath == self.rootpath:
+            tagname = '//'
+            skip = ('.dantalian',)
+        else:
+            tagname = tagnames.path2tag(self.rootpath, dirpath)
+            skip = ()
+        stamp = _stamp(dirpath)
+        cached = self.dirs.get(tagname)
+        if cached is not None and cached['stamp'] == stamp:
+            return tagname, cached
+        _LOGGER.debug('Scanning %s', dirpath)
+        figures = _scan(dirpath, skip)
+        figures['stamp'] = stamp
+        self.dirs[tagname] = figures
+        self.scanned += 1
+        return tagname, figures
+
+
+def library_stats(rootpath, use_cache=True):
+    """Compute statistics for a library.
+
+    Args:
+        rootpath: Path of library.
+        use_cache: Whether to use and update the cache.
+
+    Returns:
+        Dict with these keys:
+        directories: Number of directories, i.e. tags.
+        entries: Number of entries in all directories.
+        files: Number of distinct regular files.
+        tags: Dict mapping tagnames to dicts of 'entries' and 'unique'
+            counts.
+        links: Dict mapping link counts to numbers of files.
+        tagged_dirs: Dict mapping tagnames of directories that have dtags to
+            their numbers of dtags.
+        scanned: Number of directories scanned instead of read from the
+            cache.
+    """
+    cache = StatsCache(rootpath)
+    if not use_cache:
+        cache.dirs = {}
+    tags = {}
+    tagged_dirs = {}
+    nlinks = {}
+    seen_dirs = Counter()
+    entries = 0
+    start = time.time()
+    stack = [cache.rootpath]
+    while stack:
+        dirpath = stack.pop()
+        tagname, figures = cache.get(dirpath)
+        tags[tagname] = {'entries': figures['entries'],
+                         'unique': figures['unique']}
+        entries += figures['entries']
+        if figures['dtags']:
+            tagged_dirs[tagname] = figures['dtags']
+        scanned = figures['scanned']
+        for dev, ino, nlink, name in figures['files']:
+            key = (dev, ino)
+            seen_dirs[key] += 1
+            seen = nlinks.get(key)
+            if seen is None or seen[0] < scanned:
+                nlinks[key] = (scanned, nlink, dirpath, name)
+        stack.extend(posixpath.join(dirpath, name)
+                     for name in figures['subdirs'])
+    for key, (scanned, nlink, dirpath, name) in nlinks.items():
+        if scanned < start and seen_dirs[key] < nlink:
+            try:
+                nlink = fs.lstat(posixpath.join(dirpath, name)).st_nlink
+            except FileNotFoundError:
+                continue
+            nlinks[key] = (scanned, nlink, dirpath, name)
+    if use_cache:
+        cache.save(tags)
+    return {
+        'directories': len(tags),
+        'entries': entries,
+        'files': len(nlinks),
+        'tags': tags,
+        'links': dict(Counter(seen[1] for seen in nlinks.values())),
+        'tagged_dirs': tagged_dirs,
+        'scanned': cache.scanned,
+    }
+
+
+Incidence = namedtuple('Incidence', ['tags', 'stamps', 'rows', 'keys',
+                                     'paths'])
+Cooccurrence = namedtuple('Cooccurrence', ['tags', 'counts'])
+
+
+def incidence(rootpath):
+    """Build the inode to tag incidence structure of a library.
+
+    Returns:
+        Incidence tuple with these fields:
+        tags: List of tagnames.
+        stamps: List of (st_ino, st_mtime_ns) of each tag's directory,
+            taken before it was scanned.
+        rows: List with an array of tag ids (indexes into tags) for each
+            distinct file or directory in the library.
+        keys: List of the (st_dev, st_ino) of each row's inode.
+        paths: List of a path of each row's inode.
+    """
+    rootpath = posixpath.normpath(rootpath)
+    tags = []
+    stamps = []
+    rows = {}
+    paths = {}
+    stack = [rootpath]
+    while stack:
+        dirpath = stack.pop()
+        if dirpath == rootpath:
+            tagname = '//'
+            skip = ('.dantalian', _DTAGS_FILE)
+        else:
+            tagname = tagnames.path2tag(rootpath, dirpath)
+            skip = (_DTAGS_FILE,)
+        tag_id = len(tags)
+        tags.append(tagname)
+        dirstat = fs.stat(dirpath)
+        stamps.append((dirstat.st_ino, dirstat.st_mtime_ns))
+        for entry in fs.scandir(dirpath):
+            if entry.name in skip:
+                continue
+            try:
+                stat_result = entry.stat()
+            except FileNotFoundError:
+                # Broken symlink.
+                continue
+            key = (stat_result.st_dev, stat_result.st_ino)
+            row = rows.get(key)
+            if row is None:
+                rows[key] = array('I', [tag_id])
+                paths[key] = entry.path
+            elif row[-1] != tag_id:
+                row.append(tag_id)
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+    keys = list(rows)
+    return Incidence(tags, stamps, [rows[key] for key in keys], keys,
+                     [paths[key] for key in keys])
+
+
+def _count_pairs(rows):
+    """Count tag id pairs in incidence rows in pure Python."""
+    counts = Counter()
+    for row in rows:
+        counts.update(itertools.combinations_with_replacement(sorted(row), 2))
+    return counts
+
+
+def _count_pairs_numpy(numpy, rows, ntags):
+    """Count tag id pairs in incidence rows with NumPy.
+
+    Rows of the same length are stacked into a matrix, so the pairs of all
+    of them can be encoded at once.
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(len(row), []).append(row)
+    codes = []
+    for length, group in groups.items():
+        matrix = numpy.array(group, dtype=numpy.int64)
+        matrix.sort(axis=1)
+        first, second = numpy.triu_indices(length)
+        codes.append((matrix[:, first] * ntags + matrix[:, second]).ravel())
+    if not codes:
+        return {}
+    codes, totals = numpy.unique(numpy.concatenate(codes), return_counts=True)
+    return dict(((int(code) // ntags, int(code) % ntags), int(total))
+                for code, total in zip(codes, totals))
+
+
+def _import_numpy():
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    return numpy
+
+
+def cooccurrence(rootpath, use_numpy=True):
+    """Count tag co-occurrences in a library.
+
+    Args:
+        rootpath: Path of library.
+        use_numpy: Whether to use NumPy if it is installed.
+
+    Returns:
+        Cooccurrence tuple of the list of tagnames and a dict mapping pairs
+        of tag ids (i, j) with i <= j to the number of files with both tags.
+        Pairs (i, i) count the files with tag i.  Pairs without shared files
+        are left out.
+    """
+    tags, _, rows, _, _ = incidence(rootpath)
+    numpy = _import_numpy() if use_numpy else None
+    if numpy is None:
+        counts = dict(_count_pairs(rows))
+    else:
+        counts = _count_pairs_numpy(numpy, rows, len(tags))
+    return Cooccurrence(tags, counts)
+
+
+def _sorted_pairs(cooccur):
+    """Return sorted (tag, tag, count) tuples of co-occurrence counts."""
+    tags = cooccur.tags
+    return sorted(tuple(sorted((tags[first], tags[second]))) + (count,)
+                  for (first, second), count in cooccur.counts.items())
+
+
+def write_csv(cooccur, file):
+    """Write co-occurrence counts as CSV rows of tag, tag, count."""
+    import csv  # pylint: disable=import-outside-toplevel
+    writer = csv.writer(file, lineterminator='\n')
+    writer.writerow(['tag1', 'tag2', 'count'])
+    writer.writerows(_sorted_pairs(cooccur))
+
+
+def write_json(cooccur, file):
+    """Write co-occurrence counts as a JSON list of [tag, tag, count]."""
+    import json  # pylint: disable=import-outside-toplevel
+    json.dump([list(pair) for pair in _sorted_pairs(cooccur)], file)
@@ -0,0 +1,269 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This module implements saved queries materialized as directories.
+
+A saved query is a search query bound to a directory in the library.  The
+directory contains links to the query's results, made with base.link(), so it
+can be browsed like any other tag directory.
+
+refresh() updates a saved query's directory by linking new results and
+unlinking old ones, leaving unchanged links alone.  If none of the
+directories the query searches have changed since the last refresh, judged by
+their inode and modification time, the query is not evaluated at all.  Queries
+with stat filters are always evaluated, since their results can change
+without any directory changing.
+
+Results are hard linked into the directory, which increases their link
+counts, so LINKS filters see the links made by saved queries.
+
+Saved queries are stored in the library at .dantalian/queries.json, as a JSON
+object mapping the tagnames of the directories to their query strings and
+source directory stamps.
+
+"""
+
+from contextlib import contextmanager
+import logging
+import posixpath
+import shlex
+
+from dantalian import base
+from dantalian import findlib
+from dantalian import fs
+from dantalian import library
+from dantalian import locks
+from dantalian import pathlib
+from dantalian import tagnames
+
+_LOGGER = logging.getLogger(__name__)
+
+_QUERIES = 'queries.json'
+
+# Entries of query directories that aren't links to results.
+_IGNORED = frozenset(['.dtags'])
+
+
+@contextmanager
+def _open_store(rootpath, write=False):
+    """Open the saved query store for the duration of the context.
+
+    Yields a dict mapping directory tagnames to dicts with 'query' and
+    'sources' keys.  If write is True, the dict is written back afterward.
+    """
+    import json  # pylint: disable=import-outside-toplevel
+    path = library.get_resource(rootpath, _QUERIES)
+    with fs.open_file(path, 'a+') as file, \
+            locks.lock_file(file, shared=not write):
+        file.seek(0)
+        data = file.read()
+        store = json.loads(data) if data else {}
+        yield store
+        if write:
+            file.seek(0)
+            file.truncate()
+            json.dump(store, file, indent=2, sort_keys=True)
+
+
+def _query_dirs(node):
+    """Generate the directory paths a query tree reads."""
+    if isinstance(node, findlib.GroupNode):
+        for child in node.children:
+            yield from _query_dirs(child)
+    elif isinstance(node, findlib.GlobNode):
+        # Include the directories searched for matches, so new matches are
+        # noticed.
+        yield from node.source_dirs()
+    else:
+        yield node.dirpath
+
+
+def _unparse(rootpath, node):
+    """Return a query string for a query tree, using tagnames for leaves.
+
+    Saved queries don't depend on the current directory this way.
+    """
+    if isinstance(node, findlib.FilterNode):
+        tokens = [node.keyword, shlex.quote(node.spec)]
+    elif isinstance(node, findlib.GroupNode):
+        tokens = [{findlib.AndNode: 'AND',
+                   findlib.OrNode: 'OR',
+                   findlib.MinusNode: 'MINUS'}[node.__class__]]
+    elif isinstance(node, findlib.GlobNode):
+        return shlex.quote(tagnames.path2tag(rootpath, node.pattern))
+    else:
+        return shlex.quote(tagnames.path2tag(rootpath, node.dirpath))
+    return ' '.join(tokens +
+                    [_unparse(rootpath, child) for child in node.children] +
+                    ['END'])
+
+
+def _stamp(dirpath):
+    """Return the inode and mtime stamp of a directory."""
+    stat = fs.stat(dirpath)
+    return [stat.st_ino, stat.st_mtime_ns]
+
+
+def _key(stat):
+    return (stat.st_dev, stat.st_ino)
+
+
+def save_query(rootpath, dirpath, query):
+    """Save a query and materialize it in a directory.
+
+    The directory is created if it doesn't exist.
+
+    Args:
+        rootpath: Rootpath for tag conversions.
+        dirpath: Path of directory to materialize the query in.
+        query: Search query string.
+
+    Returns:
+        Tuple of lists of added and removed paths.
+
+    Raises:
+        ValueError: The query searches the directory itself.
+
+    """
+    tree = findlib.parse_query(rootpath, query)
+    tagname = tagnames.path2tag(rootpath, dirpath)
+    if any(tagnames.path2tag(rootpath, source) == tagname
+           for source in _query_dirs(tree)):
+        raise ValueError('Query {!r} searches its own directory {}'.format(
+            query, dirpath))
+    if not fs.isdir(dirpath):
+        fs.mkdir(dirpath)
+    with _open_store(rootpath, write=True) as store:
+        store[tagname] = {'query': _unparse(rootpath, tree), 'sources': {}}
+    return refresh(rootpath, dirpath)
+
+
+def drop_query(rootpath, dirpath):
+    """Forget a saved query.  The directory and its links are left alone.
+
+    Raises:
+        KeyError: There is no query saved for the directory.
+    """
+    tagname = tagnames.path2tag(rootpath, dirpath)
+    with _open_store(rootpath, write=True) as store:
+        del store[tagname]
+
+
+def list_queries(rootpath):
+    """Return a dict mapping saved query directory tagnames to queries."""
+    with _open_store(rootpath) as store:
+        return dict((tagname, entry['query'])
+                    for tagname, entry in store.items())
+
+
+def refresh(rootpath, dirpath, force=False):
+    """Refresh a saved query's directory.
+
+    Args:
+        rootpath: Rootpath for tag conversions.
+        dirpath: Path of the saved query's directory.
+        force: Evaluate the query even if its sources haven't changed.
+
+    Returns:
+        Tuple of lists of added and removed paths, or None if the refresh was
+        skipped.
+
+    Raises:
+        KeyError: There is no query saved for the directory.
+
+    """
+    tagname = tagnames.path2tag(rootpath, dirpath)
+    with _open_store(rootpath) as store:
+        entry = store[tagname]
+    tree = findlib.parse_query(rootpath, entry['query'])
+    # Stamp the sources before searching, so changes made during the search
+    # are picked up by the next refresh.
+    sources = dict((source, _stamp(source))
+                   for source in set(_query_dirs(tree)))
+    if (not force and not findlib.has_stat_filter(tree)
+            and sources == _stamp_paths(rootpath, entry['sources'])):
+        _LOGGER.debug('Skipping %s, sources unchanged', tagname)
+        return None
+    added, removed = _apply(rootpath, dirpath, tree.get_results())
+    with _open_store(rootpath, write=True) as store:
+        if tagname in store:
+            store[tagname]['sources'] = dict(
+                (tagnames.path2tag(rootpath, source), stamp)
+                for source, stamp in sources.items())
+    _LOGGER.info('Refreshed %s: %d added, %d removed',
+                 tagname, len(added), len(removed))
+    return added, removed
+
+
+def _stamp_paths(rootpath, sources):
+    """Convert stored source stamps to be keyed by path."""
+    return dict((tagnames.tag2path(rootpath, tagname), stamp)
+                for tagname, stamp in sources.items())
+
+
+def _apply(rootpath, dirpath, results):
+    """Make a directory's links match query results.
+
+    Args:
+        rootpath: Rootpath for tag conversions.
+        dirpath: Path of directory.
+        results: Dict mapping stat objects to paths, from get_results().
+
+    Returns:
+        Tuple of lists of added and removed paths.
+    """
+    wanted = dict((_key(stat), path) for stat, path in results.items())
+    # Never link the directory into itself.
+    wanted.pop(_key(fs.stat(dirpath)), None)
+    current = {}
+    removed = []
+    for entry in fs.scandir(dirpath):
+        if entry.name in _IGNORED:
+            continue
+        path = posixpath.join(dirpath, entry.name)
+        try:
+            key = _key(entry.stat())
+        except FileNotFoundError:
+            # Broken symlink to a result that no longer exists.
+            fs.unlink(path)
+            removed.append(path)
+            continue
+        current[key] = path
+    for key, path in current.items():
+        if key not in wanted:
+            base.unlink(rootpath, path)
+            removed.append(path)
+    added = []
+    for key, path in wanted.items():
+        if key not in current:
+            added.append(pathlib.free_name_do(
+                dirpath, posixpath.basename(path),
+                lambda dst, path=path: base.link(rootpath, path, dst)))
+    return added, removed
+
+
+def refresh_all(rootpath, force=False):
+    """Refresh all saved queries.
+
+    Returns:
+        Dict mapping directory tagnames to refresh() results.
+    """
+    results = {}
+    for tagname in sorted(list_queries(rootpath)):
+        results[tagname] = refresh(
+            rootpath, tagnames.tag2path(rootpath, tagname), force)
+    return results
@@ -0,0 +1,317 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This module implements finding files with similar tags.
+
+The tags of a file are the directories it is in.  Files are compared by the
+Jaccard similarity of their tag sets, the number of tags they share divided
+by the number of tags either has.
+
+Each file's tag set is summarized by a MinHash signature: for each of
+NUM_PERM hash functions, the smallest hash of its tags.  Two signatures agree
+at each position with probability equal to the Jaccard similarity of the sets.
+Signatures are split into BANDS bands, and files that agree on all of a band
+are put in the same bucket, so candidates for a query are found by looking up
+its buckets instead of comparing it with every file.  Candidates are then
+ranked by their exact similarity.
+
+Signatures are built in one walk of the library and saved in
+.dantalian/minhash.json.  They are rebuilt when any directory has changed.
+The buckets are saved with them as a sorted array of 64-bit hashes of the
+band keys and a parallel array of row ids, so a query only binary searches
+for its own buckets instead of bucketing every file again.
+
+"""
+
+import array
+import base64
+import bisect
+import hashlib
+import heapq
+import logging
+import random
+
+from dantalian import fs
+from dantalian import library
+from dantalian import locks
+from dantalian import report
+from dantalian import tagnames
+
+_LOGGER = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 16
+
+_SIGNATURES = 'minhash.json'
+# Mersenne prime for universal hashing.
+_PRIME = (1 << 61) - 1
+
+
+def _tag_hash(tagname):
+    """Hash a tagname to 64 bits."""
+    digest = hashlib.blake2b(tagname.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def _permutations(num_perm):
+    """Return fixed parameters for num_perm universal hash functions."""
+    rand = random.Random(0)
+    return [(rand.randrange(1, _PRIME), rand.randrange(_PRIME))
+            for _ in range(num_perm)]
+
+
+def _tag_vectors(tags, num_perm):
+    """Return the array of hashes of each tagname under each hash function."""
+    permutations = _permutations(num_perm)
+    vectors = []
+    for tagname in tags:
+        value = _tag_hash(tagname)
+        vectors.append(array.array(
+            'Q', [(a * value + b) % _PRIME for a, b in permutations]))
+    return vectors
+
+
+def _bucket_key(band, values):
+    """Hash a band of a signature to 64 bits.
+
+    Colliding bands only add candidates, which are ranked exactly anyway.
+    """
+    digest = hashlib.blake2b(band.to_bytes(2, 'little') + values.tobytes(),
+                             digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def _encode(values):
+    return base64.b64encode(values.tobytes()).decode('ascii')
+
+
+def _decode(typecode, data):
+    values = array.array(typecode)
+    values.frombytes(base64.b64decode(data))
+    return values
+
+
+def _signature(vectors, row):
+    """Return the MinHash signature of a set of tag ids."""
+    if len(row) == 1:
+        return vectors[row[0]]
+    return array.array('Q', map(min, *[vectors[tag_id] for tag_id in row]))
+
+
+def _jaccard(first, second):
+    """Return the Jaccard similarity of two tag id rows."""
+    first = set(first)
+    second = set(second)
+    return len(first & second) / len(first | second)
+
+
+def _order(item):
+    """Sort key for (similarity, tagname) results, most similar first."""
+    similarity, tagname = item
+    return -similarity, tagname
+
+
+class SimilarityIndex:
+
+    """MinHash signatures of the tag sets of every file in a library.
+
+    Use build() to walk a library, or load() to load saved signatures.
+
+    Attributes:
+        rootpath: Path of library.
+        num_perm: Number of hash functions.
+        bands: Number of LSH bands.
+        tags: List of tagnames.
+        stamps: List of (st_ino, st_mtime_ns) of each tag's directory.
+        rows: List of tag id lists of each file.
+        keys: List of (st_dev, st_ino) of each file.
+        paths: List of a tagname of each file.
+        signatures: Array of every file's signature, concatenated.
+        buckets: Tuple of a sorted array of bucket keys and an array of the
+            row id of each, or None to compute them when needed.
+    """
+
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(self, rootpath, num_perm, bands, tags, stamps, rows, keys,
+                 paths, signatures, buckets=None):
+        if num_perm % bands:
+            raise ValueError('{} bands do not divide {} hash functions'.format(
+                bands, num_perm))
+        self.rootpath = rootpath
+        self.num_perm = num_perm
+        self.bands = bands
+        self.tags = tags
+        self.stamps = stamps
+        self.rows = rows
+        self.keys = keys
+        self.paths = paths
+        self.signatures = signatures
+        self._rows_by_key = dict((tuple(key), i) for i, key in enumerate(keys))
+        self._buckets = buckets
+
+    @classmethod
+    def build(cls, rootpath, num_perm=NUM_PERM, bands=BANDS):
+        """Build signatures by walking a library."""
+        _LOGGER.debug('Building MinHash signatures for %s', rootpath)
+        tags, stamps, rows, keys, paths = report.incidence(rootpath)
+        vectors = _tag_vectors(tags, num_perm)
+        signatures = array.array('Q')
+        for row in rows:
+            signatures.extend(_signature(vectors, row))
+        return cls(rootpath, num_perm, bands, tags, stamps,
+                   [row.tolist() for row in rows], keys,
+                   [tagnames.path2tag(rootpath, path) for path in paths],
+                   signatures)
+
+    def _path(self):
+        return library.get_resource(self.rootpath, _SIGNATURES)
+
+    @classmethod
+    def load(cls, rootpath):
+        """Load saved signatures.
+
+        Returns None if the library has no saved signatures, or they were
+        saved without buckets.
+        """
+        import json  # pylint: disable=import-outside-toplevel
+        try:
+            with fs.open_file(library.get_resource(rootpath, _SIGNATURES)) \
+                    as file, locks.lock_file(file, shared=True):
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+        if 'bucket_keys' not in data:
+            return None
+        buckets = (_decode('Q', data['bucket_keys']),
+                   _decode('I', data['bucket_rows']))
+        return cls(rootpath, data['num_perm'], data['bands'], data['tags'],
+                   [tuple(stamp) for stamp in data['stamps']], data['rows'],
+                   [tuple(key) for key in data['keys']], data['paths'],
+                   _decode('Q', data['signatures']), buckets)
+
+    def save(self):
+        """Save signatures to the library."""
+        import json  # pylint: disable=import-outside-toplevel
+        bucket_keys, bucket_rows = self._get_buckets()
+        data = {
+            'num_perm': self.num_perm,
+            'bands': self.bands,
+            'tags': self.tags,
+            'stamps': self.stamps,
+            'rows': self.rows,
+            'keys': self.keys,
+            'paths': self.paths,
+            'signatures': _encode(self.signatures),
+            'bucket_keys': _encode(bucket_keys),
+            'bucket_rows': _encode(bucket_rows),
+        }
+        with fs.open_file(self._path(), 'a+') as file, locks.lock_file(file):
+            # Truncate only once the lock is held, so readers never see a
+            # partly written file.
+            file.seek(0)
+            file.truncate()
+            json.dump(data, file)
+
+    def is_current(self):
+        """Check whether no directory changed since the signatures were built.
+
+        Since adding or removing a directory changes its parent, this only
+        needs to stat the known directories.
+        """
+        for tagname, stamp in zip(self.tags, self.stamps):
+            try:
+                stat = fs.stat(tagnames.tag2path(self.rootpath, tagname))
+            except FileNotFoundError:
+                return False
+            if (stat.st_ino, stat.st_mtime_ns) != stamp:
+                return False
+        return True
+
+    def signature(self, row_id):
+        """Return the signature of a file by its row id."""
+        start = row_id * self.num_perm
+        return self.signatures[start:start + self.num_perm]
+
+    def _band_keys(self, signature):
+        width = self.num_perm // self.bands
+        for band in range(self.bands):
+            yield _bucket_key(band, signature[band * width:(band + 1) * width])
+
+    def _get_buckets(self):
+        if self._buckets is None:
+            pairs = sorted((band_key, row_id)
+                           for row_id in range(len(self.rows))
+                           for band_key in self._band_keys(
+                               self.signature(row_id)))
+            self._buckets = (array.array('Q', [key for key, _ in pairs]),
+                             array.array('I', [row for _, row in pairs]))
+        return self._buckets
+
+    def candidates(self, row_id):
+        """Return the row ids of files sharing a bucket with a file."""
+        bucket_keys, bucket_rows = self._get_buckets()
+        found = set()
+        for band_key in self._band_keys(self.signature(row_id)):
+            start = bisect.bisect_left(bucket_keys, band_key)
+            end = bisect.bisect_right(bucket_keys, band_key, start)
+            found.update(bucket_rows[start:end])
+        found.discard(row_id)
+        return found
+
+    def similar(self, path, top=None):
+        """Find files with tags similar to a file's.
+
+        Args:
+            path: Path of file in the library.
+            top: Return only this many best matches.
+
+        Returns:
+            List of (similarity, path) tuples, most similar first.
+        """
+        stat = fs.stat(path)
+        row_id = self._rows_by_key.get((stat.st_dev, stat.st_ino))
+        if row_id is None:
+            raise ValueError('{} is not in the library'.format(path))
+        row = self.rows[row_id]
+        scored = ((_jaccard(row, self.rows[other]), self.paths[other])
+                  for other in self.candidates(row_id))
+        if top is None:
+            results = sorted(scored, key=_order)
+        else:
+            results = heapq.nsmallest(top, scored, key=_order)
+        return [(similarity, tagnames.tag2path(self.rootpath, tagname))
+                for similarity, tagname in results]
+
+
+def get_index(rootpath, rebuild=False):
+    """Return up to date signatures for a library, saving them if rebuilt."""
+    index = None if rebuild else SimilarityIndex.load(rootpath)
+    if (index is None or index.num_perm != NUM_PERM or index.bands != BANDS
+            or not index.is_current()):
+        index = SimilarityIndex.build(rootpath)
+        index.save()
+    return index
+
+
+def similar(rootpath, path, top=None):
+    """Find files in a library with tags similar to a file's.
+
+    Returns:
+        List of (similarity, path) tuples, most similar first.
+    """
+    return get_index(rootpath).similar(path, top)
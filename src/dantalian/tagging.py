@@ -21,6 +21,7 @@ import logging
 import posixpath
 
 from dantalian import base
+from dantalian import fs
 from dantalian import pathlib
 
 _LOGGER = logging.getLogger(__name__)
@@ -49,7 +50,7 @@ def untag(rootpath, path, directory):
     target = path
     to_unlink = []
     for filepath in pathlib.listdirpaths(directory):
-        if posixpath.samefile(target, filepath):
+        if fs.samefile(target, filepath):
             to_unlink.append(filepath)
     for filepath in to_unlink:
         base.unlink(rootpath, filepath)
@@ -0,0 +1,149 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This module implements tagname completion.
+
+Tagnames are paths in a library, so a TagTrie stores them as a trie of path
+components mirroring the library's directories.  Each node records its
+directory's inode and modification time.  A node's children are only listed
+again when its directory changed, and only the directories along the path
+being completed are checked, so completing a tagname costs a few stat calls
+however large the library is.
+
+The trie is saved in the library at .dantalian/tagtrie.json.  This module
+only imports what it needs to be fast enough to run on every keypress.
+
+"""
+
+import json
+import posixpath
+
+from dantalian import fs
+from dantalian import library
+from dantalian import locks
+
+_TRIE = 'tagtrie.json'
+
+# Node fields.
+_INO = 0
+_MTIME = 1
+_CHILDREN = 2
+
+
+def _new_node():
+    """Return a node that hasn't been listed yet."""
+    return [None, None, {}]
+
+
+class TagTrie:
+
+    """Trie of the tagnames of a library.
+
+    Use save() to save changes made while refreshing.
+    """
+
+    def __init__(self, rootpath):
+        self.rootpath = rootpath
+        self.root = _new_node()
+        self._dirty = False
+        self._load()
+
+    def _path(self):
+        return library.get_resource(self.rootpath, _TRIE)
+
+    def _load(self):
+        try:
+            with fs.open_file(self._path()) as file, \
+                    locks.lock_file(file, shared=True):
+                self.root = json.load(file)
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def save(self):
+        """Save the trie to the library, if it changed."""
+        if not self._dirty:
+            return
+        with fs.open_file(self._path(), 'a+') as file, locks.lock_file(file):
+            # Truncate only once the lock is held, so readers never see a
+            # partly written file.
+            file.seek(0)
+            file.truncate()
+            json.dump(self.root, file, separators=(',', ':'))
+        self._dirty = False
+
+    def _refresh(self, node, dirpath):
+        """List a node's directory again if it changed.
+
+        Children that are still there are kept; they are checked when they
+        are visited.
+        """
+        stat = fs.stat(dirpath)
+        if node[_INO] == stat.st_ino and node[_MTIME] == stat.st_mtime_ns:
+            return
+        old_children = node[_CHILDREN]
+        children = {}
+        for entry in fs.scandir(dirpath):
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            if node is self.root and entry.name == '.dantalian':
+                continue
+            children[entry.name] = old_children.get(entry.name) or _new_node()
+        node[_INO] = stat.st_ino
+        node[_MTIME] = stat.st_mtime_ns
+        node[_CHILDREN] = children
+        self._dirty = True
+
+    def _find(self, components):
+        """Return the up to date node of a directory, or None."""
+        node = self.root
+        dirpath = self.rootpath
+        self._refresh(node, dirpath)
+        for name in components:
+            node = node[_CHILDREN].get(name)
+            if node is None:
+                return None
+            dirpath = posixpath.join(dirpath, name)
+            try:
+                self._refresh(node, dirpath)
+            except FileNotFoundError:
+                return None
+        return node
+
+    def complete(self, prefix):
+        """Return the sorted tagnames that complete a prefix.
+
+        Only the next path component is completed, and completions end with
+        a slash, like directory completion in shells.
+        """
+        if not prefix.startswith('//'):
+            return ['//'] if '//'.startswith(prefix) else []
+        head, _, partial = prefix[2:].rpartition('/')
+        components = [name for name in head.split('/') if name]
+        node = self._find(components)
+        if node is None:
+            return []
+        start = '//' + ''.join(name + '/' for name in components)
+        return sorted(start + name + '/' for name in node[_CHILDREN]
+                      if name.startswith(partial))
+
+
+def complete(rootpath, prefix):
+    """Return the sorted tagnames of a library that complete a prefix."""
+    trie = TagTrie(rootpath)
+    completions = trie.complete(prefix)
+    trie.save()
+    return completions
@@ -0,0 +1,235 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This module implements watching search results for changes.
+
+A QueryWatch evaluates a query tree once, then watches the directories of its
+DirNodes with inotify.  When a directory changes, only the leaves for that
+directory are evaluated again; the AND, OR and MINUS nodes then combine the
+cached leaf results, and the difference from the previous results is
+reported.
+
+Leaves with stat filters also depend on the files in their directories, which
+can be written to, linked or have their attributes changed without the
+directories changing.  Each of those files is watched for IN_ATTRIB and
+IN_MODIFY, so the leaf is evaluated again when one changes.
+
+Results are keyed by device and inode number instead of stat objects, because
+stat objects of the same file differ after its link count changes.
+
+"""
+
+import logging
+import posixpath
+import select
+
+from dantalian import findlib
+from dantalian import fs
+from dantalian import inotify
+
+_LOGGER = logging.getLogger(__name__)
+
+# Watches of the same inode share a mask, so masks are added to, not replaced.
+_WATCH_MASK = inotify.DIR_CHANGES | inotify.IN_ONLYDIR | inotify.IN_MASK_ADD
+_FILE_MASK = inotify.IN_ATTRIB | inotify.IN_MODIFY | inotify.IN_MASK_ADD
+
+
+class _CachedNode(findlib.SearchNode):
+
+    """Leaf node that returns cached results of another node."""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, node):
+        self.node = node
+        self.stat_filtered = findlib.has_stat_filter(node)
+        self.results = {}
+
+    def get_results(self):
+        # Copy, since MinusNode modifies its first child's results.
+        return dict(self.results)
+
+    def evaluate(self):
+        """Evaluate the wrapped node and cache the results."""
+        if self.node.__class__ is findlib.DirNode:
+            self.results = _dir_results(self.node.dirpath)
+        else:
+            self.results = dict(((stat.st_dev, stat.st_ino), path)
+                                for stat, path
+                                in self.node.get_results().items())
+
+
+def _dir_results(dirpath):
+    """Return a dict mapping inode keys to paths in a directory.
+
+    Unlike DirNode, entries that disappear while listing and missing
+    directories are skipped instead of raising errors.  Like DirNode, the
+    smallest name is kept for files with several links.
+    """
+    results = {}
+    try:
+        entries = list(fs.scandir(dirpath))
+    except (FileNotFoundError, NotADirectoryError):
+        return results
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        key = (stat.st_dev, stat.st_ino)
+        path = posixpath.join(dirpath, entry.name)
+        if key not in results or path < results[key]:
+            results[key] = path
+    return results
+
+
+def _mirror(node, leaves):
+    """Copy a query tree, replacing leaves with _CachedNodes.
+
+    Nodes other than AND, OR and MINUS nodes are leaves, including the
+    subtrees under them.
+    """
+    if node.__class__ in (findlib.AndNode, findlib.OrNode, findlib.MinusNode):
+        return node.with_children([_mirror(child, leaves)
+                                   for child in node.children])
+    leaf = _CachedNode(node)
+    leaves.append(leaf)
+    return leaf
+
+
+def _dirpaths(node):
+    """Generate the directory paths a query tree reads."""
+    if isinstance(node, findlib.GroupNode):
+        for child in node.children:
+            yield from _dirpaths(child)
+    elif isinstance(node, findlib.GlobNode):
+        yield from node.source_dirs()
+    elif hasattr(node, 'dirpath'):
+        yield node.dirpath
+
+
+def diff(old, new):
+    """Return the changes between two result dicts.
+
+    Returns:
+        List of ('+', path) and ('-', path) tuples.  A file whose path changed
+        is reported as removed and added.
+    """
+    changes = []
+    for key, path in old.items():
+        if new.get(key) != path:
+            changes.append(('-', path))
+    for key, path in new.items():
+        if old.get(key) != path:
+            changes.append(('+', path))
+    return changes
+
+
+class QueryWatch:
+
+    """Watch the results of a query tree.
+
+    Directories that are deleted and created again are not watched again.
+
+    Attributes:
+        results: Dict mapping inode keys to paths of the current results.
+    """
+
+    def __init__(self, search_node):
+        self._leaves = []
+        self._tree = _mirror(search_node, self._leaves)
+        self._inotify = inotify.Inotify()
+        self._wd_leaves = {}
+        for leaf in self._leaves:
+            leaf.evaluate()
+            self._watch(leaf)
+        self.results = self._tree.get_results()
+
+    def close(self):
+        """Stop watching."""
+        self._inotify.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def fileno(self):
+        """Return a file descriptor that is readable when changes arrive."""
+        return self._inotify.fileno()
+
+    def _watch(self, leaf):
+        for dirpath in _dirpaths(leaf.node):
+            self._add_watch(leaf, dirpath, _WATCH_MASK)
+            if leaf.stat_filtered:
+                for path in _dir_results(dirpath).values():
+                    self._add_watch(leaf, path, _FILE_MASK)
+
+    def _add_watch(self, leaf, path, mask):
+        try:
+            wd = self._inotify.add_watch(path, mask)
+        except OSError as err:
+            _LOGGER.warning('Cannot watch %s: %s', path, err)
+            return
+        leaves = self._wd_leaves.setdefault(wd, [])
+        if leaf not in leaves:
+            leaves.append(leaf)
+
+    def changes(self, timeout=None):
+        """Wait for changes to the results.
+
+        Args:
+            timeout: Seconds to wait, or None to wait until there are
+                changes.
+
+        Returns:
+            List of ('+', path) and ('-', path) tuples, which is empty if the
+            timeout expired.
+        """
+        while True:
+            readable, _, _ = select.select([self], [], [], timeout)
+            if not readable:
+                return []
+            changes = self.process_events()
+            if changes:
+                return changes
+
+    def process_events(self):
+        """Read pending events and return the changes to the results."""
+        stale = []
+        overflow = False
+        for event in self._inotify.read_events():
+            if event.mask & inotify.IN_Q_OVERFLOW:
+                overflow = True
+            for leaf in self._wd_leaves.get(event.wd, ()):
+                if leaf not in stale:
+                    stale.append(leaf)
+        if overflow:
+            _LOGGER.warning('inotify queue overflowed, evaluating all leaves')
+            stale = self._leaves
+        if not stale:
+            return []
+        for leaf in stale:
+            leaf.evaluate()
+            if isinstance(leaf.node, findlib.GlobNode) or leaf.stat_filtered:
+                # Watch new matches and files.
+                self._watch(leaf)
+        results = self._tree.get_results()
+        changes = diff(self.results, results)
+        self.results = results
+        return changes
@@ -0,0 +1,117 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module contains unit tests for dantalian.aio
+"""
+
+import asyncio
+import os
+import posixpath
+import threading
+
+from dantalian import aio
+from dantalian import findlib
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+
+class TestAsyncDantalian(testlib.FSMixin, testlib.SameFileMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.mkdir('bag')
+        os.mkdir('box')
+        os.mknod('apple')
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.dantalian = aio.AsyncDantalian(max_concurrency=2)
+
+    def tearDown(self):
+        self.dantalian.close()
+        asyncio.set_event_loop(None)
+        self.loop.close()
+        super().tearDown()
+
+    def _run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_tag_and_search(self):
+        self._run(asyncio.gather(
+            self.dantalian.tag(self.root, 'apple', 'bag'),
+            self.dantalian.tag(self.root, 'apple', 'box')))
+        self.assertSameFile('apple', 'bag/apple')
+        results = self._run(self.dantalian.search(findlib.AndNode(
+            [findlib.DirNode('bag'), findlib.DirNode('box')])))
+        self.assertEqual(len(results), 1)
+
+    def test_list_links(self):
+        os.link('apple', 'bag/apple')
+
+        async def collect():
+            return [path async for path in
+                    self.dantalian.list_links(self.root, 'apple')]
+        results = self._run(collect())
+        self.assertEqual(sorted(results),
+                         [posixpath.join(self.root, 'apple'),
+                          posixpath.join(self.root, 'bag/apple')])
+
+    def test_iterate_error(self):
+        def fail():
+            yield 1
+            raise ValueError('fail')
+
+        async def collect():
+            return [item async for item in self.dantalian.iterate(fail)]
+        with self.assertRaises(ValueError):
+            self._run(collect())
+
+    def test_iterate_stop_early(self):
+        produced = []
+
+        def count():
+            for i in range(1000):
+                produced.append(i)
+                yield i
+
+        async def first():
+            agen = self.dantalian.iterate(count)
+            async for item in agen:
+                await agen.aclose()
+                return item
+        self.assertEqual(self._run(first()), 0)
+        # The producer is stopped instead of running to completion.
+        self.assertLess(len(produced), 1000)
+
+    def test_concurrency_limit(self):
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def work():
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            threading.Event().wait(0.01)
+            with lock:
+                running[0] -= 1
+
+        self._run(asyncio.gather(*[self.dantalian.run(work)
+                                   for _ in range(8)]))
+        self.assertLessEqual(running[1], 2)
@@ -42,6 +42,22 @@ class TestLink(testlib.FSMixin, testlib.SameFileMixin):
         self.assertSameFile('apple', 'bag/apple')
 
 
+class TestListLinks(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.mkdir('.dantalian')
+        os.mkdir('bag')
+        os.mknod('apple')
+        os.link('apple', 'bag/apple')
+        os.link('apple', '.dantalian/apple')
+
+    def test_skip_library_dir(self):
+        self.assertEqual(sorted(base.list_links(self.root, 'apple')),
+                         [posixpath.join(self.root, 'apple'),
+                          posixpath.join(self.root, 'bag/apple')])
+
+
 class TestLinkDir(testlib.FSMixin, testlib.SameFileMixin):
 
     def setUp(self):
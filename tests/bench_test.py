@@ -0,0 +1,93 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module contains smoke tests for the benchmarks in bench
+"""
+
+import os
+import posixpath
+from unittest import TestCase
+
+from bench import libgen
+from bench import memory
+from bench import timing
+
+from . import testlib
+
+# pylint: disable=missing-docstring,protected-access
+
+
+class TestLibgen(testlib.FSMixin):
+
+    def test_generate(self):
+        params = libgen.Params.from_size('tiny')
+        lib = libgen.generate('lib', params)
+        self.assertEqual(len(lib.files), params.files)
+        self.assertEqual(len(lib.dirs), params.dirs)
+        for tag in lib.file_tags[lib.dirs[0]]:
+            self.assertTrue(any(posixpath.islink(posixpath.join(tag, name))
+                                for name in os.listdir(tag)))
+        links = sum(len(os.listdir(tag)) for tag in lib.tags)
+        self.assertEqual(links,
+                         (params.files + params.dirs) * params.links_per_file)
+
+    def test_seeded(self):
+        params = libgen.Params.from_size('tiny')
+        first = libgen.generate('first', params)
+        second = libgen.generate('second', params)
+        self.assertEqual(
+            [posixpath.relpath(path, 'first') for path in first.files],
+            [posixpath.relpath(path, 'second') for path in second.files])
+
+
+class TestTiming(testlib.FSMixin):
+
+    def test_run(self):
+        params = libgen.Params.from_size('tiny')
+        results = timing.run(params, workdir=self.root)
+        self.assertEqual(list(results['results']), list(timing._BENCHMARKS))
+
+
+class TestCompare(TestCase):
+
+    def test_compare(self):
+        old = {'results': {'a': 1.0, 'b': 1.0}}
+        new = {'results': {'a': 2.0, 'b': 1.0, 'c': 1.0}}
+        self.assertEqual(timing.compare(old, new),
+                         [('a', 1.0, 2.0, 2.0, True),
+                          ('b', 1.0, 1.0, 1.0, False)])
+
+
+class TestMemory(testlib.FSMixin):
+
+    def test_thresholds(self):
+        runs = memory.run([2000], workdir=self.root)
+        self.assertEqual(list(runs[0]['operations']),
+                         list(memory.THRESHOLDS))
+        self.assertEqual(memory.check(runs), [])
+
+    def test_child_dies(self):
+        with self.assertRaisesRegex(RuntimeError, 'exit code 3'):
+            memory._in_child(lambda lib, name, conn: os._exit(3), None,
+                             'export')
+
+    def test_check(self):
+        runs = [{'entries': 10, 'operations': {
+            'export': {'tracemalloc_per_entry': 5000}}}]
+        self.assertEqual(memory.check(runs), [(10, 'export', 5000, 1000)])
@@ -0,0 +1,304 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module contains unit tests for dantalian.main.commands
+"""
+
+import io
+import os
+import posixpath
+from unittest.mock import patch
+
+from dantalian import dtags
+from dantalian.main import argparse
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+
+def _run(*argv):
+    """Parse and run a command line."""
+    args = argparse.make_parser().parse_args(argv)
+    return args.func(args)
+
+
+class TestLoadAll(testlib.FSMixin, testlib.SameFileMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        os.makedirs('bag')
+        os.makedirs('tree/apple/seed')
+        os.makedirs('tree/pear')
+        dtags.set_tags('tree/apple', ['//bag/apple'])
+        dtags.set_tags('tree/apple/seed', ['//bag/seed'])
+        dtags.set_tags('tree/pear', ['//bag/apple'])
+
+    def test_load_all_jobs(self):
+        with self.assertLogs('dantalian.main.commands', 'ERROR') as logs:
+            status = _run('load', '--root', self.root, '--all', '--jobs', '4',
+                          'tree')
+        self.assertEqual(status, 1)
+        self.assertSameFile('bag/seed', 'tree/apple/seed')
+        self.assertTrue(posixpath.islink('bag/apple'))
+        # apple and pear both want //bag/apple; exactly one must fail.
+        self.assertEqual(len(logs.output), 1)
+
+    def test_unload_all_jobs(self):
+        _run('load', '--root', self.root, '--all', '--jobs', '4',
+             'tree/apple')
+        self.assertIsNone(_run('unload', '--root', self.root, '--all',
+                               '--jobs', '4', 'tree/apple'))
+        self.assertFalse(posixpath.lexists('bag/seed'))
+
+    def test_jobs_positive(self):
+        for jobs in ('0', '-1', 'x'):
+            with patch('sys.stderr', io.StringIO()), \
+                 self.assertRaises(SystemExit):
+                _run('load', '--root', self.root, '--all', '--jobs', jobs,
+                     'tree')
+
+
+class TestBatch(testlib.FSMixin, testlib.SameFileMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        os.makedirs('bag')
+        os.mknod('apple')
+
+    def _batch(self, data, *argv):
+        stdin = io.StringIO(data)
+        stderr = io.StringIO()
+        with patch('sys.stdin', stdin), patch('sys.stderr', stderr):
+            _run('batch', '--root', self.root, *argv)
+        return stderr.getvalue().splitlines()
+
+    def test_batch(self):
+        status = self._batch('tag -f apple -- //bag\n'
+                             '\n'
+                             'link missing //bag/missing\n')
+        self.assertSameFile('apple', 'bag/apple')
+        self.assertEqual(status[0], '1\tok')
+        self.assertTrue(status[1].startswith('3\terror\t'))
+
+    def test_batch_null(self):
+        status = self._batch("link apple 'bag/new\nname'\0", '-0')
+        self.assertSameFile('apple', 'bag/new\nname')
+        self.assertEqual(status, ['1\tok'])
+
+    def test_batch_logged_error(self):
+        status = self._batch('tag -f missing -- //bag\n')
+        self.assertTrue(status[0].startswith('1\terror\t'))
+
+
+class TestNull(testlib.FSMixin, testlib.SameFileMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        os.makedirs('bag')
+        os.mknod('apple')
+        os.mknod('new\nline')
+
+    def _run_io(self, data, *argv):
+        stdin = io.StringIO(data)
+        stdout = io.StringIO()
+        with patch('sys.stdin', stdin), patch('sys.stdout', stdout):
+            _run(*argv)
+        return stdout.getvalue()
+
+    def test_tag_stdin(self):
+        self._run_io('apple\0new\nline\0', 'tag', '--root', self.root,
+                     '--stdin', '-0', '--', '//bag')
+        self.assertSameFile('apple', 'bag/apple')
+        self.assertSameFile('new\nline', 'bag/new\nline')
+        self._run_io('apple\n', 'untag', '--root', self.root,
+                     '--stdin', '--', '//bag')
+        self.assertFalse(posixpath.exists('bag/apple'))
+
+    def test_search_null(self):
+        os.link('new\nline', 'bag/new\nline')
+        output = self._run_io('', 'search', '--root', self.root, '-0',
+                              '//bag')
+        self.assertEqual(output, posixpath.join(self.root, 'bag/new\nline\0'))
+
+    def test_list_null(self):
+        os.link('apple', 'bag/apple')
+        output = self._run_io('', 'list', '--root', self.root, '-0', 'apple')
+        self.assertEqual(sorted(output.split('\0')),
+                         ['', posixpath.join(self.root, 'apple'),
+                          posixpath.join(self.root, 'bag/apple')])
+
+    def test_export_null(self):
+        os.link('apple', 'bag/apple')
+        output = self._run_io('', 'export', '--root', self.root, '-0',
+                              '--full', 'bag')
+        self.assertEqual(output, '{}\0//bag/apple\0\0'.format(
+            posixpath.join(self.root, 'bag/apple')))
+
+
+class TestSearchModes(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        os.makedirs('a')
+        os.makedirs('b')
+        os.mknod('a/x')
+        os.mknod('a/y')
+        os.link('a/x', 'b/x')
+
+    def _search(self, *argv, status=None):
+        stdout = io.StringIO()
+        with patch('sys.stdout', stdout):
+            self.assertEqual(_run('search', '--root', self.root, *argv),
+                             status)
+        return stdout.getvalue()
+
+    def test_rank(self):
+        self.assertEqual(self._search('--rank', '--top', '1', 'a', 'b'),
+                         '2\ta/x\n')
+        self.assertEqual(
+            self._search('--rank', '--weights', '1,-1', 'a', 'b'),
+            '1\ta/y\n0\ta/x\n')
+
+    def test_rank_options(self):
+        for option in ('--top', '--weights'):
+            with patch('sys.stderr', io.StringIO()) as stderr:
+                self.assertEqual(self._search(option, '1', 'a', status=2),
+                                 '')
+            self.assertIn('--rank', stderr.getvalue())
+
+    def test_rank_invalid(self):
+        for argv in (['--weights', '1,x'], ['--weights', '1'],
+                     ['--weights', '1,2,3']):
+            with patch('sys.stderr', io.StringIO()) as stderr:
+                self.assertEqual(
+                    self._search('--rank', *argv + ['a', 'b'], status=2), '')
+            self.assertTrue(stderr.getvalue().startswith('search: '))
+        for top in ('0', '-1'):
+            with patch('sys.stderr', io.StringIO()), \
+                 self.assertRaises(SystemExit):
+                self._search('--rank', '--top', top, 'a', 'b')
+
+    def test_count(self):
+        self.assertEqual(self._search('--count', 'OR', 'a', 'b', 'END'),
+                         '2\n')
+
+    def test_estimate(self):
+        self.assertEqual(self._search('--estimate', 'MINUS', 'a', 'b', 'END'),
+                         '1\t0\n')
+
+    def test_libraries(self):
+        os.makedirs('lib2/.dantalian')
+        os.makedirs('lib2/a')
+        os.mknod('lib2/a/z')
+        output = self._search('-L', self.root, '-L', 'lib2', '//a')
+        self.assertEqual(
+            sorted(output.splitlines()),
+            sorted(['lib2\tlib2/a/z',
+                    '{0}\t{0}/a/x'.format(self.root),
+                    '{0}\t{0}/a/y'.format(self.root)]))
+
+    def test_libraries_error(self):
+        with self.assertLogs('dantalian.findlib', 'ERROR'):
+            output = self._search('-L', self.root, '-L', 'missing', '//a',
+                                  status=1)
+        self.assertEqual(
+            sorted(output.splitlines()),
+            ['{0}\t{0}/a/x'.format(self.root),
+             '{0}\t{0}/a/y'.format(self.root)])
+
+    def test_libraries_mode(self):
+        for mode in ('--watch', '--rank', '--count', '--estimate'):
+            with patch('sys.stderr', io.StringIO()), \
+                 self.assertRaises(SystemExit):
+                self._search('-L', self.root, mode, '//a')
+
+
+class TestSavedQueries(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        os.makedirs('a')
+        os.makedirs('b')
+        os.mknod('a/x')
+        with patch('sys.stdout', io.StringIO()):
+            _run('save-query', '--root', self.root, 'smart', '//a')
+
+    def test_missing(self):
+        for argv in (['drop-query', '--root', self.root, '//zzz'],
+                     ['refresh', '--root', self.root, '//b']):
+            with patch('sys.stderr', io.StringIO()) as stderr:
+                self.assertEqual(_run(*argv), 1)
+            self.assertEqual(stderr.getvalue(),
+                             'no saved query for {}\n'.format(
+                                 posixpath.join(self.root, argv[-1][2:])))
+
+    def test_refresh_missing(self):
+        os.mknod('a/y')
+        stdout = io.StringIO()
+        with patch('sys.stdout', stdout), patch('sys.stderr', io.StringIO()):
+            self.assertEqual(
+                _run('refresh', '--root', self.root, '//b', '//smart'), 1)
+        # Other directories are still refreshed.
+        self.assertEqual(stdout.getvalue(),
+                         '+{}\n'.format(posixpath.join(self.root, 'smart/y')))
+
+
+class TestReports(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        os.makedirs('a')
+        os.makedirs('b')
+        os.mknod('a/x')
+        os.mknod('a/y')
+        os.link('a/x', 'b/x')
+
+    def _report(self, *argv):
+        stdout = io.StringIO()
+        with patch('sys.stdout', stdout):
+            _run(*argv, '--root', self.root)
+        return stdout.getvalue()
+
+    def test_stats(self):
+        output = self._report('stats', '--top', '2')
+        self.assertIn('files: 2\n', output)
+        self.assertIn('  2 //a (2 entries)\n', output)
+        self.assertNotIn('//b', output)
+
+    def test_cooccur(self):
+        output = self._report('cooccur')
+        self.assertIn('//a,//b,1\n', output)
+
+    def test_similar(self):
+        os.mknod('b/z')
+        output = self._report('similar', '--top', '1', 'a/y')
+        self.assertRegex(output, r'^0\.500\t.*/x\n$')
+
+    def test_similar_top(self):
+        for top in ('0', '-1'):
+            with patch('sys.stderr', io.StringIO()), \
+                 self.assertRaises(SystemExit):
+                self._report('similar', '--top', top, 'a/y')
@@ -0,0 +1,212 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains unit tests for dantalian.daemon
+"""
+
+import io
+import os
+import threading
+from unittest.mock import patch
+
+from dantalian import bulk
+from dantalian import daemon
+from dantalian import findlib
+from dantalian import inotify
+from dantalian.main import argparse
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+
+def _run(*argv):
+    """Parse and run a command line, returning its output."""
+    args = argparse.make_parser().parse_args(argv)
+    with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+        args.func(args)
+    return stdout.getvalue()
+
+
+class _LibraryMixin(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        os.makedirs('a')
+        os.makedirs('b')
+        os.mknod('a/x')
+        os.mknod('a/y')
+        os.link('a/x', 'b/x')
+
+
+class TestLibraryModel(_LibraryMixin):
+
+    def setUp(self):
+        super().setUp()
+        self.watcher = inotify.Inotify()
+        self.model = daemon.LibraryModel(self.root, self.watcher)
+
+    def tearDown(self):
+        self.watcher.close()
+        super().tearDown()
+
+    def test_search(self):
+        self.assertEqual(self.model.search(self.root, 'AND a b END',
+                                           self.root),
+                         ['a/x'])
+
+    def test_list_links(self):
+        self.assertEqual(
+            self.model.list_links(self.root, 'a/x', self.root),
+            [os.path.join(self.root, 'a/x'), os.path.join(self.root, 'b/x')])
+
+    def test_export_tags(self):
+        self.assertEqual(
+            self.model.export_tags(self.root, '.', cwd=self.root),
+            {os.path.join(self.root, 'a/x'): ['//a/x', '//b/x'],
+             os.path.join(self.root, 'a/y'): ['//a/y'],
+             os.path.join(self.root, 'a'): ['//a'],
+             os.path.join(self.root, 'b'): ['//b']})
+
+    def test_export_matches_bulk(self):
+        os.mknod('.dantalian/index.db')
+        os.link('a/y', '.dantalian/y')
+        # bulk doesn't order tags, so compare them as sets.
+        def tag_sets(path_tag_map):
+            return dict((path, set(tags))
+                        for path, tags in path_tag_map.items())
+        self.assertEqual(
+            tag_sets(self.model.export_tags(self.root, self.root, True)),
+            tag_sets(bulk.export_tags(self.root, self.root, True)))
+
+    def test_updates(self):
+        os.link('a/y', 'b/y')
+        os.makedirs('c/d')
+        os.mknod('c/d/z')
+        os.unlink('b/x')
+        self.model.process_events()
+        self.assertEqual(sorted(self.model.search(self.root, 'b', self.root)),
+                         ['b/y'])
+        self.assertEqual(self.model.search(self.root, 'c/d', self.root),
+                         ['c/d/z'])
+
+    def test_move_dir(self):
+        os.makedirs('c/d')
+        self.model.process_events()
+        os.rename('c', 'e')
+        os.mknod('e/d/z')
+        self.model.process_events()
+        self.assertNotIn(os.path.join(self.root, 'c/d'), self.model.dirs)
+        self.assertEqual(self.model.search(self.root, 'e/d', self.root),
+                         ['e/d/z'])
+
+    def test_unwatched(self):
+        unwatched = os.path.join(self.root, 'b')
+        real_add_watch = self.watcher.add_watch
+
+        def add_watch(path, mask):
+            if path == unwatched:
+                raise OSError(28, 'No space left on device')
+            return real_add_watch(path, mask)
+
+        with patch.object(self.watcher, 'add_watch', add_watch), \
+             self.assertLogs('dantalian.daemon', 'WARNING'):
+            model = daemon.LibraryModel(self.root, self.watcher)
+        self.assertNotIn(unwatched, model.dirs)
+        self.assertEqual(model.unwatched, {unwatched})
+        # The directory is read from disk, so changes are seen.
+        os.mknod('b/z')
+        model.process_events()
+        self.assertEqual(sorted(model.search(self.root, 'b', self.root)),
+                         ['b/x', 'b/z'])
+        with self.assertRaises(daemon.Unsupported):
+            model.list_links(self.root, 'a/x', self.root)
+        with self.assertRaises(daemon.Unsupported):
+            model.export_tags(self.root, '.', cwd=self.root)
+
+    def test_rebuild(self):
+        self.model.rebuild()
+        self.assertEqual(sorted(self.model.search(self.root, 'a', self.root)),
+                         ['a/x', 'a/y'])
+
+
+class TestServer(_LibraryMixin):
+
+    def setUp(self):
+        super().setUp()
+        self.server = daemon.Server(self.root)
+        self.thread = threading.Thread(target=self.server.serve,
+                                       kwargs={'poll_interval': 0.05})
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.stop()
+        self.thread.join()
+        self.server.close()
+        super().tearDown()
+
+    def test_ping(self):
+        self.assertEqual(daemon.query(self.root, {'op': 'ping'}), 'pong')
+
+    def test_error(self):
+        with self.assertRaises(RuntimeError):
+            daemon.query(self.root, {'op': 'foo'})
+
+    def test_unsupported(self):
+        self.assertIsNone(daemon.query(
+            self.root, {'op': 'search', 'rootpath': self.root,
+                        'cwd': self.root, 'query': 'LINKS 2 a END'}))
+        self.assertEqual(_run('search', '--root', self.root, 'LINKS', '2',
+                              'a', 'END'),
+                         'a/x\n')
+
+    def test_commands(self):
+        # The daemon answers the search, so the filesystem is not scanned.
+        with patch.object(findlib.DirNode, 'get_results') as get_results:
+            output = _run('search', '--root', self.root, 'AND', 'a', 'b',
+                          'END')
+        get_results.assert_not_called()
+        self.assertEqual(output, 'a/x\n')
+        output = _run('list', '--root', self.root, 'a/x')
+        self.assertEqual(output.splitlines(),
+                         [os.path.join(self.root, 'a/x'),
+                          os.path.join(self.root, 'b/x')])
+        os.mknod('b/z')
+        output = _run('search', '--root', self.root, 'b')
+        self.assertEqual(sorted(output.splitlines()), ['b/x', 'b/z'])
+
+    def test_timeout(self):
+        # A daemon that accepts connections but never responds.
+        self.server.stop()
+        self.thread.join()
+        with patch.object(daemon, '_TIMEOUT', 0.1), \
+             self.assertLogs('dantalian.daemon', 'WARNING'):
+            self.assertIsNone(daemon.query(self.root, {'op': 'ping'}))
+            self.assertEqual(_run('search', '--root', self.root, 'AND', 'a',
+                                  'b', 'END'),
+                             'a/x\n')
+
+    def test_no_daemon(self):
+        self.server.stop()
+        self.thread.join()
+        self.server.close()
+        self.assertIsNone(daemon.query(self.root, {'op': 'ping'}))
+        self.assertEqual(_run('search', '--root', self.root, 'AND', 'a', 'b',
+                              'END'),
+                         'a/x\n')
@@ -0,0 +1,102 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains unit tests for dantalian.dedupe
+"""
+
+import os
+
+from dantalian import dedupe
+from dantalian import dtags
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+
+def _write(path, data):
+    with open(path, 'wb') as file:
+        file.write(data)
+
+
+class TestDedupe(testlib.FSMixin, testlib.SameFileMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        for tag in 'abc':
+            os.makedirs(tag)
+        big = os.urandom(dedupe._BLOCK_SIZE * 2)
+        _write('a/big', big)
+        os.link('a/big', 'b/big')
+        _write('c/big2', big)
+        # Same size and first block, different end.
+        _write('c/big3', big[:-1] + bytes([big[-1] ^ 1]))
+        _write('a/small', b'foo')
+        _write('b/small2', b'foo')
+        _write('c/other', b'bar')
+        os.mknod('a/empty')
+        os.mknod('b/empty')
+        _write('.dantalian/small', b'foo')
+
+    def test_find_duplicates(self):
+        duplicates = dedupe.find_duplicates(self.root, jobs=2)
+        self.assertEqual([dup[:3] for dup in duplicates], [
+            (dedupe._BLOCK_SIZE * 2,
+             [os.path.join(self.root, 'a/big'),
+              os.path.join(self.root, 'b/big')],
+             [[os.path.join(self.root, 'c/big2')]]),
+            (3, [os.path.join(self.root, 'a/small')],
+             [[os.path.join(self.root, 'b/small2')]]),
+        ])
+        self.assertEqual(dedupe.reclaimable(duplicates),
+                         dedupe._BLOCK_SIZE * 2 + 3)
+
+    def test_reclaimable_outside(self):
+        os.link('c/big2', '.dantalian/big2')
+        duplicates = dedupe.find_duplicates(self.root, jobs=1)
+        self.assertEqual(dedupe.reclaimable(duplicates), 3)
+
+    def test_merge(self):
+        os.link('c/big2', 'b/big2')
+        os.link('b/small2', 'c/small2')
+        duplicates = dedupe.find_duplicates(self.root, jobs=1)
+        dedupe.merge(self.root, duplicates)
+        self.assertSameFile('a/big', 'c/big2')
+        self.assertFalse(os.path.exists('b/big2'))
+        self.assertSameFile('a/small', 'b/small2')
+        self.assertSameFile('a/small', 'c/small2')
+        self.assertNotSameFile('a/big', 'c/big3')
+        self.assertNotSameFile('a/empty', 'b/empty')
+        self.assertEqual(sorted(os.listdir('c')),
+                         ['big2', 'big3', 'other', 'small2'])
+        self.assertEqual(dedupe.find_duplicates(self.root, jobs=1), [])
+
+    def test_skip_dtags(self):
+        dtags.add_tag('a', '//b')
+        dtags.add_tag('c', '//b')
+        duplicates = dedupe.find_duplicates(self.root, jobs=1)
+        dedupe.merge(self.root, duplicates)
+        self.assertNotSameFile('a/.dtags', 'c/.dtags')
+
+    def test_merge_changed(self):
+        duplicates = dedupe.find_duplicates(self.root, jobs=1)
+        _write('b/small2', b'bazz')
+        dedupe.merge(self.root, duplicates)
+        self.assertNotSameFile('a/small', 'b/small2')
+        self.assertSameFile('a/big', 'c/big2')
@@ -0,0 +1,100 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains unit tests for dantalian.estimate
+"""
+
+import os
+import random
+
+from dantalian import estimate
+from dantalian import findlib
+from dantalian import fs
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+
+class TestEstimate(testlib.FSMixin, testlib.LockedSaveMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        os.makedirs('files')
+        for tag in 'abc':
+            os.makedirs(tag)
+        rand = random.Random(0)
+        for i in range(1000):
+            path = 'files/{}'.format(i)
+            os.mknod(path)
+            for tag in 'abc':
+                if rand.random() < 0.5:
+                    os.link(path, '{}/{}'.format(tag, i))
+
+    def _check(self, query, k=estimate.K):
+        tree = findlib.parse_query(self.root, query)
+        exact = findlib.count(tree)
+        result = estimate.estimate(tree, estimate.SketchCache(k=k))
+        return exact, result
+
+    def test_count(self):
+        tree = findlib.parse_query(self.root, 'AND a b END')
+        self.assertEqual(findlib.count(tree), len(findlib.search(tree)))
+
+    def test_leaf_exact(self):
+        exact, result = self._check('a')
+        self.assertEqual(result, (exact, 0))
+
+    def test_complete_exact(self):
+        exact, result = self._check('MINUS a b c END')
+        self.assertEqual(result, (exact, 0))
+
+    def test_estimate(self):
+        for query in ('AND a b END', 'OR a b c END', 'MINUS a b c END',
+                      'AND a OR b c END END'):
+            exact, result = self._check(query, k=128)
+            self.assertGreater(result.error, 0)
+            # Allow for the 5% chance of being outside the interval.
+            self.assertLess(abs(result.value - exact), 2 * result.error,
+                            query)
+
+    def test_cache(self):
+        tree = findlib.parse_query(self.root, 'AND a b END')
+        cache = estimate.SketchCache(self.root, k=128)
+        first = estimate.estimate(tree, cache)
+        cache.save()
+        with fs.collect_stats() as stats:
+            second = estimate.estimate(
+                tree, estimate.SketchCache(self.root, k=128))
+        self.assertEqual(first, second)
+        self.assertNotIn('scandir', stats.counts)
+
+    def test_save_locked(self):
+        cache = estimate.SketchCache(self.root)
+        estimate.estimate(findlib.parse_query(self.root, 'a'), cache)
+        cache.save()
+        cache = estimate.SketchCache(self.root)
+        estimate.estimate(findlib.parse_query(self.root, 'b'), cache)
+        self.assertSaveWaitsForReaders('.dantalian/sketches.json', cache.save)
+
+    def test_sketch_json(self):
+        sketch = estimate.Sketch.from_keys([(1, i) for i in range(10)], 4)
+        copy = estimate.Sketch.from_json(sketch.to_json())
+        self.assertEqual((copy.count, copy.hashes),
+                         (sketch.count, sketch.hashes))
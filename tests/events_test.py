@@ -0,0 +1,102 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module contains unit tests for dantalian.events
+"""
+
+import os
+import timeit
+from unittest import TestCase
+
+from dantalian import base
+from dantalian import events
+from dantalian import findlib
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+
+class TestEvents(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.mkdir('bag')
+        os.mkdir('apple')
+        os.mknod('pear')
+        self.events = []
+
+    def test_link(self):
+        with events.subscribed(self.events.append):
+            base.link(self.root, 'pear', 'bag/pear')
+        self.assertEqual([(event.name, event.when) for event in self.events],
+                         [('base.link', 'before'), ('base.link', 'after')])
+        after = self.events[1]
+        self.assertEqual(after.args, (self.root, 'pear', 'bag/pear'))
+        self.assertGreaterEqual(after.duration, 0)
+        self.assertIsNone(after.error)
+
+    def test_link_dir(self):
+        with events.subscribed(self.events.append):
+            base.link(self.root, 'apple', 'bag/apple')
+        self.assertEqual([event.name for event in self.events],
+                         ['base.link', 'dtags.add_tag',
+                          'dtags.add_tag', 'base.link'])
+
+    def test_error(self):
+        with events.subscribed(self.events.append):
+            with self.assertRaises(FileNotFoundError):
+                base.unlink(self.root, 'missing')
+        self.assertIsInstance(self.events[1].error, FileNotFoundError)
+
+    def test_search(self):
+        node = findlib.AndNode([findlib.DirNode('bag'),
+                                findlib.DirNode('apple')])
+        with events.subscribed(self.events.append):
+            findlib.search(node)
+        after = [event for event in self.events if event.when == 'after']
+        self.assertEqual(len(after), 4)
+        self.assertIs(after[-1].args[0], node)
+
+    def test_unsubscribed(self):
+        with events.subscribed(self.events.append):
+            pass
+        base.link(self.root, 'pear', 'bag/pear')
+        self.assertEqual(self.events, [])
+
+
+def _noop():
+    pass
+
+
+class TestOverhead(TestCase):
+
+    """Benchmark the cost of traced functions without subscribers."""
+
+    # Generous bound to avoid flakiness; a wrapper that does any real work
+    # when there are no subscribers would be much slower.
+    MAX_OVERHEAD = 1e-6
+    NUMBER = 100000
+
+    def test_overhead(self):
+        traced = events.traced('noop')(_noop)
+        plain = min(timeit.repeat(_noop, number=self.NUMBER, repeat=5))
+        wrapped = min(timeit.repeat(traced, number=self.NUMBER, repeat=5))
+        overhead = (wrapped - plain) / self.NUMBER
+        self.assertLess(overhead, self.MAX_OVERHEAD)
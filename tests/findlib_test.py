@@ -24,6 +24,7 @@ import posixpath
 from unittest import TestCase
 
 from dantalian import findlib
+from dantalian import fs
 
 from . import testlib
 
@@ -105,6 +106,22 @@ class TestLibraryParsing(QueryMixin):
              findlib.DirNode(posixpath.join(self.root, 'D/E')),
             ]))
 
+    def test_parse_stat_filter(self):
+        tree = findlib.parse_query(self.root, "LINKS >=2 OR A B END END")
+        self.assertSameQuery(tree, findlib.LinksNode('>=2', [
+            findlib.OrNode([findlib.DirNode("A"), findlib.DirNode("B")])]))
+
+    def test_parse_stat_filter_escape(self):
+        tree = findlib.parse_query(self.root, r"AND \\SIZE A END")
+        self.assertSameQuery(tree, findlib.AndNode(
+            [findlib.DirNode("SIZE"), findlib.DirNode("A")]))
+
+    def test_parse_stat_filter_invalid(self):
+        with self.assertRaises(findlib.ParseError):
+            findlib.parse_query(self.root, "SIZE >1X A END")
+        with self.assertRaises(findlib.ParseError):
+            findlib.parse_query(self.root, "TYPE")
+
 
 class TestSearch(testlib.FSMixin):
 
@@ -168,3 +185,174 @@ class TestSearch(testlib.FSMixin):
             sorted(results),
             sorted(['A/a', 'A/b', 'A/c']),
         )
+
+
+class TestNameFilters(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('music/rock/live')
+        os.makedirs('music/jazz/live')
+        os.makedirs('music/jazz/studio')
+        os.makedirs('music/.hidden/live')
+        os.mknod('music/rock/live/a.flac')
+        os.mknod('music/rock/live/b.mp3')
+        os.mknod('music/jazz/live/c.flac')
+        os.mknod('music/jazz/studio/d.flac')
+        os.mknod('music/.hidden/live/e.flac')
+
+    def _search(self, query):
+        return sorted(findlib.search(findlib.parse_query(self.root, query)))
+
+    def test_parse_glob(self):
+        tree = findlib.parse_query(self.root, '//music/*/live')
+        self.assertEqual(tree, findlib.GlobNode(
+            posixpath.join(self.root, 'music/*/live')))
+
+    def test_glob(self):
+        root = self.root
+        self.assertEqual(self._search('//music/*/live'),
+                         [posixpath.join(root, 'music/jazz/live/c.flac'),
+                          posixpath.join(root, 'music/rock/live/a.flac'),
+                          posixpath.join(root, 'music/rock/live/b.mp3')])
+
+    def test_literal_brackets(self):
+        os.makedirs('best[2015]')
+        os.makedirs('best2')
+        os.mknod('best[2015]/song')
+        os.mknod('best2/other')
+        tree = findlib.parse_query(self.root, '//best[2015]')
+        self.assertEqual(tree, findlib.DirNode(
+            posixpath.join(self.root, 'best[2015]')))
+        self.assertEqual(self._search('//best[2015]'),
+                         [posixpath.join(self.root, 'best[2015]/song')])
+        # Escaped with a bracket expression, it's a glob.
+        self.assertEqual(self._search('//best[[]2015]'),
+                         [posixpath.join(self.root, 'best[2015]/song')])
+
+    def test_glob_cache(self):
+        tree = findlib.parse_query(self.root,
+                                   'OR //music/*/live //music/*/studio END')
+        with fs.collect_stats() as stats:
+            findlib.search(tree)
+        # music is scanned once, then each of rock and jazz.
+        self.assertEqual(stats.counts['scandir'], 3)
+
+    def test_name(self):
+        self.assertEqual(self._search('NAME *.flac music/rock/live END'),
+                         ['music/rock/live/a.flac'])
+
+    def test_name_skips_stat(self):
+        tree = findlib.parse_query(self.root,
+                                   'NAME *.mp3 music/rock/live END')
+        with fs.collect_stats() as stats:
+            findlib.search(tree)
+        self.assertEqual(stats.counts['stat'], 1)
+
+    def test_regex(self):
+        self.assertEqual(
+            self._search('REGEX ^[ab] music/rock/live music/jazz/live END'),
+            ['music/rock/live/a.flac', 'music/rock/live/b.mp3'])
+
+    def test_regex_invalid(self):
+        with self.assertRaises(findlib.ParseError):
+            findlib.parse_query(self.root, 'REGEX [ music END')
+
+    def test_name_glob(self):
+        self.assertEqual(
+            len(self._search('NAME *.flac //music/*/* END')), 3)
+
+
+class TestStatFilters(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('A/dir')
+        os.makedirs('B')
+        with open('A/big', 'wb') as file:
+            file.write(b'x' * 2048)
+        os.mknod('A/small')
+        os.link('A/big', 'B/big')
+        os.utime('A/small', (0, 0))
+
+    def _search(self, query):
+        return sorted(findlib.search(findlib.parse_query(self.root, query)))
+
+    def test_links(self):
+        self.assertEqual(self._search('LINKS 1 A END'), ['A/small'])
+        self.assertEqual(self._search('LINKS >1 A B END'), ['A/big', 'A/dir'])
+
+    def test_size(self):
+        self.assertEqual(self._search('SIZE >=2k A END'), ['A/big', 'A/dir'])
+        self.assertEqual(self._search('SIZE 0 A END'), ['A/small'])
+
+    def test_mtime(self):
+        self.assertEqual(self._search('MTIME <1980-01-01 A END'), ['A/small'])
+        self.assertEqual(self._search('MTIME >1d A END'), ['A/big', 'A/dir'])
+
+    def test_type(self):
+        self.assertEqual(self._search('TYPE d A END'), ['A/dir'])
+        self.assertEqual(self._search('TYPE !=d A END'), ['A/big', 'A/small'])
+
+    def test_no_stat_calls(self):
+        tree = findlib.parse_query(self.root, 'LINKS 1 SIZE 0 A END END')
+        with fs.collect_stats() as stats:
+            findlib.search(tree)
+        self.assertEqual(stats.counts['stat'], 3)
+
+
+class TestRank(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        for dirpath in ('A', 'B', 'C'):
+            os.makedirs(dirpath)
+        os.mknod('A/a')
+        os.mknod('A/b')
+        os.mknod('A/c')
+        os.link('A/b', 'B/b')
+        os.link('A/c', 'B/c')
+        os.link('A/c', 'C/c')
+        self.nodes = [findlib.DirNode('A'), findlib.DirNode('B'),
+                      findlib.DirNode('C')]
+
+    def test_rank(self):
+        self.assertEqual(findlib.rank(self.nodes),
+                         [(3, 'A/c'), (2, 'A/b'), (1, 'A/a')])
+
+    def test_top(self):
+        self.assertEqual(findlib.rank(self.nodes, top=2),
+                         [(3, 'A/c'), (2, 'A/b')])
+
+    def test_weights(self):
+        self.assertEqual(findlib.rank(self.nodes, [5, 0.5, 0.5], top=2),
+                         [(6, 'A/c'), (5.5, 'A/b')])
+
+    def test_scans_once(self):
+        with fs.collect_stats() as stats:
+            findlib.rank(self.nodes)
+        self.assertEqual(stats.counts['listdir'], 3)
+
+
+class TestSearchLibraries(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        for lib in ('lib1', 'lib2'):
+            os.makedirs(posixpath.join(lib, '.dantalian'))
+            os.makedirs(posixpath.join(lib, 'tag'))
+            os.mknod(posixpath.join(lib, 'tag', 'file'))
+
+    def test_search_libraries(self):
+        results = findlib.search_libraries(['lib1', 'lib2'], '//tag')
+        self.assertEqual(sorted(results),
+                         [('lib1', 'lib1/tag/file'),
+                          ('lib2', 'lib2/tag/file')])
+
+    def test_errors(self):
+        errors = []
+        with self.assertLogs('dantalian.findlib', 'ERROR'):
+            results = list(findlib.search_libraries(
+                ['lib1', 'missing'], '//tag', jobs=1, errors=errors))
+        self.assertEqual(results, [('lib1', 'lib1/tag/file')])
+        self.assertEqual(errors, ['missing'])
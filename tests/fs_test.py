@@ -0,0 +1,67 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module contains unit tests for dantalian.fs
+"""
+
+import json
+import os
+
+from dantalian import dtags
+from dantalian import fs
+from dantalian import tagging
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+
+class TestStats(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.mkdir('bag')
+        os.mkdir('apple')
+        os.mknod('pear')
+
+    def test_counts(self):
+        with fs.collect_stats() as stats:
+            tagging.tag(self.root, 'pear', 'bag')
+            tagging.tag(self.root, 'apple', 'bag')
+        self.assertEqual(stats.counts['link'], 1)
+        self.assertEqual(stats.counts['symlink'], 1)
+        self.assertEqual(stats.counts['dtags_read'], 1)
+        self.assertEqual(stats.counts['dtags_write'], 1)
+        self.assertEqual(stats.counts['listdir'], 2)
+
+    def test_not_collecting(self):
+        with fs.collect_stats() as stats:
+            pass
+        dtags.add_tag('apple', '//bag/apple')
+        self.assertEqual(stats.counts, {})
+
+    def test_phase(self):
+        with fs.collect_stats() as stats:
+            with fs.phase('walk'):
+                list(fs.walk('.'))
+        self.assertIn('walk', stats.phases)
+        self.assertEqual(stats.counts['scandir'], 3)
+        self.assertEqual(stats.counts['scandir_entries'], 3)
+        data = json.loads(stats.format(use_json=True))
+        self.assertEqual(data['counts']['scandir'], 3)
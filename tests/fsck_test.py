@@ -0,0 +1,140 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains unit tests for dantalian.fsck
+"""
+
+import io
+import os
+from unittest.mock import patch
+
+from dantalian import base
+from dantalian import dtags
+from dantalian import fsck
+from dantalian.main import argparse
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+
+class TestFsck(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        os.makedirs('a')
+        os.makedirs('b')
+        os.makedirs('dir')
+        base.link(self.root, 'dir', 'a/dir')
+        # Consistent.
+        self.assertEqual(fsck.check(self.root, jobs=2), [])
+
+    def _path(self, path):
+        return os.path.join(self.root, path)
+
+    def _check(self):
+        return fsck.check(self.root, jobs=2)
+
+    def test_broken(self):
+        os.symlink(self._path('nothing'), 'a/broken')
+        self.assertEqual(self._check(), [
+            fsck.Problem(fsck.BROKEN, self._path('a/broken'), None)])
+
+    def test_unresolvable(self):
+        os.symlink('loop2', 'b/loop1')
+        os.symlink('loop1', 'b/loop2')
+        self.assertEqual(self._check(), [
+            fsck.Problem(fsck.UNRESOLVABLE, self._path('b/loop1'), None),
+            fsck.Problem(fsck.UNRESOLVABLE, self._path('b/loop2'), None),
+        ])
+
+    def test_relative(self):
+        os.mknod('dir/song')
+        os.symlink('../dir', 'b/dir')
+        os.symlink('../dir/song', 'b/song')
+        dtags.add_tag('dir', '//b/dir')
+        self.assertEqual(self._check(), [
+            fsck.Problem(fsck.RELATIVE, self._path('b/dir'),
+                         self._path('dir')),
+            fsck.Problem(fsck.RELATIVE, self._path('b/song'),
+                         self._path('dir/song')),
+        ])
+
+    def test_repair_relative(self):
+        os.mknod('dir/song')
+        os.symlink('../dir', 'b/dir')
+        os.symlink('../dir/song', 'b/song')
+        fsck.repair(self.root, self._check())
+        self.assertEqual(self._check(), [])
+        self.assertEqual(os.readlink('b/dir'), self._path('dir'))
+        self.assertEqual(os.readlink('b/song'), self._path('dir/song'))
+        self.assertIn('//b/dir', dtags.list_tags('dir'))
+
+    def test_plan_relative(self):
+        os.mknod('dir/song')
+        os.symlink('../dir/song', 'b/song')
+        self._batch(fsck.plan(self._check()))
+        self.assertEqual(self._check(), [])
+        self.assertEqual(os.readlink('b/song'), self._path('dir/song'))
+
+    def test_dtags(self):
+        os.symlink(self._path('dir'), 'b/dir')
+        dtags.add_tag('dir', '//b/gone')
+        self.assertEqual(self._check(), [
+            fsck.Problem(fsck.MISSING_DTAG, self._path('b/dir'),
+                         self._path('dir')),
+            fsck.Problem(fsck.STALE_DTAG, self._path('dir'), '//b/gone'),
+        ])
+
+    def test_repair(self):
+        os.symlink(self._path('nothing'), 'a/broken')
+        os.symlink(self._path('dir'), 'b/dir')
+        dtags.add_tag('dir', '//b/gone')
+        fsck.repair(self.root, self._check())
+        self.assertEqual(self._check(), [])
+        self.assertEqual(sorted(dtags.list_tags('dir')), ['//a/dir', '//b/dir'])
+        self.assertFalse(os.path.lexists('a/broken'))
+
+    def test_plan(self):
+        os.symlink(self._path('nothing'), 'a/broken')
+        os.symlink(self._path('dir'), 'b/dir')
+        dtags.add_tag('dir', '//b/gone')
+        plan = fsck.plan(self._check())
+        self.assertEqual(plan, [
+            'unlink ' + self._path('a/broken'),
+            'save ' + self._path('dir'),
+        ])
+        self._batch(plan)
+        self.assertEqual(self._check(), [])
+
+    def _batch(self, plan):
+        parser = argparse.make_parser()
+        args = parser.parse_args(['batch', '--root', self.root])
+        with patch('sys.stdin', io.StringIO('\n'.join(plan) + '\n')), \
+                patch('sys.stderr', io.StringIO()) as stderr:
+            args.func(args)
+        self.assertNotIn('error', stderr.getvalue())
+
+    def test_exit_status(self):
+        parser = argparse.make_parser()
+        args = parser.parse_args(['fsck', '--root', self.root])
+        self.assertFalse(args.func(args))
+        os.symlink(self._path('nothing'), 'a/broken')
+        with patch('sys.stdout', io.StringIO()):
+            self.assertEqual(args.func(args), 1)
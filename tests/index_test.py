@@ -0,0 +1,151 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains unit tests for dantalian.index
+"""
+
+import os
+import random
+from unittest.mock import patch
+
+from dantalian import base
+from dantalian import findlib
+from dantalian import index
+from dantalian.main import argparse
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+_TAGS = ['t{}'.format(i) for i in range(6)]
+
+
+def _random_query(rand, depth=0):
+    """Return a random query string."""
+    if depth > 2 or rand.random() < 0.3:
+        return rand.choice(_TAGS)
+    operator = rand.choice(['AND', 'OR', 'MINUS'])
+    children = [_random_query(rand, depth + 1)
+                for _ in range(rand.randint(1, 3))]
+    return ' '.join([operator] + children + ['END'])
+
+
+class TestIndex(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        for tag in _TAGS:
+            os.makedirs(tag)
+        os.makedirs('t0/sub')
+        rand = random.Random(0)
+        for i in range(40):
+            path = 'files/{}'.format(i)
+            os.makedirs('files', exist_ok=True)
+            os.mknod(path)
+            for tag in rand.sample(_TAGS, rand.randint(0, 4)):
+                base.link(self.root, path, '{}/f{}'.format(tag, i))
+            # Several links to one file in one directory.
+            if i % 5 == 0:
+                tag = rand.choice(_TAGS)
+                base.link(self.root, path, '{}/a{}'.format(tag, i))
+                base.link(self.root, path, '{}/z{}'.format(tag, i))
+        base.link(self.root, 't0/sub', 't1/sub')
+
+    def _assert_same(self, query):
+        tree = findlib.parse_query(self.root, query)
+        self.assertEqual(sorted(index.search(self.root, tree)),
+                         sorted(findlib.search(tree)), query)
+
+    def test_same_dir_links(self):
+        index.rebuild(self.root)
+        os.mknod('files/dup')
+        base.link(self.root, 'files/dup', 't5/zz')
+        base.link(self.root, 'files/dup', 't5/aa')
+        tree = findlib.parse_query(self.root, 't5')
+        self.assertIn('t5/aa', findlib.search(tree))
+        self._assert_same('t5')
+        self._assert_same('AND t5 files END')
+        self._assert_same('MINUS t5 t0 END')
+
+    def test_no_index(self):
+        tree = findlib.parse_query(self.root, 't0')
+        self.assertIsNone(index.search(self.root, tree))
+
+    def test_differential(self):
+        index.rebuild(self.root)
+        rand = random.Random(1)
+        for _ in range(200):
+            self._assert_same(_random_query(rand))
+
+    def test_mutations(self):
+        index.rebuild(self.root)
+        self._assert_same('OR t0 t1 t2 END')
+        base.rename(self.root, 'files/7', 't2/renamed')
+        base.unlink(self.root, 't1/f3')
+        base.link(self.root, 'files/5', 't1/new')
+        with open('t2/outside', 'w'):
+            pass
+        rand = random.Random(2)
+        for _ in range(50):
+            self._assert_same(_random_query(rand))
+
+    def _indexed_tags(self):
+        with index.Index(self.root) as index_:
+            return set(tag for (tag,) in index_._conn.execute(
+                'SELECT tag FROM dirs'))
+
+    def test_deferred(self):
+        index.rebuild(self.root)
+        with patch.object(index, 'Index', wraps=index.Index) as opened:
+            with index.deferred():
+                with index.deferred():
+                    for i in range(5):
+                        base.link(self.root, 'files/{}'.format(i),
+                                  't5/d{}'.format(i))
+                self.assertEqual(opened.call_count, 0)
+                self.assertIn('//t5', self._indexed_tags())
+            # Once for _indexed_tags() and once for all the invalidations.
+            self.assertEqual(opened.call_count, 2)
+        self.assertNotIn('//t5', self._indexed_tags())
+
+    def test_deferred_search(self):
+        index.rebuild(self.root)
+        with index.deferred():
+            base.link(self.root, 'files/1', 't5/d1')
+            self._assert_same('t5')
+            self.assertIn('//t5', self._indexed_tags())
+
+    def test_lazy(self):
+        # Directories are indexed when they are first searched.
+        with index.Index(self.root):
+            pass
+        self._assert_same('AND t0 t1 END')
+        self._assert_same('files')
+
+    def test_relative_paths(self):
+        index.rebuild(self.root)
+        os.chdir('t0')
+        self._assert_same('AND . ../t1 END')
+
+    def test_reindex_command(self):
+        args = argparse.make_parser().parse_args(
+            ['reindex', '--root', self.root])
+        args.func(args)
+        self.assertTrue(index.has_index(self.root))
+        self._assert_same('MINUS t0 t1 END')
@@ -0,0 +1,106 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module contains unit tests for dantalian.locks and for concurrent writers
+"""
+
+import multiprocessing
+import os
+import posixpath
+
+from dantalian import dtags
+from dantalian import tagging
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+_WRITERS = 8
+_ITERATIONS = 50
+
+
+def _add_tags(rootpath, writer):
+    for i in range(_ITERATIONS):
+        dtags.add_tag('apple', '//tag{}.{}'.format(writer, i))
+
+
+def _tag_files(rootpath, writer):
+    for i in range(_ITERATIONS):
+        path = 'files/{}.{}'.format(writer, i)
+        os.mknod(path)
+        # All writers compete for the same name in the same directory.
+        tagging.tag(rootpath, path, 'bag')
+        os.rename(path, 'files/{}.{}.done'.format(writer, i))
+
+
+def _run_writers(target, rootpath):
+    ctx = multiprocessing.get_context('fork')
+    procs = [ctx.Process(target=target, args=(rootpath, writer))
+             for writer in range(_WRITERS)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    return [proc.exitcode for proc in procs]
+
+
+class TestConcurrentWriters(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.mkdir('apple')
+        os.mkdir('bag')
+        os.mkdir('files')
+
+    def test_dtags_no_lost_updates(self):
+        exitcodes = _run_writers(_add_tags, self.root)
+        self.assertEqual(exitcodes, [0] * _WRITERS)
+        expected = {'//tag{}.{}'.format(writer, i)
+                    for writer in range(_WRITERS)
+                    for i in range(_ITERATIONS)}
+        tags = dtags.list_tags('apple')
+        self.assertEqual(len(tags), len(expected))
+        self.assertEqual(set(tags), expected)
+
+    def test_tag_same_directory(self):
+        exitcodes = _run_writers(_tag_files, self.root)
+        self.assertEqual(exitcodes, [0] * _WRITERS)
+        names = os.listdir('bag')
+        self.assertEqual(len(names), _WRITERS * _ITERATIONS)
+        inodes = {os.stat(posixpath.join('bag', name)).st_ino
+                  for name in names}
+        self.assertEqual(len(inodes), _WRITERS * _ITERATIONS)
+
+    def test_link_dirs_same_directory(self):
+        for i in range(_WRITERS):
+            os.makedirs('files/{}/dir'.format(i))
+        ctx = multiprocessing.get_context('fork')
+        procs = [ctx.Process(target=tagging.tag,
+                             args=(self.root, 'files/{}/dir'.format(i), 'bag'))
+                 for i in range(_WRITERS)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        for i in range(_WRITERS):
+            tags = dtags.list_tags('files/{}/dir'.format(i))
+            self.assertEqual(len(tags), 1)
+        self.assertEqual(len(os.listdir('bag')), _WRITERS)
+        self.assertTrue(all(posixpath.islink(posixpath.join('bag', name))
+                            for name in os.listdir('bag')))
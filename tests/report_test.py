@@ -0,0 +1,168 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains unit tests for dantalian.report
+"""
+
+import io
+import json
+import os
+import unittest
+
+from dantalian import dtags
+from dantalian import report
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+
+class TestLibraryStats(testlib.FSMixin, testlib.LockedSaveMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        os.makedirs('a/sub')
+        os.makedirs('b')
+        os.mknod('a/foo')
+        os.mknod('a/bar')
+        os.link('a/foo', 'b/foo')
+        os.link('a/foo', 'b/foo2')
+        os.link('a/bar', 'a/sub/bar')
+        os.mknod('b/baz')
+        os.symlink('../a/sub', 'b/sub')
+        dtags.add_tag('a/sub', '//b')
+
+    def test_stats(self):
+        stats = report.library_stats(self.root)
+        self.assertEqual(stats['directories'], 4)
+        self.assertEqual(stats['files'], 3)
+        self.assertEqual(stats['tags']['//a'], {'entries': 3, 'unique': 3})
+        self.assertEqual(stats['tags']['//b'], {'entries': 4, 'unique': 3})
+        self.assertEqual(stats['tags']['//a/sub'],
+                         {'entries': 1, 'unique': 1})
+        self.assertEqual(stats['tags']['//'], {'entries': 2, 'unique': 2})
+        self.assertEqual(stats['entries'], 10)
+        self.assertEqual(stats['links'], {3: 1, 2: 1, 1: 1})
+        self.assertEqual(stats['tagged_dirs'], {'//a/sub': 1})
+        self.assertEqual(stats['scanned'], 4)
+
+    def test_cache(self):
+        report.library_stats(self.root)
+        stats = report.library_stats(self.root)
+        self.assertEqual(stats['scanned'], 0)
+        os.mknod('b/new')
+        stats = report.library_stats(self.root)
+        self.assertEqual(stats['scanned'], 1)
+        self.assertEqual(stats['tags']['//b'], {'entries': 5, 'unique': 4})
+        self.assertEqual(stats['files'], 4)
+
+    def test_cache_nlink(self):
+        report.library_stats(self.root)
+        os.link('b/baz', 'b/baz2')
+        stats = report.library_stats(self.root)
+        self.assertEqual(stats['links'], {3: 1, 2: 2})
+
+    def test_cache_unlink(self):
+        report.library_stats(self.root)
+        os.unlink('b/foo2')
+        os.unlink('a/sub/bar')
+        stats = report.library_stats(self.root)
+        self.assertEqual(stats['links'], {2: 1, 1: 2})
+        # Removing the only link in a directory leaves the file's other
+        # directories unchanged.
+        os.unlink('b/foo')
+        stats = report.library_stats(self.root)
+        self.assertEqual(stats['links'], {1: 3})
+
+    def test_save_locked(self):
+        report.library_stats(self.root)
+        cache = report.StatsCache(self.root)
+        self.assertSaveWaitsForReaders('.dantalian/stats.json',
+                                       lambda: cache.save(['//']))
+
+    def test_cache_dtags(self):
+        report.library_stats(self.root)
+        dtags.add_tag('b', '//a')
+        stats = report.library_stats(self.root)
+        self.assertEqual(stats['scanned'], 1)
+        self.assertEqual(stats['tagged_dirs'], {'//a/sub': 1, '//b': 1})
+
+    def test_no_cache(self):
+        report.library_stats(self.root)
+        stats = report.library_stats(self.root, use_cache=False)
+        self.assertEqual(stats['scanned'], 4)
+
+
+class TestCooccurrence(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        os.makedirs('a')
+        os.makedirs('b')
+        os.makedirs('c')
+        os.mknod('a/x')
+        os.mknod('a/y')
+        os.link('a/x', 'b/x')
+        os.link('a/x', 'b/x2')
+        os.link('a/y', 'c/y')
+        os.link('a/x', 'c/x')
+        os.mknod('c/z')
+
+    def _pairs(self, cooccur):
+        tags = cooccur.tags
+        return dict((tuple(sorted((tags[i], tags[j]))), count)
+                    for (i, j), count in cooccur.counts.items())
+
+    def test_incidence(self):
+        tags, _, rows, keys, paths = report.incidence(self.root)
+        self.assertEqual(sorted(tags), ['//', '//a', '//b', '//c'])
+        self.assertEqual(sorted(sorted(tags[i] for i in row) for row in rows),
+                         [['//'], ['//'], ['//'],
+                          ['//a', '//b', '//c'], ['//a', '//c'], ['//c']])
+        self.assertEqual(len(keys), len(rows))
+        self.assertEqual(
+            keys[paths.index(os.path.join(self.root, 'c/z'))],
+            (os.stat('c/z').st_dev, os.stat('c/z').st_ino))
+
+    def test_cooccurrence(self):
+        pairs = self._pairs(report.cooccurrence(self.root, use_numpy=False))
+        self.assertEqual(pairs[('//a', '//a')], 2)
+        self.assertEqual(pairs[('//c', '//c')], 3)
+        self.assertEqual(pairs[('//a', '//c')], 2)
+        self.assertEqual(pairs[('//b', '//c')], 1)
+        self.assertNotIn(('//', '//a'), pairs)
+
+    @unittest.skipIf(report._import_numpy() is None, 'requires NumPy')
+    def test_numpy(self):
+        self.assertEqual(report.cooccurrence(self.root),
+                         report.cooccurrence(self.root, use_numpy=False))
+
+    def test_write(self):
+        cooccur = report.Cooccurrence(['//a', '//b'],
+                                      {(0, 0): 2, (0, 1): 1, (1, 1): 1})
+        file = io.StringIO()
+        report.write_csv(cooccur, file)
+        self.assertEqual(file.getvalue(),
+                         'tag1,tag2,count\n//a,//a,2\n//a,//b,1\n//b,//b,1\n')
+        file = io.StringIO()
+        report.write_json(cooccur, file)
+        self.assertEqual(json.loads(file.getvalue()),
+                         [['//a', '//a', 2], ['//a', '//b', 1],
+                          ['//b', '//b', 1]])
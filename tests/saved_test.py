@@ -0,0 +1,119 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains unit tests for dantalian.saved
+"""
+
+import os
+import posixpath
+from unittest.mock import patch
+
+from dantalian import base
+from dantalian import findlib
+from dantalian import saved
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+
+class TestSavedQuery(testlib.FSMixin, testlib.SameFileMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        os.makedirs('a')
+        os.makedirs('b')
+        os.makedirs('smart')
+        os.makedirs('d')
+        os.mknod('a/x')
+        os.mknod('a/y')
+        os.mknod('a/z')
+        base.link(self.root, 'a/x', 'b/x')
+        base.link(self.root, 'a/y', 'b/y')
+        base.link(self.root, 'd', 'a/d')
+        base.link(self.root, 'd', 'b/d')
+        self.added, self.removed = saved.save_query(
+            self.root, 'smart/both', 'AND //a //b END')
+
+    def test_save(self):
+        self.assertEqual(sorted(self.added),
+                         ['smart/both/d', 'smart/both/x', 'smart/both/y'])
+        self.assertEqual(self.removed, [])
+        self.assertSameFile('smart/both/x', 'a/x')
+        self.assertTrue(posixpath.islink('smart/both/d'))
+        self.assertEqual(saved.list_queries(self.root),
+                         {'//smart/both': 'AND //a //b END'})
+
+    def test_refresh_diff(self):
+        base.unlink(self.root, 'b/x')
+        base.link(self.root, 'a/z', 'b/z')
+        # Force a different mtime even on coarse timestamp filesystems.
+        os.utime('b', ns=(0, 0))
+        added, removed = saved.refresh(self.root, 'smart/both')
+        self.assertEqual(added, ['smart/both/z'])
+        self.assertEqual(removed, ['smart/both/x'])
+        self.assertFalse(posixpath.lexists('smart/both/x'))
+        self.assertSameFile('smart/both/z', 'a/z')
+        # Unchanged links are left alone.
+        self.assertSameFile('smart/both/y', 'a/y')
+
+    def test_refresh_skips(self):
+        with patch.object(findlib.AndNode, 'get_results') as get_results:
+            self.assertIsNone(saved.refresh(self.root, 'smart/both'))
+        get_results.assert_not_called()
+
+    def test_refresh_force(self):
+        self.assertEqual(saved.refresh(self.root, 'smart/both', force=True),
+                         ([], []))
+
+    def test_refresh_stat_filter(self):
+        saved.save_query(self.root, 'smart/empty', 'SIZE 0 //a END')
+        # Writing to a file doesn't change its directory.
+        with open('a/z', 'w') as file:
+            file.write('foo')
+        added, removed = saved.refresh(self.root, 'smart/empty')
+        self.assertEqual(added, [])
+        self.assertEqual(removed, ['smart/empty/z'])
+
+    def test_refresh_all(self):
+        saved.save_query(self.root, 'smart/only_a', 'MINUS //a //b END')
+        os.mknod('a/w')
+        results = saved.refresh_all(self.root)
+        # a changed, so both queries are evaluated.
+        self.assertEqual(results['//smart/both'], ([], []))
+        self.assertEqual(results['//smart/only_a'],
+                         ([posixpath.join(self.root, 'smart/only_a/w')], []))
+
+    def test_relative_query(self):
+        os.chdir('a')
+        saved.save_query(self.root, '../smart/rel', 'MINUS . ../b END')
+        self.assertEqual(saved.list_queries(self.root)['//smart/rel'],
+                         'MINUS //a //b END')
+        os.chdir(self.root)
+        self.assertSameFile('smart/rel/z', 'a/z')
+
+    def test_own_directory(self):
+        with self.assertRaises(ValueError):
+            saved.save_query(self.root, 'smart/loop', 'OR //a //smart/loop END')
+
+    def test_drop(self):
+        saved.drop_query(self.root, 'smart/both')
+        self.assertEqual(saved.list_queries(self.root), {})
+        with self.assertRaises(KeyError):
+            saved.refresh(self.root, 'smart/both')
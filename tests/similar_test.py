@@ -0,0 +1,122 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains unit tests for dantalian.similar
+"""
+
+import os
+import random
+from unittest.mock import patch
+
+from dantalian import similar
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+
+class TestSimilar(testlib.FSMixin, testlib.LockedSaveMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        for tag in 'abcde':
+            os.makedirs(tag)
+        self._tag('a/1', 'abcd')
+        self._tag('a/2', 'abcd')
+        self._tag('a/3', 'abc')
+        self._tag('a/4', 'a')
+        self._tag('e/5', 'e')
+
+    @staticmethod
+    def _tag(path, tags):
+        os.mknod(path)
+        for tag in tags:
+            dst = os.path.join(tag, os.path.basename(path))
+            if not os.path.exists(dst):
+                os.link(path, dst)
+
+    @staticmethod
+    def _names(results):
+        return [(similarity, os.path.basename(path))
+                for similarity, path in results]
+
+    def test_similar(self):
+        results = similar.similar(self.root, 'a/1')
+        self.assertEqual(self._names(results), [(1.0, '2'), (0.75, '3')])
+        for _, path in results:
+            self.assertTrue(path.startswith(self.root))
+
+    def test_top(self):
+        results = similar.similar(self.root, 'a/1', top=1)
+        self.assertEqual(self._names(results), [(1.0, '2')])
+
+    def test_not_in_library(self):
+        os.mknod('.dantalian/x')
+        with self.assertRaises(ValueError):
+            similar.similar(self.root, '.dantalian/x')
+
+    def test_saved(self):
+        similar.similar(self.root, 'a/1')
+        index = similar.SimilarityIndex.load(self.root)
+        self.assertTrue(index.is_current())
+        self.assertEqual(index.signature(0),
+                         similar.SimilarityIndex.build(self.root).signature(0))
+        self.assertEqual(index.similar('a/1'),
+                         similar.similar(self.root, 'a/1'))
+
+    def test_save_locked(self):
+        similar.similar(self.root, 'a/1')
+        os.link('a/4', 'b/4')
+        index = similar.SimilarityIndex.build(self.root)
+        self.assertSaveWaitsForReaders('.dantalian/minhash.json', index.save)
+
+    def test_saved_buckets(self):
+        similar.similar(self.root, 'a/1')
+        index = similar.SimilarityIndex.load(self.root)
+        # Only the query's own bands are hashed.
+        with patch.object(similar, '_bucket_key',
+                          wraps=similar._bucket_key) as bucket_key:
+            self.assertEqual(self._names(index.similar('a/1')),
+                             [(1.0, '2'), (0.75, '3')])
+        self.assertEqual(bucket_key.call_count, similar.BANDS)
+
+    def test_stale(self):
+        similar.similar(self.root, 'a/1')
+        os.link('a/4', 'b/4')
+        index = similar.SimilarityIndex.load(self.root)
+        self.assertFalse(index.is_current())
+        self.assertEqual(
+            self._names(similar.similar(self.root, 'a/4', top=1)),
+            [(2 / 3, '3')])
+
+    def test_candidates(self):
+        rand = random.Random(0)
+        tags = ['t{}'.format(i) for i in range(20)]
+        for tag in tags:
+            os.makedirs(tag)
+        for i in range(200):
+            self._tag('t0/f{}'.format(i), rand.sample(tags, 5))
+        index = similar.SimilarityIndex.build(self.root)
+        for row_id in range(0, len(index.rows), 20):
+            candidates = index.candidates(row_id)
+            # Identical tag sets always collide.
+            for other, row in enumerate(index.rows):
+                if other != row_id and set(row) == set(index.rows[row_id]):
+                    self.assertIn(other, candidates)
+            self.assertLess(len(candidates), len(index.rows) - 1)
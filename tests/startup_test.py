@@ -0,0 +1,140 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+This module contains startup benchmarks for the dantalian command.
+
+These guard against regressions in command startup time, such as importing
+the whole package to run a single command.
+"""
+
+import os
+import posixpath
+import subprocess
+import sys
+import time
+
+import dantalian
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+# Budgets are generous to avoid flakiness on slow machines; they exist to
+# catch large regressions.
+_IMPORT_BUDGET_US = 100000
+_WALL_CLOCK_BUDGET = 0.25
+_RUNS = 5
+
+_SRCDIR = posixpath.dirname(posixpath.dirname(dantalian.__file__))
+_MAIN = 'from dantalian.main import main; main()'
+# Modules imported lazily don't show up in -X importtime output, so check
+# sys.modules instead.
+_MAIN_MODULES = _MAIN + '; import sys; print(*sys.modules)'
+
+
+def _python(*args):
+    """Run Python with dantalian importable; return (stdout, stderr)."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = _SRCDIR
+    proc = subprocess.run(
+        (sys.executable,) + args,
+        env=env, check=True,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    return proc.stdout, proc.stderr
+
+
+def _best_time(*args):
+    """Return the best wall clock time of several runs."""
+    times = []
+    for _ in range(_RUNS):
+        start = time.perf_counter()
+        _python(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _parse_importtime(output):
+    """Parse -X importtime output into a dict of cumulative times."""
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        cumulative = cumulative.strip()
+        # Skip the header line.
+        if cumulative.isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestStartup(testlib.FSMixin):
+
+    def _assert_lazy(self, argv, module, lazy):
+        output, _ = _python('-c', _MAIN_MODULES, *argv)
+        modules = output.split()
+        self.assertIn(module, modules)
+        for name in lazy:
+            self.assertNotIn(name, modules)
+
+    def test_lazy_imports(self):
+        self._assert_lazy(
+            ['init-library', self.root], 'dantalian.main.commands.library',
+            ['dantalian.base', 'dantalian.bulk', 'dantalian.findlib',
+             'dantalian.tagging', 'json'])
+        os.mkdir(posixpath.join(self.root, 'foo'))
+        os.mknod(posixpath.join(self.root, 'bar'))
+        root = '--root=' + self.root
+        self._assert_lazy(
+            ['search', root, '//foo'], 'dantalian.main.commands.search',
+            ['dantalian.watch', 'dantalian.inotify', 'dantalian.estimate',
+             'dantalian.similar', 'dantalian.report', 'dantalian.daemon'])
+        self._assert_lazy(
+            ['tag', root, '-f', 'bar', '--', '//foo'],
+            'dantalian.main.commands.tagging',
+            ['dantalian.findlib', 'dantalian.bulk', 'json'])
+        self._assert_lazy(
+            ['list', root, '//foo'], 'dantalian.main.commands.base',
+            ['dantalian.findlib', 'dantalian.bulk', 'json'])
+        self._assert_lazy(
+            ['clean', 'foo'], 'dantalian.main.commands.bulk',
+            ['dantalian.dedupe', 'dantalian.fsck', 'dantalian.findlib',
+             'multiprocessing'])
+
+    def test_complete_imports(self):
+        os.mkdir(posixpath.join(self.root, '.dantalian'))
+        os.mkdir(posixpath.join(self.root, 'foo'))
+        output, _ = _python('-c', _MAIN_MODULES, 'complete', '--', '//f')
+        completions, *modules = output.split()
+        self.assertEqual(completions, '//foo/')
+        self.assertIn('dantalian.trie', modules)
+        for name in ('dantalian.base', 'dantalian.findlib', 'dantalian.dtags',
+                     'dantalian.main.argparse', 'logging'):
+            self.assertNotIn(name, modules)
+
+    def test_import_time(self):
+        _, output = _python('-X', 'importtime', '-c', _MAIN,
+                            'init-library', self.root)
+        times = _parse_importtime(output)
+        self.assertLess(times['dantalian.main'], _IMPORT_BUDGET_US)
+
+    def test_wall_clock(self):
+        baseline = _best_time('-c', 'pass')
+        elapsed = _best_time('-c', _MAIN, 'init-library', self.root)
+        self.assertLess(elapsed - baseline, _WALL_CLOCK_BUDGET)
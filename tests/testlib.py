@@ -25,8 +25,11 @@ import os
 import posixpath
 import shutil
 import tempfile
+import threading
 from unittest import TestCase
 
+from dantalian import locks
+
 
 class SameFileMixin(TestCase):
 
@@ -48,6 +51,31 @@ class SameFileMixin(TestCase):
             self.assertFalse(posixpath.samefile(file1, file2))
 
 
+class LockedSaveMixin(TestCase):
+
+    """TestCase mixin for checking that saves wait for readers."""
+
+    # pylint: disable=invalid-name
+
+    def assertSaveWaitsForReaders(self, path, save):
+        """Assert that save() leaves a file alone while it is read.
+
+        The file is held with a shared lock, as readers do, while save() runs
+        in another thread.
+        """
+        with open(path) as file, locks.lock_file(file, shared=True):
+            before = file.read()
+            thread = threading.Thread(target=save)
+            thread.start()
+            thread.join(0.1)
+            self.assertTrue(thread.is_alive())
+            with open(path) as other:
+                self.assertEqual(other.read(), before)
+        thread.join()
+        with open(path) as file:
+            self.assertNotEqual(file.read(), before)
+
+
 class FSMixin(TestCase):
 
     """TestCase mixin with convenient assertions.
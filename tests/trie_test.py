@@ -0,0 +1,83 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains unit tests for dantalian.trie
+"""
+
+import os
+
+from dantalian import fs
+from dantalian import trie
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+
+class TestTagTrie(testlib.FSMixin, testlib.LockedSaveMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        os.makedirs('music/live')
+        os.makedirs('music/lossless')
+        os.makedirs('movies')
+        os.mknod('music/song')
+        os.symlink('music', 'misc')
+
+    def test_complete(self):
+        self.assertEqual(trie.complete(self.root, '//m'),
+                         ['//movies/', '//music/'])
+        self.assertEqual(trie.complete(self.root, '//music/l'),
+                         ['//music/live/', '//music/lossless/'])
+        self.assertEqual(trie.complete(self.root, '//music/liv'),
+                         ['//music/live/'])
+        self.assertEqual(trie.complete(self.root, '//music/live/'), [])
+        self.assertEqual(trie.complete(self.root, '//nope/'), [])
+
+    def test_complete_root(self):
+        self.assertEqual(trie.complete(self.root, ''), ['//'])
+        self.assertEqual(trie.complete(self.root, '//'),
+                         ['//movies/', '//music/'])
+        self.assertEqual(trie.complete(self.root, 'music'), [])
+
+    def test_lazy_refresh(self):
+        # Also checks that the trie was saved.
+        trie.complete(self.root, '//music/l')
+        with fs.collect_stats() as stats:
+            trie.complete(self.root, '//music/l')
+        self.assertEqual(stats.counts['scandir'], 0)
+        self.assertEqual(stats.counts['stat'], 2)
+
+    def test_save_locked(self):
+        trie.complete(self.root, '//')
+        os.makedirs('books')
+        tag_trie = trie.TagTrie(self.root)
+        tag_trie.complete('//')
+        self.assertSaveWaitsForReaders('.dantalian/tagtrie.json',
+                                       tag_trie.save)
+
+    def test_changes(self):
+        trie.complete(self.root, '//music/l')
+        os.rmdir('music/live')
+        os.makedirs('music/lyrics')
+        os.rename('movies', 'films')
+        self.assertEqual(trie.complete(self.root, '//music/l'),
+                         ['//music/lossless/', '//music/lyrics/'])
+        self.assertEqual(trie.complete(self.root, '//'),
+                         ['//films/', '//music/'])
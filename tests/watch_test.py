@@ -0,0 +1,117 @@
+# Copyright (C) 2015  Allen Li
+#
+# This file is part of Dantalian.
+#
+# Dantalian is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Dantalian is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Dantalian.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains unit tests for dantalian.watch
+"""
+
+import os
+from unittest.mock import patch
+
+from dantalian import findlib
+from dantalian import watch
+
+from . import testlib
+
+# pylint: disable=missing-docstring
+
+
+class TestQueryWatch(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('a')
+        os.makedirs('b')
+        os.makedirs('c')
+        os.mknod('a/x')
+        os.mknod('a/y')
+        os.link('a/x', 'b/x')
+        tree = findlib.parse_query(self.root, 'MINUS a b c END')
+        self.watch = watch.QueryWatch(tree)
+
+    def tearDown(self):
+        self.watch.close()
+        super().tearDown()
+
+    def test_initial(self):
+        self.assertEqual(list(self.watch.results.values()), ['a/y'])
+
+    def test_changes(self):
+        os.link('a/y', 'c/y')
+        self.assertEqual(self.watch.changes(1), [('-', 'a/y')])
+        os.unlink('b/x')
+        self.assertEqual(self.watch.changes(1), [('+', 'a/x')])
+        os.mknod('a/z')
+        self.assertEqual(self.watch.changes(1), [('+', 'a/z')])
+
+    def test_only_affected_leaf(self):
+        with patch.object(watch, '_dir_results',
+                          wraps=watch._dir_results) as dir_results:
+            os.mknod('c/w')
+            self.assertEqual(self.watch.changes(1), [])
+        dir_results.assert_called_once_with('c')
+
+    def test_timeout(self):
+        self.assertEqual(self.watch.changes(0), [])
+
+    def test_missing_dir(self):
+        os.unlink('b/x')
+        os.rmdir('b')
+        self.assertEqual(self.watch.changes(1), [('+', 'a/x')])
+
+    def test_stat_filter(self):
+        os.makedirs('d')
+        os.mknod('d/x')
+        tree = findlib.parse_query(
+            self.root, 'AND LINKS 1 d END SIZE 0 d END END')
+        with watch.QueryWatch(tree) as stat_watch:
+            self.assertEqual(list(stat_watch.results.values()), ['d/x'])
+            # Linking from an unwatched directory only changes the inode.
+            os.link('d/x', 'e')
+            self.assertEqual(stat_watch.changes(1), [('-', 'd/x')])
+            os.unlink('e')
+            self.assertEqual(stat_watch.changes(1), [('+', 'd/x')])
+            with open('d/x', 'w') as file:
+                file.write('foo')
+            self.assertEqual(stat_watch.changes(1), [('-', 'd/x')])
+
+    def test_diff(self):
+        self.assertEqual(watch.diff({1: 'a', 2: 'b'}, {2: 'c', 3: 'd'}),
+                         [('-', 'a'), ('-', 'b'), ('+', 'c'), ('+', 'd')])
+
+
+class TestGlobWatch(testlib.FSMixin):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs('.dantalian')
+        os.makedirs('music/rock/live')
+        os.mknod('music/rock/live/a')
+        tree = findlib.parse_query(self.root, '//music/*/live')
+        self.watch = watch.QueryWatch(tree)
+
+    def tearDown(self):
+        self.watch.close()
+        super().tearDown()
+
+    def test_new_match(self):
+        os.makedirs('music/jazz/live')
+        self.watch.changes(1)
+        os.mknod('music/jazz/live/b')
+        self.assertEqual(
+            self.watch.changes(1),
+            [('+', os.path.join(self.root, 'music/jazz/live/b'))])